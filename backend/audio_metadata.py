@@ -0,0 +1,86 @@
+import os
+from typing import Dict, Optional
+
+# This process's GridFS bucket, opened on first use (see parse_gridfs_audio)
+_gridfs_bucket = None
+
+
+def parse_audio_metadata(fileobj, filename: str) -> Dict:
+    """Read tags and duration from an audio file object.
+
+    Missing tags come back as None so callers can decide what to keep.
+    Kept free of app imports so it is cheap to load in worker processes.
+    mutagen (and the format module it picks) loads on the first call,
+    not at server startup.
+    """
+    from mutagen import File as MutagenFile
+
+    audio = MutagenFile(fileobj, easy=True)
+    if audio is None:
+        return {'title': None, 'artist': None, 'album': None, 'duration': 0}
+
+    duration = 0
+    if hasattr(audio.info, 'length'):
+        duration = int(audio.info.length)
+
+    return {
+        'title': get_tag(audio, ['title', 'TIT2']),
+        'artist': get_tag(audio, ['artist', 'TPE1']),
+        'album': get_tag(audio, ['album', 'TALB']),
+        'duration': duration
+    }
+
+
+def parse_audio_path(path: str, filename: str) -> Dict:
+    """Process-pool entry point: the worker reads the file itself, so
+    only the path and the tags cross the process boundary"""
+    # Unbuffered so the name can be replaced: mutagen uses it as a format
+    # hint (e.g. MP3 without ID3), and stored blobs have no extension
+    with open(path, 'rb', buffering=0) as f:
+        f.name = filename
+        return parse_audio_metadata(f, filename)
+
+
+def _gridfs():
+    global _gridfs_bucket
+    if _gridfs_bucket is None:
+        from gridfs import GridFSBucket
+        from pymongo import MongoClient
+
+        client = MongoClient(os.environ['MONGO_URL'])
+        _gridfs_bucket = GridFSBucket(client[os.environ['DB_NAME']])
+    return _gridfs_bucket
+
+
+def parse_gridfs_audio(file_id: str, filename: str) -> Dict:
+    """Process-pool entry point for GridFS blobs.
+
+    The worker opens the blob through its own (sync) client. GridOut is
+    seekable, so mutagen reads just the headers and frames it needs
+    rather than the whole file, and nothing is written to disk.
+    """
+    from bson import ObjectId
+
+    with _gridfs().open_download_stream(ObjectId(file_id)) as f:
+        # GridOut.name is the stored file name, used as the format hint
+        return parse_audio_metadata(f, filename)
+
+
+def get_tag(audio, tag_names: list) -> Optional[str]:
+    for tag in tag_names:
+        if tag in audio:
+            value = audio[tag]
+            if isinstance(value, list) and len(value) > 0:
+                return str(value[0])
+            elif isinstance(value, str):
+                return value
+    return None
+
+
+def default_metadata(filename: str) -> Dict:
+    return {
+        'title': os.path.splitext(filename)[0],
+        'artist': 'Unknown Artist',
+        'album': 'Unknown Album',
+        'duration': 0
+    }
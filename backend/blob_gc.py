@@ -0,0 +1,128 @@
+import os
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set
+
+from blob_store import BlobNotFound
+from metrics import Counter
+
+BLOB_GC_INTERVAL = float(os.environ.get('BLOB_GC_INTERVAL_SECONDS', '30'))
+BLOB_GC_ORPHAN_INTERVAL = float(os.environ.get('BLOB_GC_ORPHAN_INTERVAL_SECONDS', '3600'))
+# Blobs younger than this are never orphans: their song may not be saved
+# yet, or a transcode may still be writing renditions
+BLOB_GC_GRACE = timedelta(seconds=float(os.environ.get('BLOB_GC_GRACE_SECONDS', '3600')))
+BLOB_GC_BATCH = 200
+
+BLOB_GC_RELEASED = Counter('blob_gc_released_total', 'Queued blob references released by the collector')
+BLOB_GC_ORPHANS = Counter('blob_gc_orphans_removed_total', 'Orphaned blob data removed by the sweep', ('kind',))
+
+
+def song_blob_ids(song: Dict) -> List[str]:
+    """Every stored blob a song document holds a reference to"""
+    if song.get('source') != 'upload' or not song.get('audioFileId'):
+        return []
+    blob_ids = [song['audioFileId']]
+    blob_ids += [rendition['fileId'] for rendition in (song.get('renditions') or {}).values()]
+    return blob_ids
+
+
+class BlobCollector:
+    """Background release of deleted songs' blobs, plus an orphan sweep.
+
+    Deletes queue their blob IDs in ``blob_releases`` instead of waiting
+    on the store. The collector drops one reference per queued entry
+    (the store deletes the data with the last one), so deduplicated
+    content shared with other songs survives. Entries are removed before
+    their release: a crash in between leaks a reference rather than
+    releasing it twice, and the orphan sweep reclaims the leak.
+
+    The sweep, every ``BLOB_GC_ORPHAN_INTERVAL``, deletes stored blobs
+    that no song references: files left by failed uploads, interrupted
+    deletes and GridFS chunks without a file.
+    """
+
+    def __init__(self, db, store, interval: float = BLOB_GC_INTERVAL,
+                 orphan_interval: float = BLOB_GC_ORPHAN_INTERVAL):
+        self.db = db
+        self.store = store
+        self.interval = interval
+        self.orphan_interval = orphan_interval
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._last_sweep: Optional[datetime] = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def release_later(self, blob_ids: Iterable[str]):
+        """Queue references for release (one entry per reference)"""
+        now = datetime.utcnow()
+        docs = [{'blobId': blob_id, 'queuedAt': now} for blob_id in blob_ids]
+        if docs:
+            await self.db.blob_releases.insert_many(docs, ordered=False)
+            self._wake.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.release_queued()
+                due = datetime.utcnow() - timedelta(seconds=self.orphan_interval)
+                if self._last_sweep is None or self._last_sweep < due:
+                    await self.sweep_orphans()
+            except Exception as e:
+                print(f"Blob GC error: {e}")
+
+    async def release_queued(self) -> int:
+        """Release every queued reference; returns how many were released"""
+        released = 0
+        while True:
+            batch = await self.db.blob_releases.find({}, {'blobId': 1}).limit(BLOB_GC_BATCH).to_list(BLOB_GC_BATCH)
+            if not batch:
+                return released
+            for entry in batch:
+                # Whoever deletes the entry owns the release (several app
+                # processes run a collector)
+                result = await self.db.blob_releases.delete_one({'_id': entry['_id']})
+                if result.deleted_count == 0:
+                    continue
+                try:
+                    await self.store.release(entry['blobId'])
+                except BlobNotFound:
+                    pass
+                except Exception as e:
+                    print(f"Blob release error for {entry['blobId']}: {e}")
+                    continue
+                released += 1
+                BLOB_GC_RELEASED.inc()
+
+    async def _referenced(self) -> Set[str]:
+        """Blob IDs still held by songs or waiting in the release queue"""
+        referenced: Set[str] = set()
+        songs = self.db.songs.find({'source': 'upload'}, {'source': 1, 'audioFileId': 1, 'renditions': 1})
+        async for song in songs:
+            referenced.update(song_blob_ids(song))
+        async for entry in self.db.blob_releases.find({}, {'blobId': 1}):
+            referenced.add(entry['blobId'])
+        return referenced
+
+    async def sweep_orphans(self) -> Dict[str, int]:
+        """Delete stored data that no song references; returns counts by kind"""
+        self._last_sweep = datetime.utcnow()
+        cutoff = self._last_sweep - BLOB_GC_GRACE
+        removed = await self.store.sweep_orphans(await self._referenced(), cutoff)
+        for kind, count in removed.items():
+            BLOB_GC_ORPHANS.labels(kind).inc(count)
+        if any(removed.values()):
+            print(f"Blob GC removed orphans: {removed}")
+        return removed
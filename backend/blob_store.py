@@ -0,0 +1,487 @@
+import os
+import re
+import glob
+import uuid
+import asyncio
+from datetime import datetime, timezone
+from typing import AsyncIterator, Collection, Dict, Optional
+
+from metrics import Counter
+from sqlite_db import SQLiteDatabase
+
+# Which backend holds audio: "gridfs" (MongoDB) or "local" (filesystem)
+AUDIO_STORAGE = os.environ.get('AUDIO_STORAGE', 'gridfs')
+AUDIO_STORAGE_DIR = os.environ.get('AUDIO_STORAGE_DIR', '/home/ubuntu/uploads')
+
+GRIDFS_CHUNK_SIZE = 255 * 1024  # the GridFS default chunk size
+# How long a commit waits for a same-content file that is being deleted
+GRIDFS_COMMIT_RETRIES = 50
+GRIDFS_COMMIT_RETRY_SECONDS = 0.1
+
+# Local blob IDs are SHA-256 hex digests; earlier uploads used uuid4
+# hex (sharded) or dashed uuids (flat)
+_LOCAL_ID_RE = re.compile(r'^(?:[0-9a-f]{64}|[0-9a-f-]{32,36})$')
+
+BLOB_BYTES_READ = Counter('blob_bytes_read_total', 'Audio bytes read from the blob store', ('backend',))
+BLOB_BYTES_WRITTEN = Counter('blob_bytes_written_total', 'Audio bytes written to the blob store', ('backend',))
+GRIDFS_BYTES_READ = BLOB_BYTES_READ.labels('gridfs')
+GRIDFS_BYTES_WRITTEN = BLOB_BYTES_WRITTEN.labels('gridfs')
+# Streams of local blobs bypass the store; see file_response_bytes_total
+LOCAL_BYTES_READ = BLOB_BYTES_READ.labels('local')
+LOCAL_BYTES_WRITTEN = BLOB_BYTES_WRITTEN.labels('local')
+
+
+class BlobNotFound(Exception):
+    pass
+
+
+class Blob:
+    """A stored file opened for reading.
+
+    Local blobs expose ``path`` so they can be handed to the server's
+    sendfile path; other backends stream through ``iter_range``.
+    """
+
+    path: Optional[str] = None
+
+    def __init__(self, blob_id: str, size: int, uploaded_at: datetime,
+                 content_type: Optional[str] = None, sha256: Optional[str] = None):
+        self.id = blob_id
+        self.size = size
+        self.uploaded_at = uploaded_at
+        self.content_type = content_type
+        self.sha256 = sha256
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.sha256}"' if self.sha256 else f'"{self.id}-{self.size}"'
+
+
+class GridFSBlob(Blob):
+    def __init__(self, grid_out):
+        metadata = grid_out.metadata or {}
+        super().__init__(
+            str(grid_out._id), grid_out.length, grid_out.upload_date,
+            content_type=metadata.get('contentType'), sha256=metadata.get('sha256')
+        )
+        self._grid_out = grid_out
+
+    async def iter_range(self, start: int, end: int, chunk_size: int) -> AsyncIterator[bytes]:
+        self._grid_out.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await self._grid_out.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            GRIDFS_BYTES_READ.inc(len(chunk))
+            yield chunk
+
+
+class LocalBlob(Blob):
+    def __init__(self, blob_id: str, path: str, stat: os.stat_result):
+        uploaded_at = datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc)
+        sha256 = blob_id if len(blob_id) == 64 else None
+        super().__init__(blob_id, stat.st_size, uploaded_at, sha256=sha256)
+        self.path = path
+        # Older blobs are not content-addressed; size+mtime is stable for them
+        self._etag = super().etag if sha256 else f'"{blob_id}-{stat.st_size}-{int(stat.st_mtime)}"'
+
+    @property
+    def etag(self) -> str:
+        return self._etag
+
+
+class GridFSWriter:
+    """Streams chunks into GridFS; the file document goes in on commit.
+
+    ``metadata.sha256`` is unique, so when a concurrent upload of the
+    same content commits first, this one adds a reference to that file
+    and drops its own chunks.
+    """
+
+    def __init__(self, store: 'GridFSBlobStore', grid_in):
+        self._store = store
+        self._grid_in = grid_in
+
+    async def write(self, chunk: bytes):
+        await self._grid_in.write(chunk)
+        GRIDFS_BYTES_WRITTEN.inc(len(chunk))
+
+    async def commit(self, metadata: Dict) -> str:
+        from gridfs.errors import FileExists
+
+        await self._grid_in.set('metadata', {**metadata, 'refCount': 1})
+        for _ in range(GRIDFS_COMMIT_RETRIES):
+            try:
+                await self._grid_in.close()
+                return str(self._grid_in._id)
+            except FileExists:
+                blob_id = await self._store.acquire(metadata['sha256'])
+                if blob_id is not None:
+                    await self._grid_in.abort()
+                    return blob_id
+            # The other file is at refCount 0 and about to be deleted;
+            # once it is gone ours can take its place
+            await asyncio.sleep(GRIDFS_COMMIT_RETRY_SECONDS)
+        raise RuntimeError(f"Blob {metadata['sha256']} is still being deleted")
+
+    async def abort(self):
+        await self._grid_in.abort()
+
+
+class LocalWriter:
+    """Writes to a temp file and renames it to its content address on
+    commit, so readers never see a partial blob"""
+
+    def __init__(self, store: 'LocalBlobStore', tmp_path: str):
+        self._store = store
+        self._tmp_path = tmp_path
+        self._file = open(tmp_path, 'wb')
+
+    async def write(self, chunk: bytes):
+        await asyncio.to_thread(self._file.write, chunk)
+        LOCAL_BYTES_WRITTEN.inc(len(chunk))
+
+    def _flush(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+    async def commit(self, metadata: Dict) -> str:
+        await asyncio.to_thread(self._flush)
+        blob_id = metadata['sha256']
+        path = self._store.path_for(blob_id)
+
+        def publish(conn):
+            if os.path.exists(path):
+                # A concurrent upload of the same content got there first
+                os.unlink(self._tmp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(self._tmp_path, path)
+            conn.execute("""
+                INSERT INTO blob_refs (blob_id, refs) VALUES (?, 1)
+                ON CONFLICT (blob_id) DO UPDATE SET refs = refs + 1
+            """, (blob_id,))
+
+        await self._store.refs.write(publish)
+        return blob_id
+
+    def _abort(self):
+        self._file.close()
+        try:
+            os.unlink(self._tmp_path)
+        except FileNotFoundError:
+            pass
+
+    async def abort(self):
+        await asyncio.to_thread(self._abort)
+
+
+class GridFSBlobStore:
+    """Audio blobs in MongoDB GridFS.
+
+    Files carry ``metadata.sha256`` and ``metadata.refCount``; uploads of
+    known content add a reference instead of storing another copy.
+
+    The driver modules are imported in the methods that use them, so
+    processes on the local store (server_prod.py) never load them.
+    """
+
+    def __init__(self, db):
+        from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+
+        self.fs = AsyncIOMotorGridFSBucket(db)
+        self.files = db['fs.files']
+        self.chunks = db['fs.chunks']
+
+    async def create(self, filename: str, content_type: Optional[str]) -> GridFSWriter:
+        grid_in = self.fs.open_upload_stream(
+            filename,
+            chunk_size_bytes=GRIDFS_CHUNK_SIZE,
+            metadata={'contentType': content_type}
+        )
+        return GridFSWriter(self, grid_in)
+
+    async def acquire(self, sha256: str) -> Optional[str]:
+        """Add a reference to a stored blob with this content, if there is one"""
+        # refCount >= 1: a blob being released at 0 must not be revived.
+        # acquiredAt keeps the orphan sweep off it until the song is saved.
+        doc = await self.files.find_one_and_update(
+            {'metadata.sha256': sha256, 'metadata.refCount': {'$gte': 1}},
+            {'$inc': {'metadata.refCount': 1}, '$set': {'metadata.acquiredAt': datetime.utcnow()}},
+            projection={'_id': 1}
+        )
+        return str(doc['_id']) if doc else None
+
+    async def open(self, blob_id: str) -> GridFSBlob:
+        from bson import ObjectId
+        from bson.errors import InvalidId
+        from gridfs.errors import NoFile
+
+        try:
+            grid_out = await self.fs.open_download_stream(ObjectId(blob_id))
+        except (NoFile, InvalidId):
+            raise BlobNotFound(blob_id)
+        return GridFSBlob(grid_out)
+
+    async def read(self, blob_id: str) -> bytes:
+        blob = await self.open(blob_id)
+        data = await blob._grid_out.read()
+        GRIDFS_BYTES_READ.inc(len(data))
+        return data
+
+    def connect(self):
+        pass
+
+    def close(self):
+        pass
+
+    async def release(self, blob_id: str):
+        """Drop one reference; the file is deleted with the last one"""
+        from bson import ObjectId
+        from bson.errors import InvalidId
+        from gridfs.errors import NoFile
+        from pymongo import ReturnDocument
+
+        try:
+            file_id = ObjectId(blob_id)
+        except InvalidId:
+            raise BlobNotFound(blob_id)
+        doc = await self.files.find_one_and_update(
+            {'_id': file_id},
+            {'$inc': {'metadata.refCount': -1}},
+            projection={'metadata.refCount': 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if doc is None:
+            raise BlobNotFound(blob_id)
+        # Files from before refcounting start at -1 here and go straight away
+        if doc['metadata']['refCount'] <= 0:
+            try:
+                await self.fs.delete(file_id)
+            except NoFile:
+                pass
+
+    async def sweep_orphans(self, referenced: Collection[str], cutoff: datetime) -> Dict[str, int]:
+        """Delete files no song references and chunks whose file is gone.
+
+        Only files uploaded and last acquired before ``cutoff`` qualify, so
+        uploads whose song isn't saved yet are left alone. Content-addressed
+        files are claimed by dropping their refCount to 0 first, which
+        stops a concurrent dedupe acquire from reviving them.
+        """
+        from bson import ObjectId
+        from gridfs.errors import NoFile
+
+        removed = {'files': 0, 'chunks': 0}
+        quiet = {'$or': [
+            {'metadata.acquiredAt': {'$exists': False}},
+            {'metadata.acquiredAt': {'$lt': cutoff}}
+        ]}
+        candidates = self.files.find({'uploadDate': {'$lt': cutoff}}, {'metadata.sha256': 1})
+        async for doc in candidates:
+            if str(doc['_id']) in referenced:
+                continue
+            if (doc.get('metadata') or {}).get('sha256'):
+                claimed = await self.files.find_one_and_update(
+                    {'_id': doc['_id'], **quiet},
+                    {'$set': {'metadata.refCount': 0}},
+                    projection={'_id': 1}
+                )
+                if claimed is None:
+                    continue
+            try:
+                await self.fs.delete(doc['_id'])
+                removed['files'] += 1
+            except NoFile:
+                pass
+
+        # Chunks left by aborted uploads or interrupted deletes. A file
+        # document is only written when its upload finishes, so young
+        # chunk sets may still be in progress.
+        file_ids = set(await self.files.distinct('_id'))
+        for files_id in await self.chunks.distinct('files_id'):
+            if files_id in file_ids:
+                continue
+            if isinstance(files_id, ObjectId) and files_id.generation_time.replace(tzinfo=None) >= cutoff:
+                continue
+            result = await self.chunks.delete_many({'files_id': files_id})
+            removed['chunks'] += result.deleted_count
+        return removed
+
+
+class LocalBlobStore:
+    """Audio blobs on the local filesystem.
+
+    Files are content-addressed at ``root/ab/cd/<sha256>`` so no directory
+    grows too large; uploads land in ``root/tmp`` first (same filesystem,
+    so the final rename is atomic). Reference counts live in
+    ``root/refs.db`` and change in the same transaction as the file.
+    ``connect()``/``close()`` open and close that database and block.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.tmp_dir = os.path.join(root, 'tmp')
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self.refs = SQLiteDatabase(os.path.join(root, 'refs.db'), pool_size=1)
+        self._migrated = False
+
+    def connect(self):
+        self.refs.open()
+
+    def close(self):
+        self.refs.close()
+
+    async def _ensure_refs(self):
+        if not self._migrated:
+            await self.refs.write(lambda conn: conn.execute(
+                "CREATE TABLE IF NOT EXISTS blob_refs (blob_id TEXT PRIMARY KEY, refs INTEGER NOT NULL)"
+            ))
+            self._migrated = True
+
+    def path_for(self, blob_id: str) -> str:
+        if not _LOCAL_ID_RE.match(blob_id):
+            raise BlobNotFound(blob_id)
+        return os.path.join(self.root, blob_id[:2], blob_id[2:4], blob_id)
+
+    def _resolve(self, blob_id: str) -> str:
+        path = self.path_for(blob_id)
+        if os.path.exists(path):
+            return path
+        # Uploads from before sharding were stored flat as <id><ext>
+        legacy = glob.glob(os.path.join(self.root, f'{blob_id}.*'))
+        if legacy:
+            return legacy[0]
+        raise BlobNotFound(blob_id)
+
+    async def create(self, filename: str, content_type: Optional[str]) -> LocalWriter:
+        await self._ensure_refs()
+        tmp_path = os.path.join(self.tmp_dir, f'{uuid.uuid4().hex}.part')
+        return await asyncio.to_thread(LocalWriter, self, tmp_path)
+
+    async def acquire(self, sha256: str) -> Optional[str]:
+        """Add a reference to a stored blob with this content, if there is one"""
+        await self._ensure_refs()
+
+        def run(conn):
+            rows = conn.execute(
+                "UPDATE blob_refs SET refs = refs + 1 WHERE blob_id = ? RETURNING refs", (sha256,)
+            ).fetchall()
+            if rows:
+                # Fresh mtime keeps the orphan sweep off it until the song is saved
+                os.utime(self.path_for(sha256))
+            return bool(rows)
+
+        return sha256 if await self.refs.write(run) else None
+
+    def _open(self, blob_id: str) -> LocalBlob:
+        path = self._resolve(blob_id)
+        return LocalBlob(blob_id, path, os.stat(path))
+
+    async def open(self, blob_id: str) -> LocalBlob:
+        return await asyncio.to_thread(self._open, blob_id)
+
+    def _read(self, blob_id: str) -> bytes:
+        with open(self._resolve(blob_id), 'rb') as f:
+            data = f.read()
+        LOCAL_BYTES_READ.inc(len(data))
+        return data
+
+    async def read(self, blob_id: str) -> bytes:
+        return await asyncio.to_thread(self._read, blob_id)
+
+    async def release(self, blob_id: str):
+        """Drop one reference; the file is deleted with the last one"""
+        await self._ensure_refs()
+
+        def run(conn):
+            rows = conn.execute(
+                "UPDATE blob_refs SET refs = refs - 1 WHERE blob_id = ? RETURNING refs", (blob_id,)
+            ).fetchall()
+            if rows and rows[0][0] > 0:
+                return
+            # Last reference, or a blob from before refcounting
+            conn.execute("DELETE FROM blob_refs WHERE blob_id = ?", (blob_id,))
+            try:
+                os.unlink(self._resolve(blob_id))
+            except (FileNotFoundError, BlobNotFound):
+                if not rows:
+                    raise BlobNotFound(blob_id)
+
+        await self.refs.write(run)
+
+    def _candidates(self):
+        """(blob_id, path) for every stored blob, sharded and legacy"""
+        for entry in os.scandir(self.root):
+            if entry.is_file():
+                blob_id = entry.name.split('.', 1)[0]
+                if _LOCAL_ID_RE.match(blob_id) and blob_id != entry.name:
+                    yield blob_id, entry.path
+            elif entry.is_dir() and len(entry.name) == 2:
+                for path in glob.glob(os.path.join(entry.path, '??', '*')):
+                    blob_id = os.path.basename(path)
+                    if _LOCAL_ID_RE.match(blob_id):
+                        yield blob_id, path
+
+    async def sweep_orphans(self, referenced: Collection[str], cutoff: datetime) -> Dict[str, int]:
+        """Delete blobs no song references and abandoned upload temp files.
+
+        Only files untouched since ``cutoff`` qualify (acquire refreshes
+        the mtime). Each deletion rechecks the mtime inside a refs
+        transaction, so it can't interleave with an acquire.
+        """
+        await self._ensure_refs()
+        limit = cutoff.replace(tzinfo=timezone.utc).timestamp()
+        removed = {'files': 0, 'tmp': 0}
+
+        def remove(conn, blob_id: str, path: str) -> bool:
+            try:
+                if os.stat(path).st_mtime >= limit:
+                    return False
+                os.unlink(path)
+            except FileNotFoundError:
+                return False
+            conn.execute("DELETE FROM blob_refs WHERE blob_id = ?", (blob_id,))
+            return True
+
+        def find_orphans():
+            orphans = []
+            for blob_id, path in self._candidates():
+                try:
+                    if blob_id not in referenced and os.stat(path).st_mtime < limit:
+                        orphans.append((blob_id, path))
+                except FileNotFoundError:
+                    pass
+            return orphans
+
+        for blob_id, path in await asyncio.to_thread(find_orphans):
+            if await self.refs.write(lambda conn: remove(conn, blob_id, path)):
+                removed['files'] += 1
+
+        def sweep_tmp() -> int:
+            count = 0
+            for entry in os.scandir(self.tmp_dir):
+                try:
+                    if entry.stat().st_mtime < limit:
+                        os.unlink(entry.path)
+                        count += 1
+                except FileNotFoundError:
+                    pass
+            return count
+
+        removed['tmp'] = await asyncio.to_thread(sweep_tmp)
+        return removed
+
+
+def create_blob_store(backend: str = AUDIO_STORAGE, db=None, root: str = AUDIO_STORAGE_DIR):
+    """Build the configured audio store"""
+    if backend == 'gridfs':
+        if db is None:
+            raise ValueError("The gridfs audio store needs a MongoDB database")
+        return GridFSBlobStore(db)
+    if backend == 'local':
+        return LocalBlobStore(root)
+    raise ValueError(f"Unknown AUDIO_STORAGE backend: {backend}")
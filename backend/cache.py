@@ -0,0 +1,137 @@
+import time
+import weakref
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Optional
+
+import metrics
+
+_MISSING = object()
+
+# Live caches, reported on /metrics
+_caches: 'weakref.WeakSet[TTLCache]' = weakref.WeakSet()
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries also expire after a fixed TTL"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0, name: str = 'cache'):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        _caches.add(self)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key, _MISSING)
+        if entry is _MISSING:
+            self.misses += 1
+            return default
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def get_many(self, keys: Iterable[Hashable]) -> Dict[Hashable, Any]:
+        """Return the cached subset of keys (missing keys are left out)"""
+        found = {}
+        for key in keys:
+            value = self.get(key, _MISSING)
+            if value is not _MISSING:
+                found[key] = value
+        return found
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.pop(key, _MISSING)
+        if entry is _MISSING:
+            return default
+        return entry[1]
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'name': self.name,
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hitRate': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def _collect_cache_metrics():
+    caches = sorted(_caches, key=lambda cache: cache.name)
+    yield ('cache_hits_total', 'counter', 'Cache lookups that found a live entry',
+           [({'cache': cache.name}, cache.hits) for cache in caches])
+    yield ('cache_misses_total', 'counter', 'Cache lookups that found nothing or an expired entry',
+           [({'cache': cache.name}, cache.misses) for cache in caches])
+    yield ('cache_evictions_total', 'counter', 'Entries dropped to stay under maxsize',
+           [({'cache': cache.name}, cache.evictions) for cache in caches])
+    yield ('cache_entries', 'gauge', 'Entries currently held',
+           [({'cache': cache.name}, len(cache)) for cache in caches])
+
+
+metrics.register_collector(_collect_cache_metrics)
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one upstream call.
+
+    The call runs as its own task, so a caller that is cancelled (e.g. a
+    client disconnect) does not cancel it for the other waiters. Every
+    waiter receives the same result or the same exception.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        else:
+            self.followers += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the exception as retrieved in case every waiter went away
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict:
+        return {
+            'inFlight': len(self._calls),
+            'leaders': self.leaders,
+            'followers': self.followers,
+        }
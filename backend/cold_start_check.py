@@ -0,0 +1,157 @@
+"""Cold-start check for the API server.
+
+Starts the app (server_prod:app by default) in a fresh process under
+``python -X importtime``, --runs times, and times each from spawn until
+the first response to --path. Prints the median and the server's own
+phase breakdown (see startup_profile.py), then the imports that took
+longest: by top-level package, and by module. Exits 1 if the median is
+over the budget, so CI can hold the line on scale-from-zero latency.
+
+    python backend/cold_start_check.py                      # budget COLD_START_BUDGET_MS
+    python backend/cold_start_check.py --budget-ms 1500 --runs 5
+    MONGO_URL=... DB_NAME=... python backend/cold_start_check.py --app server:app
+"""
+import os
+import re
+import sys
+import time
+import socket
+import argparse
+import tempfile
+import statistics
+import subprocess
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+COLD_START_BUDGET_MS = float(os.environ.get('COLD_START_BUDGET_MS', '3000'))
+
+# "import time: <self us> | <cumulative us> | <indent><module>"
+_IMPORT_TIME_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$')
+_STARTUP_LINE_RE = re.compile(r'^Startup: .*$', re.MULTILINE)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_response(url: str, process: subprocess.Popen, timeout: float) -> float:
+    """Poll until the server answers at all; returns perf_counter() at that moment"""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with code {process.returncode}")
+        try:
+            with urllib.request.urlopen(url, timeout=5):
+                return time.perf_counter()
+        except urllib.error.HTTPError:
+            # Any status means the app is serving
+            return time.perf_counter()
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.005)
+    raise RuntimeError(f"{url} did not answer within {timeout:.0f}s")
+
+
+def cold_start(app: str, path: str, timeout: float) -> Tuple[float, str]:
+    """One cold start: seconds until the first response, and the server's output"""
+    port = free_port()
+    env = {**os.environ, 'PYTHONUNBUFFERED': '1', 'PORT': str(port)}
+    command = [sys.executable, '-X', 'importtime', '-m', 'uvicorn', app,
+               '--host', '127.0.0.1', '--port', str(port)]
+    # A file, not a pipe: the importtime output alone can fill a pipe buffer
+    with tempfile.TemporaryFile('w+') as log:
+        spawned = time.perf_counter()
+        process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+        try:
+            answered = wait_for_response(f'http://127.0.0.1:{port}{path}', process, timeout)
+        except RuntimeError:
+            process.kill()
+            process.wait()
+            log.seek(0)
+            print(log.read()[-4000:], file=sys.stderr)
+            raise
+        finally:
+            if process.poll() is None:
+                process.terminate()
+                try:
+                    process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    process.wait()
+        log.seek(0)
+        return answered - spawned, log.read()
+
+
+def parse_import_times(output: str) -> List[Tuple[str, int, int]]:
+    """(module, self us, cumulative us) for every import the process made"""
+    imports = []
+    for line in output.splitlines():
+        match = _IMPORT_TIME_RE.match(line)
+        if match:
+            imports.append((match.group(4), int(match.group(1)), int(match.group(2))))
+    return imports
+
+
+def by_package(imports: List[Tuple[str, int, int]]) -> Dict[str, int]:
+    """Self time summed per top-level package"""
+    totals: Dict[str, int] = defaultdict(int)
+    for module, self_us, _ in imports:
+        totals[module.split('.', 1)[0]] += self_us
+    return totals
+
+
+def print_report(durations: List[float], output: str, top: int):
+    median = statistics.median(durations)
+    runs = ', '.join(f'{duration * 1000:.0f}' for duration in durations)
+    print(f"Cold start to first response: {median * 1000:.0f} ms median (runs: {runs} ms)")
+    startup_line = _STARTUP_LINE_RE.search(output)
+    if startup_line:
+        print(startup_line.group(0))
+
+    imports = parse_import_times(output)
+    if not imports:
+        return
+    total_ms = sum(self_us for _, self_us, _ in imports) / 1000
+    print(f"\nImports: {len(imports)} modules, {total_ms:.0f} ms")
+    packages = sorted(by_package(imports).items(), key=lambda item: item[1], reverse=True)
+    print(f"\n{'package':<32} {'ms':>8}")
+    for package, self_us in packages[:top]:
+        print(f"{package:<32} {self_us / 1000:>8.1f}")
+    modules = sorted(imports, key=lambda item: item[1], reverse=True)
+    print(f"\n{'module':<48} {'self ms':>8} {'cumul ms':>9}")
+    for module, self_us, cumulative_us in modules[:top]:
+        print(f"{module:<48} {self_us / 1000:>8.1f} {cumulative_us / 1000:>9.1f}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Creator360 API cold-start check')
+    parser.add_argument('--app', default='server_prod:app', help='uvicorn app to start (module:attribute)')
+    parser.add_argument('--path', default='/metrics', help='first request; any HTTP response counts')
+    parser.add_argument('--runs', type=int, default=3, help='cold starts to take the median of')
+    parser.add_argument('--budget-ms', type=float, default=COLD_START_BUDGET_MS,
+                        help='fail if the median is over this (default COLD_START_BUDGET_MS or 3000)')
+    parser.add_argument('--timeout', type=float, default=60.0, help='seconds to wait for each start')
+    parser.add_argument('--top', type=int, default=15, help='slowest imports to list')
+    args = parser.parse_args(argv)
+
+    durations = []
+    output = ''
+    for _ in range(max(args.runs, 1)):
+        duration, output = cold_start(args.app, args.path, args.timeout)
+        durations.append(duration)
+    # The last run's profile: by then the first has written any .pyc files
+    print_report(durations, output, args.top)
+
+    median_ms = statistics.median(durations) * 1000
+    if median_ms > args.budget_ms:
+        print(f"\nCold start {median_ms:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+        sys.exit(1)
+    print(f"\nCold start {median_ms:.0f} ms is within the {args.budget_ms:.0f} ms budget")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+import os
+import time
+import itertools
+from typing import Dict, List, Optional
+
+from cache import SingleFlight, TTLCache
+from sqlite_db import SQLiteDatabase
+
+# Balances can also change in the LINE bot's process, which can't
+# invalidate our cache; the TTL bounds how stale a balance can get.
+CREDITS_CACHE_TTL = float(os.environ.get('CREDITS_CACHE_TTL', '5'))
+CREDITS_CACHE_SIZE = int(os.environ.get('CREDITS_CACHE_SIZE', '10000'))
+
+
+class UnknownUser(LookupError):
+    pass
+
+
+class InsufficientCredits(ValueError):
+    pass
+
+
+class CreditsLedger:
+    """User credit balances with an append-only transaction log.
+
+    ``users.credits`` stays the balance of record (the LINE bot reads and
+    writes it too). Every change made here updates it with a relative
+    UPDATE and appends a credit_transactions row in the same write
+    transaction, so concurrent changes can't overwrite each other and the
+    log always matches the balance. Reads are served from a read-through
+    cache that writes invalidate.
+    """
+
+    def __init__(self, db: SQLiteDatabase):
+        self.db = db
+        self._balances = TTLCache(maxsize=CREDITS_CACHE_SIZE, ttl=CREDITS_CACHE_TTL, name='credits')
+        self._flight = SingleFlight()
+        # user_id -> [generation, loads in flight], kept only while a load
+        # runs. Writes move it to a new generation, so a load that raced a
+        # write doesn't fill the cache and later reads don't join it.
+        self._loads: Dict[str, List[int]] = {}
+        # Generations are never reused, even after an entry is dropped
+        self._generations = itertools.count(1)
+
+    @staticmethod
+    def migrate(conn):
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS credit_transactions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT NOT NULL,
+                amount INTEGER NOT NULL,
+                balance_after INTEGER NOT NULL,
+                reason TEXT,
+                created_at REAL NOT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_credit_transactions_user
+            ON credit_transactions (user_id, id)
+        """)
+
+    def cache_stats(self) -> Dict:
+        return {**self._balances.stats(), **self._flight.stats()}
+
+    async def get_balance(self, user_id: str) -> int:
+        balance = self._balances.get(user_id)
+        if balance is not None:
+            return balance
+        # Keyed by generation so reads after a write never join an older load
+        load = self._loads.get(user_id)
+        if load is None:
+            load = self._loads[user_id] = [next(self._generations), 0]
+        generation = load[0]
+        return await self._flight.do((user_id, generation), lambda: self._load_balance(user_id, load, generation))
+
+    async def _load_balance(self, user_id: str, load: List[int], generation: int) -> int:
+        load[1] += 1
+        try:
+            row = await self.db.fetchone("SELECT credits FROM users WHERE line_user_id = ?", (user_id,))
+        finally:
+            load[1] -= 1
+            if load[1] == 0 and self._loads.get(user_id) is load:
+                del self._loads[user_id]
+        balance = (row['credits'] or 0) if row else 0
+        if load[0] == generation:
+            self._balances.set(user_id, balance)
+        return balance
+
+    def _invalidate(self, user_id: str):
+        load = self._loads.get(user_id)
+        if load is not None:
+            load[0] = next(self._generations)
+        self._balances.pop(user_id)
+
+    async def add(self, user_id: str, amount: int, reason: Optional[str] = None) -> int:
+        """Apply a credit (or debit, if negative) and return the new balance"""
+        def run(conn):
+            rows = conn.execute("""
+                UPDATE users SET credits = COALESCE(credits, 0) + ?
+                WHERE line_user_id = ? AND COALESCE(credits, 0) + ? >= 0
+                RETURNING credits
+            """, (amount, user_id, amount)).fetchall()
+            if not rows:
+                if conn.execute("SELECT 1 FROM users WHERE line_user_id = ?", (user_id,)).fetchone() is None:
+                    raise UnknownUser(user_id)
+                raise InsufficientCredits(user_id)
+            balance = rows[0]['credits']
+            conn.execute("""
+                INSERT INTO credit_transactions (user_id, amount, balance_after, reason, created_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, (user_id, amount, balance, reason, time.time()))
+            return balance
+
+        self._invalidate(user_id)
+        try:
+            return await self.db.write(run)
+        finally:
+            # Again after commit, in case a read refilled it in between
+            self._invalidate(user_id)
+
+    async def history(self, user_id: str, limit: int = 50, before: Optional[int] = None) -> List[Dict]:
+        """Newest-first transactions; pass the last id as ``before`` for the next page"""
+        if before is None:
+            return await self.db.fetchall("""
+                SELECT * FROM credit_transactions WHERE user_id = ?
+                ORDER BY id DESC LIMIT ?
+            """, (user_id, limit))
+        return await self.db.fetchall("""
+            SELECT * FROM credit_transactions WHERE user_id = ? AND id < ?
+            ORDER BY id DESC LIMIT ?
+        """, (user_id, before, limit))
@@ -1,118 +1,230 @@
 import os
-from motor.motor_asyncio import AsyncIOMotorGridFSBucket
-from fastapi import UploadFile
-from bson import ObjectId
-import aiofiles
-from mutagen import File as MutagenFile
-from mutagen.mp3 import MP3
-from mutagen.wave import WAVE
-from mutagen.mp4 import MP4
-from mutagen.flac import FLAC
-from typing import Dict, Optional
+import asyncio
+import hashlib
 import tempfile
+from contextlib import asynccontextmanager
+from fastapi import UploadFile
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from typing import AsyncIterator, Collection, Dict, Optional, Tuple
+
+from audio_metadata import parse_audio_metadata, default_metadata
+from blob_store import Blob, BlobNotFound
+
+# Upload limits
+UPLOAD_CHUNK_SIZE = 255 * 1024  # matches the GridFS default chunk size
+MAX_UPLOAD_SIZE = int(os.environ.get('MAX_UPLOAD_SIZE_MB', '250')) * 1024 * 1024
+# Room in an upload request body for multipart boundaries and text fields
+UPLOAD_FORM_OVERHEAD = 1024 * 1024
+
+ALLOWED_AUDIO_TYPES = ['audio/mpeg', 'audio/wav', 'audio/mp4', 'audio/x-m4a', 'audio/flac', 'audio/ogg']
+ALLOWED_AUDIO_EXTENSIONS = ['.mp3', '.wav', '.m4a', '.flac', '.ogg']
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+class EmptyUpload(ValueError):
+    pass
+
+
+class InvalidAudioType(ValueError):
+    pass
+
+
+def validate_audio_upload(file: UploadFile):
+    file_ext = os.path.splitext(file.filename or '')[1].lower()
+    if file.content_type not in ALLOWED_AUDIO_TYPES and file_ext not in ALLOWED_AUDIO_EXTENSIONS:
+        raise InvalidAudioType("Invalid file type. Allowed: MP3, WAV, M4A, FLAC, OGG")
+
+
+class UploadSizeLimit:
+    """Rejects oversized upload requests before their body is spooled.
+
+    Starlette parses (and spools to disk) the whole multipart body before
+    the endpoint runs, so the endpoint's own size check comes too late to
+    save the transfer. On ``paths`` this answers 413 straight away when
+    Content-Length is over the limit, and stops reading a body without
+    one (chunked) as soon as it passes the limit. The limit is the file
+    limit plus ``UPLOAD_FORM_OVERHEAD``; the exact file size is still
+    checked by ``hash_upload``.
+    """
+
+    def __init__(self, app: ASGIApp, paths: Collection[str], max_size: int = MAX_UPLOAD_SIZE):
+        self.app = app
+        self.paths = set(paths)
+        self.max_size = max_size
+        self.max_body = max_size + UPLOAD_FORM_OVERHEAD
+
+    def _too_large(self) -> JSONResponse:
+        detail = f"File exceeds the {self.max_size // (1024 * 1024)} MB limit"
+        return JSONResponse({'detail': detail}, status_code=413, headers={'Connection': 'close'})
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http' or scope['path'] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        length = dict(scope['headers']).get(b'content-length')
+        if length is not None and length.isdigit() and int(length) > self.max_body:
+            await self._too_large()(scope, receive, send)
+            return
+
+        received = 0
+        rejected = False
+
+        async def limited_receive() -> Message:
+            nonlocal received, rejected
+            if rejected:
+                return {'type': 'http.disconnect'}
+            message = await receive()
+            if message['type'] == 'http.request':
+                received += len(message.get('body', b''))
+                if received > self.max_body:
+                    # Answer now and tell the app the client went away,
+                    # so it stops reading; its own reply is dropped
+                    rejected = True
+                    await self._too_large()(scope, receive, send)
+                    return {'type': 'http.disconnect'}
+            return message
+
+        async def guarded_send(message: Message):
+            if not rejected:
+                await send(message)
+
+        await self.app(scope, limited_receive, guarded_send)
+
+
+def hash_upload(fileobj, max_size: int) -> Tuple[str, int]:
+    """SHA-256 and size of a spooled upload, enforcing the size limit"""
+    sha256 = hashlib.sha256()
+    size = 0
+    fileobj.seek(0)
+    while True:
+        chunk = fileobj.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_size:
+            raise UploadTooLarge(f"File exceeds the {max_size // (1024 * 1024)} MB limit")
+        sha256.update(chunk)
+    return sha256.hexdigest(), size
+
 
 class FileService:
-    def __init__(self, db):
-        self.db = db
-        self.fs = AsyncIOMotorGridFSBucket(db)
+    """Audio upload/download on top of a blob store (GridFS or local disk)"""
+
+    def __init__(self, store):
+        self.store = store
+
+    async def store_upload(self, file: UploadFile, max_size: int = MAX_UPLOAD_SIZE) -> Dict:
+        """Store an upload, deduplicated by SHA-256"""
+        return await self.store_file(file.file, file.filename, file.content_type, max_size)
+
+    async def store_file(self, fileobj, filename: str, content_type: Optional[str],
+                         max_size: int = MAX_UPLOAD_SIZE) -> Dict:
+        """Store a local file object, deduplicated by SHA-256.
+
+        The file is hashed first (off the event loop). If the store
+        already holds that content this just adds a reference to it;
+        otherwise it is piped into the store one chunk at a time and the
+        partial blob is aborted on any failure or cancellation.
+        """
+        digest, size = await asyncio.to_thread(hash_upload, fileobj, max_size)
+        if size == 0:
+            raise EmptyUpload("Empty file")
+
+        file_id = await self.store.acquire(digest)
+        deduplicated = file_id is not None
+        if not deduplicated:
+            await asyncio.to_thread(fileobj.seek, 0)
+            writer = await self.store.create(filename, content_type)
+            try:
+                while True:
+                    chunk = await asyncio.to_thread(fileobj.read, UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    await writer.write(chunk)
+
+                file_id = await writer.commit({
+                    'contentType': content_type,
+                    'size': size,
+                    'sha256': digest
+                })
+            except BaseException:
+                try:
+                    await writer.abort()
+                except Exception as e:
+                    print(f"Upload abort error: {e}")
+                raise
+
+        return {
+            'fileId': file_id,
+            'fileName': filename,
+            'fileSize': size,
+            'sha256': digest,
+            'deduplicated': deduplicated
+        }
 
     async def upload_audio_file(self, file: UploadFile) -> Dict:
         try:
-            # Read file content
-            content = await file.read()
-            
-            # Save to GridFS
-            file_id = await self.fs.upload_from_stream(
-                file.filename,
-                content,
-                metadata={
-                    'contentType': file.content_type,
-                    'size': len(content)
-                }
-            )
-
-            # Extract metadata from audio file
-            metadata = await self._extract_metadata(content, file.filename)
-
-            return {
-                'fileId': str(file_id),
-                'fileName': file.filename,
-                'fileSize': len(content),
-                'metadata': metadata
-            }
+            stored = await self.store_upload(file)
+
+            # Extract metadata from the spooled upload
+            await file.seek(0)
+            metadata = await self._extract_metadata(file.file, file.filename)
+
+            return {**stored, 'metadata': metadata}
 
         except Exception as e:
             print(f"File upload error: {e}")
             raise
 
-    async def _extract_metadata(self, content: bytes, filename: str) -> Dict:
+    async def _extract_metadata(self, fileobj, filename: str) -> Dict:
         try:
-            # Save to temp file to use mutagen
-            with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(filename)[1]) as tmp:
-                tmp.write(content)
-                tmp_path = tmp.name
-
-            try:
-                audio = MutagenFile(tmp_path, easy=True)
-                
-                if audio is None:
-                    return self._default_metadata(filename)
-
-                # Extract common tags
-                title = self._get_tag(audio, ['title', 'TIT2'])
-                artist = self._get_tag(audio, ['artist', 'TPE1', 'artist'])
-                album = self._get_tag(audio, ['album', 'TALB'])
-                
-                # Get duration
-                duration = 0
-                if hasattr(audio.info, 'length'):
-                    duration = int(audio.info.length)
-
-                return {
-                    'title': title or os.path.splitext(filename)[0],
-                    'artist': artist or 'Unknown Artist',
-                    'album': album or 'Unknown Album',
-                    'duration': duration
-                }
-
-            finally:
-                # Clean up temp file
-                if os.path.exists(tmp_path):
-                    os.unlink(tmp_path)
+            # mutagen is blocking; keep it off the event loop
+            tags = await asyncio.to_thread(parse_audio_metadata, fileobj, filename)
+            defaults = default_metadata(filename)
+            return {key: tags[key] or defaults[key] for key in defaults}
 
         except Exception as e:
             print(f"Metadata extraction error: {e}")
-            return self._default_metadata(filename)
-
-    def _get_tag(self, audio, tag_names: list) -> Optional[str]:
-        for tag in tag_names:
-            if tag in audio:
-                value = audio[tag]
-                if isinstance(value, list) and len(value) > 0:
-                    return str(value[0])
-                elif isinstance(value, str):
-                    return value
-        return None
-
-    def _default_metadata(self, filename: str) -> Dict:
-        return {
-            'title': os.path.splitext(filename)[0],
-            'artist': 'Unknown Artist',
-            'album': 'Unknown Album',
-            'duration': 0
-        }
+            return default_metadata(filename)
+
+    @asynccontextmanager
+    async def local_copy(self, file_id: str, tmp_dir: Optional[str] = None) -> AsyncIterator[str]:
+        """Path to a blob's content on local disk, for tools that want a file.
 
-    async def stream_audio_file(self, file_id: str):
+        Local blobs are used in place. Others are streamed into a temp
+        file (removed on exit), never held in memory whole.
+        """
+        blob = await self.stream_audio_file(file_id)
+        if blob.path is not None:
+            yield blob.path
+            return
+        fd, path = tempfile.mkstemp(prefix='audio-', dir=tmp_dir)
         try:
-            grid_out = await self.fs.open_download_stream(ObjectId(file_id))
-            return grid_out
+            with os.fdopen(fd, 'wb') as f:
+                async for chunk in blob.iter_range(0, blob.size - 1, UPLOAD_CHUNK_SIZE * 4):
+                    await asyncio.to_thread(f.write, chunk)
+            yield path
+        finally:
+            os.unlink(path)
+
+    async def stream_audio_file(self, file_id: str) -> Blob:
+        try:
+            return await self.store.open(file_id)
+        except BlobNotFound:
+            raise
         except Exception as e:
             print(f"Stream error: {e}")
             raise
 
     async def delete_audio_file(self, file_id: str):
+        """Release this song's reference; the blob goes with the last one"""
         try:
-            await self.fs.delete(ObjectId(file_id))
+            await self.store.release(file_id)
         except Exception as e:
             print(f"Delete error: {e}")
             raise
@@ -0,0 +1,89 @@
+from datetime import datetime
+from typing import Dict, List
+
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import PyMongoError
+
+# Indexes the API relies on, per collection. Names are stable so the
+# reconciler can detect specs that changed between releases.
+INDEXES: Dict[str, List[IndexModel]] = {
+    'songs': [
+        # One library entry per YouTube video
+        IndexModel(
+            [('videoId', ASCENDING)],
+            name='videoId_unique',
+            unique=True,
+            partialFilterExpression={'source': 'youtube', 'videoId': {'$type': 'string'}}
+        ),
+        # Keyset pagination order for GET /api/songs
+        IndexModel([('createdAt', ASCENDING), ('_id', ASCENDING)], name='createdAt_id'),
+        # Metadata worker requeue scan
+        IndexModel([('metadataStatus', ASCENDING)], name='metadataStatus', sparse=True),
+        # Transcoder requeue scan
+        IndexModel([('transcodeStatus', ASCENDING)], name='transcodeStatus', sparse=True),
+        # Songs claimed by an in-progress delete
+        IndexModel([('deleteToken', ASCENDING)], name='deleteToken', sparse=True),
+    ],
+    'playlists': [
+        # Multikey: find the playlists that contain a song
+        IndexModel([('songs', ASCENDING)], name='songs'),
+        IndexModel([('createdAt', ASCENDING), ('_id', ASCENDING)], name='createdAt_id'),
+    ],
+    'fs.files': [
+        # Content-addressed lookup for upload dedupe. Unique, so concurrent
+        # uploads of the same content can't both store it (GridFSWriter
+        # falls back to a reference). A new name keeps the old sparse
+        # index serving lookups if existing duplicates fail this build.
+        IndexModel(
+            [('metadata.sha256', ASCENDING)],
+            name='metadata_sha256_unique',
+            unique=True,
+            partialFilterExpression={'metadata.sha256': {'$exists': True}}
+        ),
+    ],
+}
+
+# Index options that make two specs with the same name different
+_SPEC_OPTIONS = ('unique', 'sparse', 'partialFilterExpression', 'expireAfterSeconds')
+
+
+def _same_spec(current: Dict, wanted: Dict) -> bool:
+    if list(current['key']) != list(wanted['key'].items()):
+        return False
+    return all(current.get(option) == wanted.get(option) for option in _SPEC_OPTIONS)
+
+
+async def ensure_indexes(db, status: Dict) -> Dict:
+    """Create missing indexes and rebuild ones whose spec changed.
+
+    Progress is written into ``status`` (keyed "collection.index") as the
+    builds run, so it can be reported while startup continues.
+    """
+    for collection_name, models in INDEXES.items():
+        collection = db[collection_name]
+        try:
+            existing = await collection.index_information()
+        except PyMongoError as e:
+            for model in models:
+                status[f"{collection_name}.{model.document['name']}"] = {'state': 'failed', 'error': str(e)}
+            continue
+
+        for model in models:
+            wanted = model.document
+            key = f"{collection_name}.{wanted['name']}"
+            current = existing.get(wanted['name'])
+            if current and _same_spec(current, wanted):
+                status[key] = {'state': 'ready'}
+                continue
+
+            status[key] = {'state': 'building', 'startedAt': datetime.utcnow()}
+            try:
+                if current:
+                    await collection.drop_index(wanted['name'])
+                await collection.create_indexes([model])
+                status[key] = {'state': 'ready', 'builtAt': datetime.utcnow()}
+            except PyMongoError as e:
+                # e.g. duplicate videoIds already in the collection
+                print(f"Index build error for {key}: {e}")
+                status[key] = {'state': 'failed', 'error': str(e)}
+    return status
@@ -0,0 +1,273 @@
+import os
+import time
+import uuid
+import socket
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Set
+
+from sqlite_db import SQLiteDatabase
+
+logger = logging.getLogger("Creator360.jobs")
+
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+JOB_LEASE_SECONDS = float(os.environ.get('JOB_LEASE_SECONDS', '60'))
+JOB_HEARTBEAT_SECONDS = JOB_LEASE_SECONDS / 4
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', '3'))
+JOB_RETRY_BASE_SECONDS = float(os.environ.get('JOB_RETRY_BASE_SECONDS', '5'))
+JOB_POLL_SECONDS = float(os.environ.get('JOB_POLL_SECONDS', '1'))
+# Run generation workers inside the API process (set to 0 and start
+# `python server_v2.py --worker` processes to scale them separately)
+JOB_WORKERS_IN_API = os.environ.get('JOB_WORKERS_IN_API', '1') == '1'
+
+TERMINAL_STATUSES = ('completed', 'failed')
+
+# Queue bookkeeping added to projects_v2: name -> column definition
+QUEUE_COLUMNS = {
+    'attempts': 'INTEGER NOT NULL DEFAULT 0',
+    'max_attempts': f'INTEGER NOT NULL DEFAULT {JOB_MAX_ATTEMPTS}',
+    'next_run_at': 'REAL NOT NULL DEFAULT 0',
+    'lease_owner': 'TEXT',
+    'lease_expires_at': 'REAL',
+    'error': 'TEXT',
+    'updated_at': 'REAL',
+}
+
+
+class JobQueue:
+    """Durable AI video job queue stored in the projects_v2 table.
+
+    Workers claim a job by taking a time-limited lease and keep it alive
+    with heartbeats. A job whose lease lapses (its worker died) is
+    claimed again; failures retry with exponential backoff up to
+    max_attempts. Every transition is a single serialized write, so any
+    number of worker processes can share the table.
+    """
+
+    def __init__(self, db: SQLiteDatabase):
+        self.db = db
+        # Wakes long-polls/SSE streams in this process; others poll.
+        # Each waiter removes its own event, so finished jobs leave nothing
+        self._waiters: Dict[str, Set[asyncio.Event]] = {}
+
+    @staticmethod
+    def migrate(conn):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS projects_v2 (
+                id TEXT PRIMARY KEY,
+                user_id TEXT,
+                product_name TEXT,
+                product_url TEXT,
+                status TEXT,
+                script TEXT,
+                video_url TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(projects_v2)")}
+        for name, definition in QUEUE_COLUMNS.items():
+            if name not in columns:
+                conn.execute(f"ALTER TABLE projects_v2 ADD COLUMN {name} {definition}")
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_projects_v2_queue
+            ON projects_v2 (status, next_run_at, created_at)
+        """)
+
+    def _notify(self, job_id: str):
+        for event in self._waiters.get(job_id, ()):
+            event.set()
+
+    async def enqueue(self, user_id: str, product_name: str, product_url: str, job_id: Optional[str] = None) -> str:
+        job_id = job_id or str(uuid.uuid4())
+        await self.db.execute("""
+            INSERT INTO projects_v2 (id, user_id, product_name, product_url, status, next_run_at, updated_at)
+            VALUES (?, ?, ?, ?, 'queued', 0, ?)
+        """, (job_id, user_id, product_name, product_url, time.time()))
+        return job_id
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        return await self.db.fetchone("SELECT * FROM projects_v2 WHERE id = ?", (job_id,))
+
+    async def claim(self, owner: str) -> Optional[Dict]:
+        """Lease the oldest runnable job, recovering ones whose lease expired"""
+        def run(conn):
+            now = time.time()
+            # Jobs that keep killing their worker stop being retried
+            failed = conn.execute("""
+                UPDATE projects_v2
+                SET status = 'failed', error = 'Worker lease expired too many times',
+                    lease_owner = NULL, lease_expires_at = NULL, updated_at = ?
+                WHERE status = 'processing'
+                  AND (lease_expires_at IS NULL OR lease_expires_at < ?)
+                  AND attempts >= max_attempts
+                RETURNING id
+            """, (now, now)).fetchall()
+            claimed = conn.execute("""
+                UPDATE projects_v2
+                SET status = 'processing', lease_owner = ?, lease_expires_at = ?,
+                    attempts = attempts + 1, updated_at = ?
+                WHERE id = (
+                    SELECT id FROM projects_v2
+                    WHERE (status = 'queued' AND next_run_at <= ?)
+                       OR (status = 'processing' AND (lease_expires_at IS NULL OR lease_expires_at < ?))
+                    ORDER BY created_at
+                    LIMIT 1
+                )
+                RETURNING *
+            """, (owner, now + JOB_LEASE_SECONDS, now, now, now)).fetchall()
+            return [row['id'] for row in failed], claimed
+
+        failed, rows = await self.db.write(run)
+        for job_id in failed:
+            self._notify(job_id)
+        if not rows:
+            return None
+        job = dict(rows[0])
+        self._notify(job['id'])
+        return job
+
+    async def heartbeat(self, job_id: str, owner: str) -> bool:
+        """Extend the lease; False means another worker took the job over"""
+        changed = await self.db.execute("""
+            UPDATE projects_v2 SET lease_expires_at = ?
+            WHERE id = ? AND lease_owner = ? AND status = 'processing'
+        """, (time.time() + JOB_LEASE_SECONDS, job_id, owner))
+        return changed > 0
+
+    async def complete(self, job_id: str, owner: str, script: str, video_url: str):
+        await self.db.execute("""
+            UPDATE projects_v2
+            SET status = 'completed', script = ?, video_url = ?, error = NULL,
+                lease_owner = NULL, lease_expires_at = NULL, updated_at = ?
+            WHERE id = ? AND lease_owner = ?
+        """, (script, video_url, time.time(), job_id, owner))
+        self._notify(job_id)
+
+    async def fail(self, job_id: str, owner: str, error: str):
+        """Requeue with exponential backoff, or mark failed after max_attempts"""
+        def run(conn):
+            row = conn.execute(
+                "SELECT attempts, max_attempts FROM projects_v2 WHERE id = ? AND lease_owner = ?",
+                (job_id, owner)
+            ).fetchone()
+            if row is None:
+                return
+            now = time.time()
+            if row['attempts'] >= row['max_attempts']:
+                conn.execute("""
+                    UPDATE projects_v2
+                    SET status = 'failed', error = ?, lease_owner = NULL, lease_expires_at = NULL, updated_at = ?
+                    WHERE id = ?
+                """, (error, now, job_id))
+            else:
+                delay = JOB_RETRY_BASE_SECONDS * 2 ** (row['attempts'] - 1)
+                conn.execute("""
+                    UPDATE projects_v2
+                    SET status = 'queued', error = ?, next_run_at = ?,
+                        lease_owner = NULL, lease_expires_at = NULL, updated_at = ?
+                    WHERE id = ?
+                """, (error, now + delay, now, job_id))
+
+        await self.db.write(run)
+        self._notify(job_id)
+
+    async def wait_for_change(self, job_id: str, known_status: Optional[str], timeout: float) -> Optional[Dict]:
+        """Long-poll: return the job once its status differs from known_status, or at timeout"""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = await self.get(job_id)
+            if job is None or job['status'] in TERMINAL_STATUSES or job['status'] != known_status:
+                return job
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return job
+            event = asyncio.Event()
+            waiters = self._waiters.setdefault(job_id, set())
+            waiters.add(event)
+            try:
+                # Workers in other processes can't set the event, so also poll
+                await asyncio.wait_for(event.wait(), min(remaining, JOB_POLL_SECONDS))
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                waiters.discard(event)
+                if not waiters and self._waiters.get(job_id) is waiters:
+                    del self._waiters[job_id]
+
+
+class WorkerPool:
+    """Runs a blocking job handler on its own thread pool.
+
+    The handler receives the job row and returns {'script', 'video_url'};
+    it runs outside the event loop, so slow generation never stalls API
+    requests served by the same process.
+    """
+
+    def __init__(self, queue: JobQueue, handler: Callable[[Dict], Dict], concurrency: int = JOB_WORKERS):
+        self.queue = queue
+        self.handler = handler
+        self.concurrency = concurrency
+        self.owner_prefix = f"{socket.gethostname()}:{os.getpid()}"
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._tasks = []
+
+    async def start(self):
+        self._executor = ThreadPoolExecutor(self.concurrency, thread_name_prefix='job-worker')
+        self._tasks = [
+            asyncio.create_task(self._run(f"{self.owner_prefix}:{i}"))
+            for i in range(self.concurrency)
+        ]
+        logger.info(f"Started {self.concurrency} job workers")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._executor is not None:
+            # Unfinished jobs keep their lease and are recovered once it lapses
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _heartbeat(self, job_id: str, owner: str):
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+            if not await self.queue.heartbeat(job_id, owner):
+                logger.warning(f"Lost lease on job {job_id}")
+                return
+
+    async def _run(self, owner: str):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                job = await self.queue.claim(owner)
+            except Exception as e:
+                logger.error(f"Job claim failed: {e}")
+                job = None
+            if job is None:
+                await asyncio.sleep(JOB_POLL_SECONDS)
+                continue
+
+            logger.info(f"Worker {owner} processing {job['id']} (attempt {job['attempts']})")
+            heartbeat = asyncio.create_task(self._heartbeat(job['id'], owner))
+            try:
+                result = await loop.run_in_executor(self._executor, self.handler, job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job {job['id']} failed: {e}")
+                try:
+                    await self.queue.fail(job['id'], owner, str(e))
+                except Exception as e:
+                    # The job keeps its lease and is retried once it lapses
+                    logger.error(f"Could not record failure of job {job['id']}: {e}")
+            else:
+                try:
+                    await self.queue.complete(job['id'], owner, result['script'], result['video_url'])
+                    logger.info(f"Project {job['id']} completed successfully")
+                except Exception as e:
+                    # The job keeps its lease and is retried once it lapses
+                    logger.error(f"Could not record completion of job {job['id']}: {e}")
+            finally:
+                heartbeat.cancel()
@@ -0,0 +1,264 @@
+import os
+import re
+import heapq
+import asyncio
+import bisect
+import unicodedata
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Wait before retrying a failed load
+SEARCH_INDEX_RETRY_SECONDS = float(os.environ.get('SEARCH_INDEX_RETRY_SECONDS', '5'))
+# Songs indexed per worker-thread hop during a load
+SEARCH_INDEX_LOAD_BATCH = int(os.environ.get('SEARCH_INDEX_LOAD_BATCH', '1000'))
+
+# Relative importance of a match in each field
+FIELD_WEIGHTS = {'title': 3.0, 'artist': 2.0, 'album': 1.0}
+
+# Match quality multipliers
+EXACT_SCORE = 1.0
+PREFIX_SCORE = 0.7
+FUZZY_SCORE = 0.4
+
+MIN_PREFIX_LENGTH = 2
+MIN_FUZZY_LENGTH = 4
+MAX_PREFIX_EXPANSIONS = 64
+
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Casefold, strip accents and split into word tokens"""
+    if not text:
+        return []
+    decomposed = unicodedata.normalize('NFKD', text.casefold())
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return _TOKEN_RE.findall(stripped)
+
+
+def _deletes(term: str) -> Set[str]:
+    """The term and every variant with one character removed"""
+    return {term} | {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+def _within_one_edit(a: str, b: str) -> bool:
+    """Levenshtein distance <= 1, plus adjacent transpositions"""
+    if a == b:
+        return True
+    la, lb = len(a), len(b)
+    if abs(la - lb) > 1:
+        return False
+    if la == lb:
+        diffs = [i for i in range(la) if a[i] != b[i]]
+        if len(diffs) == 1:
+            return True
+        return (len(diffs) == 2 and diffs[1] == diffs[0] + 1
+                and a[diffs[0]] == b[diffs[1]] and a[diffs[1]] == b[diffs[0]])
+    if la > lb:
+        a, b = b, a
+    # b is one character longer than a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i:] == b[i + 1:]
+
+
+class LibrarySearchIndex:
+    """In-memory inverted index over song title/artist/album.
+
+    Supports exact, prefix (search-as-you-type) and one-typo matches.
+    This process's writes update it incrementally. Writes made by other
+    app processes only show up in Mongo, so ``refresh()`` reloads the
+    whole index when another process changes songs (see LibraryVersion);
+    until that load finishes the index is ``stale``.
+    """
+
+    def __init__(self):
+        # term -> {song_id: best field weight}
+        self._postings: Dict[str, Dict[str, float]] = defaultdict(dict)
+        # song_id -> terms it was indexed under
+        self._song_terms: Dict[str, Set[str]] = {}
+        # Sorted vocabulary for prefix lookups
+        self._terms: List[str] = []
+        # Deletion neighbourhood -> terms, for typo tolerance
+        self._delete_map: Dict[str, Set[str]] = defaultdict(set)
+        self._building = False
+        # Local writes made while a load runs, replayed onto its result
+        self._pending: Optional[List[Tuple[str, str, Optional[Dict]]]] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._reload = False
+        self.ready = False
+        # Set from a refresh() request until a load started after it is done
+        self.stale = False
+
+    def __len__(self) -> int:
+        return len(self._song_terms)
+
+    async def build(self, collection):
+        """Load the index from the songs collection.
+
+        The new index is built on the side, in a worker thread so the
+        event loop keeps serving, and swapped in; searches keep using the
+        old one meanwhile.
+        """
+        fresh = LibrarySearchIndex()
+        # Append new terms unsorted during the load and sort once at the end
+        fresh._building = True
+        self._pending = []
+        try:
+            batch = []
+            async for song in collection.find({}, {'title': 1, 'artist': 1, 'album': 1}):
+                batch.append(song)
+                if len(batch) >= SEARCH_INDEX_LOAD_BATCH:
+                    await asyncio.to_thread(fresh._load, batch)
+                    batch = []
+            await asyncio.to_thread(fresh._load, batch, True)
+            # These writes reached Mongo before they got here, but the scan
+            # may have passed their songs already
+            for op, song_id, song in self._pending:
+                if op == 'add':
+                    fresh.add(song_id, song)
+                else:
+                    fresh.remove(song_id)
+        finally:
+            self._pending = None
+        self._postings = fresh._postings
+        self._song_terms = fresh._song_terms
+        self._terms = fresh._terms
+        self._delete_map = fresh._delete_map
+        self.ready = True
+
+    def _load(self, songs: List[Dict], last: bool = False):
+        for song in songs:
+            self.add(str(song['_id']), song)
+        if last:
+            self._building = False
+            self._terms = sorted(self._postings)
+
+    def refresh(self, collection):
+        """Reload in the background (at startup, and after other processes'
+        writes); requests made during a load queue one more"""
+        self.stale = True
+        self._reload = True
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh(collection))
+
+    async def _refresh(self, collection):
+        while self._reload:
+            self._reload = False
+            try:
+                await self.build(collection)
+            except Exception as e:
+                print(f"Search index load error: {e}")
+                self._reload = True
+                await asyncio.sleep(SEARCH_INDEX_RETRY_SECONDS)
+        self.stale = False
+
+    async def stop(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            await asyncio.gather(self._refresh_task, return_exceptions=True)
+            self._refresh_task = None
+
+    def add(self, song_id: str, song: Dict):
+        """Index (or re-index) a song"""
+        if self._pending is not None:
+            self._pending.append(('add', song_id, song))
+        self._remove(song_id)
+        weights: Dict[str, float] = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in tokenize(song.get(field)):
+                weights[term] = max(weights.get(term, 0.0), weight)
+
+        for term, weight in weights.items():
+            postings = self._postings[term]
+            if not postings:
+                if self._building:
+                    self._terms.append(term)
+                else:
+                    bisect.insort(self._terms, term)
+                for variant in _deletes(term):
+                    self._delete_map[variant].add(term)
+            postings[song_id] = weight
+        self._song_terms[song_id] = set(weights)
+
+    def remove(self, song_id: str):
+        if self._pending is not None:
+            self._pending.append(('remove', song_id, None))
+        self._remove(song_id)
+
+    def _remove(self, song_id: str):
+        for term in self._song_terms.pop(song_id, ()):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(song_id, None)
+            if not postings:
+                del self._postings[term]
+                if self._building:
+                    self._terms.remove(term)
+                else:
+                    index = bisect.bisect_left(self._terms, term)
+                    if index < len(self._terms) and self._terms[index] == term:
+                        del self._terms[index]
+                for variant in _deletes(term):
+                    terms = self._delete_map.get(variant)
+                    if terms is not None:
+                        terms.discard(term)
+                        if not terms:
+                            del self._delete_map[variant]
+
+    def _prefix_terms(self, prefix: str) -> Iterable[str]:
+        start = bisect.bisect_left(self._terms, prefix)
+        for term in self._terms[start:start + MAX_PREFIX_EXPANSIONS]:
+            if not term.startswith(prefix):
+                break
+            yield term
+
+    def _fuzzy_terms(self, token: str) -> Set[str]:
+        candidates = set()
+        for variant in _deletes(token):
+            candidates |= self._delete_map.get(variant, set())
+        return {term for term in candidates if _within_one_edit(token, term)}
+
+    def _match_token(self, token: str) -> Dict[str, float]:
+        """Best score per song for one query token"""
+        scores: Dict[str, float] = {}
+
+        def collect(term: str, quality: float):
+            for song_id, weight in self._postings.get(term, {}).items():
+                score = weight * quality
+                if score > scores.get(song_id, 0.0):
+                    scores[song_id] = score
+
+        collect(token, EXACT_SCORE)
+        if len(token) >= MIN_PREFIX_LENGTH:
+            for term in self._prefix_terms(token):
+                if term != token:
+                    # Closer-length completions rank higher
+                    collect(term, PREFIX_SCORE * len(token) / len(term))
+        if len(token) >= MIN_FUZZY_LENGTH:
+            for term in self._fuzzy_terms(token):
+                if term != token:
+                    collect(term, FUZZY_SCORE)
+        return scores
+
+    def search(self, query: str, limit: int = 20) -> List[Tuple[str, float]]:
+        """Ranked (song_id, score) pairs; every query token must match"""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+
+        totals: Optional[Dict[str, float]] = None
+        # Rarest-looking (longest) tokens first shrinks the candidate set early
+        for token in sorted(tokens, key=len, reverse=True):
+            matches = self._match_token(token)
+            if totals is None:
+                totals = matches
+            else:
+                totals = {song_id: score + matches[song_id]
+                          for song_id, score in totals.items() if song_id in matches}
+            if not totals:
+                return []
+
+        return heapq.nlargest(limit, totals.items(), key=lambda item: (item[1], item[0]))
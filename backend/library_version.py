@@ -0,0 +1,164 @@
+import os
+import uuid
+import asyncio
+from typing import Callable, Dict, Mapping, Optional, Set
+
+from pymongo import ReturnDocument
+
+from streaming import is_not_modified
+
+# How often other app processes' writes are picked up
+LIBRARY_VERSION_POLL_SECONDS = float(os.environ.get('LIBRARY_VERSION_POLL_SECONDS', '2'))
+
+# Clients must revalidate library reads, but may keep them for 304s
+LIBRARY_CACHE_CONTROL = 'private, no-cache'
+
+_META_ID = 'library'
+
+
+class LibraryVersion:
+    """Monotonic version of the song library and playlists.
+
+    Every write to songs or playlists calls ``bump()`` after the write
+    lands; reads take the version before they query, so a response is
+    never older than the version its ETag names. The counter lives in
+    ``meta`` (``_id: "library"``) so all app processes share it; each
+    process keeps the last value it saw and polls for the others' writes.
+    The epoch changes if the document is ever recreated, so ETags from
+    before can't match again.
+
+    Writes that change what search sees (songs added, removed or
+    retagged) pass ``search=True`` and also move ``searchVersion``.
+    Each process records the search versions its own bumps got; any
+    others it finds, whether by polling or in a bump's result, are other
+    processes' writes and trigger ``on_remote_change``.
+    """
+
+    def __init__(self, db, poll_interval: float = LIBRARY_VERSION_POLL_SECONDS,
+                 on_remote_change: Optional[Callable[[], None]] = None):
+        self.collection = db.meta
+        self.poll_interval = poll_interval
+        # Called when another process's search-visible writes are found
+        self.on_remote_change = on_remote_change
+        self.epoch: Optional[str] = None
+        self.value = 0
+        # searchVersion accounted for, our own bumps above it and our
+        # search bumps still in flight (their versions aren't known yet)
+        self._search_version = 0
+        self._local_search: Set[int] = set()
+        self._search_bumps = 0
+        # Set when a bump failed: no ETags until one succeeds, since the
+        # shared version may not cover that write
+        self._unrecorded = False
+        self._task: Optional[asyncio.Task] = None
+
+    def _apply(self, doc: Optional[Dict]) -> bool:
+        """Take in the shared document; True if it shows other processes'
+        search-visible writes"""
+        if not doc:
+            return False
+        search_version = doc.get('searchVersion', 0)
+        if doc['epoch'] != self.epoch:
+            recreated = self.epoch is not None
+            self.epoch = doc['epoch']
+            self.value = doc['version']
+            self._search_version = search_version
+            self._local_search = set()
+            return recreated
+        self.value = max(self.value, doc['version'])
+
+        local = sum(1 for version in self._local_search if version <= search_version)
+        if search_version - self._search_version - local > self._search_bumps:
+            # More versions than our own unfinished bumps can explain
+            self._search_version = search_version
+            self._local_search = {version for version in self._local_search if version > search_version}
+            return True
+        while self._search_version + 1 in self._local_search:
+            self._search_version += 1
+            self._local_search.discard(self._search_version)
+        return False
+
+    def _remote_change(self):
+        if self.on_remote_change is not None:
+            self.on_remote_change()
+
+    async def load(self):
+        doc = await self.collection.find_one_and_update(
+            {'_id': _META_ID},
+            {'$setOnInsert': {'epoch': uuid.uuid4().hex, 'version': 0, 'searchVersion': 0}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self._apply(doc)
+
+    async def start(self):
+        try:
+            await self.load()
+        except Exception as e:
+            print(f"Library version load error: {e}")
+        self._task = asyncio.create_task(self._poll())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.check()
+            except Exception as e:
+                print(f"Library version poll error: {e}")
+
+    async def check(self):
+        """Pick up other processes' writes"""
+        if self._apply(await self.collection.find_one({'_id': _META_ID})):
+            self._remote_change()
+
+    async def bump(self, search: bool = False):
+        """Record a library write; call after the write has completed.
+
+        Pass ``search=True`` when songs were added, removed or retagged.
+        """
+        increments = {'version': 1, 'searchVersion': 1} if search else {'version': 1}
+        if search:
+            self._search_bumps += 1
+        try:
+            doc = await self.collection.find_one_and_update(
+                {'_id': _META_ID},
+                {'$inc': increments, '$setOnInsert': {'epoch': uuid.uuid4().hex}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except Exception as e:
+            # The write itself already happened; don't fail the request
+            print(f"Library version bump error: {e}")
+            self._unrecorded = True
+            return
+        finally:
+            if search:
+                self._search_bumps -= 1
+        self._unrecorded = False
+        if search and doc.get('epoch') == self.epoch:
+            self._local_search.add(doc['searchVersion'])
+        if self._apply(doc):
+            self._remote_change()
+
+    @property
+    def etag(self) -> Optional[str]:
+        if self.epoch is None or self._unrecorded:
+            return None
+        return f'W/"{self.epoch}.{self.value}"'
+
+    def headers(self) -> Dict[str, str]:
+        """Validator headers for a library read (empty until loaded)"""
+        etag = self.etag
+        if etag is None:
+            return {}
+        return {'ETag': etag, 'Cache-Control': LIBRARY_CACHE_CONTROL}
+
+    def not_modified(self, request_headers: Mapping[str, str]) -> bool:
+        etag = self.etag
+        return etag is not None and is_not_modified(request_headers, etag)
@@ -0,0 +1,84 @@
+import os
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional
+
+from audio_metadata import parse_audio_path, parse_gridfs_audio
+from song_jobs import SongJobRunner
+
+METADATA_WORKERS = int(os.environ.get('METADATA_WORKERS', '2'))
+# A job left in "processing" this long belonged to a worker that died
+METADATA_STALE_AFTER = timedelta(minutes=10)
+
+PLACEHOLDER_ALBUM = 'Unknown Album'
+
+
+class MetadataExtractor(SongJobRunner):
+    """Backfills title/artist/album/duration for uploaded songs.
+
+    Jobs are tracked through ``metadataStatus`` on the song (see
+    SongJobRunner). Files are parsed in a process pool, keeping mutagen
+    off the event loop. Workers open the blob themselves (local files by
+    path, GridFS through their own client) and seek to what mutagen
+    needs, so an upload is never copied, held in memory or pickled.
+    """
+
+    job_name = 'Metadata'
+
+    def __init__(self, db, file_service, workers: int = METADATA_WORKERS,
+                 on_complete: Optional[Callable[[str, Dict], None]] = None,
+                 on_change: Optional[Callable[..., Awaitable]] = None):
+        super().__init__(db, 'metadata', METADATA_STALE_AFTER, workers, on_change)
+        self.file_service = file_service
+        # Called with (song_id, updated song) after a successful backfill
+        self.on_complete = on_complete
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    async def start(self):
+        # spawn: forking a process that already runs Motor's threads is unsafe
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn')
+        )
+        await super().start()
+
+    async def stop(self):
+        await super().stop()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def run(self, song: Dict):
+        blob = await self.file_service.stream_audio_file(song['audioFileId'])
+        if blob.path is not None:
+            parse, source = parse_audio_path, blob.path
+        else:
+            parse, source = parse_gridfs_audio, blob.id
+        loop = asyncio.get_running_loop()
+        tags = await loop.run_in_executor(self._executor, parse, source, song.get('fileName') or '')
+
+        update = self._backfill(song, tags)
+        await self.db.songs.update_one(
+            {'_id': song['_id']},
+            {'$set': update, '$unset': {'metadataError': ''}}
+        )
+        await self._changed(search=True)
+        if self.on_complete is not None:
+            self.on_complete(str(song['_id']), {**song, **update})
+
+    @staticmethod
+    def _backfill(song: Dict, tags: Dict) -> Dict:
+        """Tag values only replace fields the uploader did not set"""
+        update = {'metadataStatus': 'complete', 'metadataCompletedAt': datetime.utcnow()}
+        if tags['duration']:
+            update['duration'] = tags['duration']
+        if song.get('metadataSource') == 'filename':
+            if tags['title']:
+                update['title'] = tags['title']
+            if tags['artist']:
+                update['artist'] = tags['artist']
+        if tags['album'] and song.get('album') in (None, '', PLACEHOLDER_ALBUM):
+            update['album'] = tags['album']
+        return update
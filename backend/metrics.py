@@ -0,0 +1,282 @@
+import time
+import bisect
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Request latency, 1 ms .. 10 s
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Single database statements, 100 us .. 2.5 s
+QUERY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# Label used for requests that matched no route, so scanners probing
+# random paths can't grow the series count
+UNMATCHED_ROUTE = 'unmatched'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Registry:
+    """Every metric defined in the process, plus collectors that report
+    values read at scrape time (cache counters and the like)"""
+
+    def __init__(self):
+        self._metrics: Dict[str, '_Metric'] = {}
+        self._collectors: List[Callable[[], Iterable[Tuple]]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: '_Metric'):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+
+    def register_collector(self, collector: Callable[[], Iterable[Tuple]]):
+        """collector() yields (name, type, help, [(labels dict, value), ...])"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            metric.render(lines)
+        for collector in self._collectors:
+            for name, metric_type, documentation, samples in collector():
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {metric_type}')
+                for labels, value in samples:
+                    lines.append(f'{name}{_format_labels(list(labels), list(labels.values()))} {_format_value(value)}')
+        lines.append('')
+        return '\n'.join(lines)
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    """A metric family; ``labels(...)`` returns the child for one series.
+
+    Children are cached, so hot paths can bind them once at import.
+    Updates take a per-family lock because the Mongo listener and the
+    SQLite executors record from worker threads.
+    """
+
+    type = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 registry: Optional[Registry] = REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def render(self, lines: List[str]):
+        for key, child in sorted(self._children.items()):
+            child.render(lines, self.name, _format_labels(self.labelnames, key))
+
+
+class _ValueChild:
+    def __init__(self, lock: threading.Lock):
+        self._lock = lock
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+    def render(self, lines: List[str], name: str, labels: str):
+        lines.append(f'{name}{labels} {_format_value(self.value)}')
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def _new_child(self):
+        return _ValueChild(self._lock)
+
+    def inc(self, amount: float = 1):
+        """For metrics without labels"""
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    type = 'gauge'
+
+    def _new_child(self):
+        return _ValueChild(self._lock)
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1):
+        self.labels().dec(amount)
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+
+class _HistogramChild:
+    def __init__(self, lock: threading.Lock, buckets: Tuple[float, ...]):
+        self._lock = lock
+        self._buckets = buckets
+        # One slot per bucket plus +Inf; made cumulative when rendered
+        self._counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def render(self, lines: List[str], name: str, labels: str):
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self.sum, self.count
+        prefix = labels[:-1] + ',' if labels else '{'
+        cumulative = 0
+        for bound, bucket_count in zip(self._buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            lines.append(f'{name}_bucket{prefix}le="{_format_value(float(bound))}"}} {cumulative}')
+        lines.append(f'{name}_sum{labels} {_format_value(total)}')
+        lines.append(f'{name}_count{labels} {count}')
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS, registry: Optional[Registry] = REGISTRY):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self._lock, self.buckets)
+
+    def observe(self, value: float):
+        """For metrics without labels"""
+        self.labels().observe(value)
+
+
+def register_collector(collector: Callable[[], Iterable[Tuple]]):
+    REGISTRY.register_collector(collector)
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+# ============== HTTP ==============
+
+HTTP_LATENCY = Histogram(
+    'http_request_duration_seconds',
+    'Time from request arrival until the last response byte was handed to the server',
+    ('method', 'route', 'status'),
+)
+HTTP_IN_FLIGHT = Gauge(
+    'http_requests_in_flight',
+    'Requests currently being handled',
+    ('method', 'route'),
+)
+
+
+class MetricsMiddleware:
+    """Per-route latency histogram and in-flight gauge.
+
+    Routes are labelled by their path template (``/api/songs/{song_id}``),
+    not the raw path. The clock stops when the app returns, so streamed
+    bodies are included.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        # Paths without parameters resolve to themselves; remember them
+        self._static_paths: Dict[Tuple[str, str], str] = {}
+
+    def _route_label(self, scope: Scope) -> str:
+        key = (scope['method'], scope['path'])
+        label = self._static_paths.get(key)
+        if label is not None:
+            return label
+        label = UNMATCHED_ROUTE
+        router = getattr(scope.get('app'), 'router', None)
+        for route in getattr(router, 'routes', ()):
+            match, _ = route.matches(scope)
+            if match != Match.NONE:
+                label = getattr(route, 'path', UNMATCHED_ROUTE)
+                if match == Match.FULL:
+                    break
+        if label == scope['path'] and len(self._static_paths) < 4096:
+            self._static_paths[key] = label
+        return label
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        method = scope['method']
+        route = self._route_label(scope)
+        in_flight = HTTP_IN_FLIGHT.labels(method, route)
+        status = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_LATENCY.labels(method, route, status).observe(time.perf_counter() - started)
+            in_flight.dec()
+
@@ -1,12 +1,20 @@
-from pydantic import BaseModel, Field
-from typing import List, Optional, Literal
+from pydantic import BaseModel, BeforeValidator, ConfigDict, Field, TypeAdapter
+from pydantic_core import core_schema
+from typing import Annotated, Any, List, Optional, Literal
 from datetime import datetime
 from bson import ObjectId
 
 class PyObjectId(ObjectId):
     @classmethod
-    def __get_validators__(cls):
-        yield cls.validate
+    def __get_pydantic_core_schema__(cls, source_type: Any, handler) -> core_schema.CoreSchema:
+        return core_schema.no_info_plain_validator_function(
+            cls.validate,
+            serialization=core_schema.plain_serializer_function_ser_schema(str, when_used='json')
+        )
+
+    @classmethod
+    def __get_pydantic_json_schema__(cls, schema, handler):
+        return {'type': 'string'}
 
     @classmethod
     def validate(cls, v):
@@ -14,9 +22,11 @@ class PyObjectId(ObjectId):
             raise ValueError("Invalid ObjectId")
         return ObjectId(v)
 
-    @classmethod
-    def __modify_schema__(cls, field_schema):
-        field_schema.update(type="string")
+def _id_to_str(value: Any) -> Any:
+    return str(value) if isinstance(value, ObjectId) else value
+
+# Document IDs as strings; raw MongoDB documents validate without copying
+ObjectIdStr = Annotated[str, BeforeValidator(_id_to_str)]
 
 # Song Models
 class SongBase(BaseModel):
@@ -38,16 +48,16 @@ class UploadedSong(SongBase):
     source: Literal["upload"] = "upload"
 
 class Song(SongBase):
-    id: str = Field(default_factory=lambda: str(ObjectId()), alias="_id")
+    id: ObjectIdStr = Field(default_factory=lambda: str(ObjectId()), alias="_id")
     videoId: Optional[str] = None
     audioFileId: Optional[str] = None
     fileName: Optional[str] = None
     fileSize: Optional[int] = None
+    metadataStatus: Optional[str] = None  # uploads: pending, processing, complete, failed
+    transcodeStatus: Optional[str] = None  # uploads: pending, processing, complete, failed
     createdAt: datetime = Field(default_factory=datetime.utcnow)
 
-    class Config:
-        populate_by_name = True
-        json_encoders = {ObjectId: str}
+    model_config = ConfigDict(populate_by_name=True)
 
 # Playlist Models
 class PlaylistCreate(BaseModel):
@@ -61,7 +71,7 @@ class PlaylistUpdate(BaseModel):
     coverImage: Optional[str] = None
 
 class Playlist(BaseModel):
-    id: str = Field(default_factory=lambda: str(ObjectId()), alias="_id")
+    id: ObjectIdStr = Field(default_factory=lambda: str(ObjectId()), alias="_id")
     name: str
     description: Optional[str] = None
     coverImage: Optional[str] = None
@@ -69,9 +79,13 @@ class Playlist(BaseModel):
     createdAt: datetime = Field(default_factory=datetime.utcnow)
     updatedAt: datetime = Field(default_factory=datetime.utcnow)
 
-    class Config:
-        populate_by_name = True
-        json_encoders = {ObjectId: str}
+    model_config = ConfigDict(populate_by_name=True)
+
+class HydratedPlaylist(Playlist):
+    songs: List[Song] = Field(default_factory=list)  # Full songs, in playlist order
+    totalSongs: int = 0
+    offset: int = 0
+    limit: int = 0
 
 # YouTube Search
 class YouTubeSearchRequest(BaseModel):
@@ -88,6 +102,36 @@ class YouTubeSearchResult(BaseModel):
 class YouTubeSearchResponse(BaseModel):
     results: List[YouTubeSearchResult]
 
+# Bulk YouTube import
+class YouTubeImportRequest(BaseModel):
+    videoIds: List[str] = Field(default_factory=list)
+    playlistId: Optional[str] = None  # YouTube playlist to import
+
+class YouTubeImportItem(BaseModel):
+    videoId: str
+    status: Literal["imported", "exists", "not_found", "error"]
+    songId: Optional[str] = None
+    error: Optional[str] = None
+
+class YouTubeImportResponse(BaseModel):
+    imported: int
+    existing: int
+    failed: int
+    results: List[YouTubeImportItem]
+
 # Add Song to Playlist
 class AddSongToPlaylist(BaseModel):
     songId: str
+
+# Bulk delete
+class BulkDeleteRequest(BaseModel):
+    songIds: List[str] = Field(..., min_length=1, max_length=1000)
+
+class BulkDeleteResponse(BaseModel):
+    deleted: int
+    notFound: List[str]
+
+# Compiled once: validate whole result lists in one call and dump them
+# straight to JSON bytes
+SongListAdapter = TypeAdapter(List[Song])
+PlaylistListAdapter = TypeAdapter(List[Playlist])
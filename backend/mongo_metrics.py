@@ -0,0 +1,44 @@
+from typing import Dict
+
+from pymongo import monitoring
+
+from metrics import QUERY_BUCKETS, Counter, Histogram
+
+MONGO_COMMAND_LATENCY = Histogram(
+    'mongo_command_duration_seconds',
+    'MongoDB command round trips as reported by the driver',
+    ('command', 'collection'),
+    buckets=QUERY_BUCKETS,
+)
+MONGO_COMMAND_FAILURES = Counter(
+    'mongo_command_failures_total',
+    'MongoDB commands that returned an error',
+    ('command', 'collection'),
+)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Command timings for the Motor client (pass in ``event_listeners``).
+
+    The driver calls these on its I/O threads; they only record a sample.
+    """
+
+    def __init__(self):
+        # request_id -> collection, from the started event
+        self._collections: Dict[int, str] = {}
+
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        if not isinstance(target, str):
+            # getMore carries the cursor id there and the collection separately
+            target = event.command.get('collection', '')
+        self._collections[event.request_id] = target if isinstance(target, str) else ''
+
+    def succeeded(self, event):
+        collection = self._collections.pop(event.request_id, '')
+        MONGO_COMMAND_LATENCY.labels(event.command_name, collection).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        collection = self._collections.pop(event.request_id, '')
+        MONGO_COMMAND_LATENCY.labels(event.command_name, collection).observe(event.duration_micros / 1e6)
+        MONGO_COMMAND_FAILURES.labels(event.command_name, collection).inc()
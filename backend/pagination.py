@@ -0,0 +1,94 @@
+import json
+import base64
+import binascii
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Keyset order: oldest first, _id breaks createdAt ties
+PAGE_SORT = [('createdAt', 1), ('_id', 1)]
+
+
+class InvalidPageRequest(ValueError):
+    pass
+
+
+def encode_cursor(doc: Dict) -> str:
+    created_at = doc.get('createdAt')
+    payload = {
+        't': created_at.isoformat() if isinstance(created_at, datetime) else None,
+        'id': str(doc['_id']),
+    }
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], ObjectId]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        created_at = datetime.fromisoformat(payload['t']) if payload['t'] else None
+        return created_at, ObjectId(payload['id'])
+    except (binascii.Error, ValueError, KeyError, TypeError, InvalidId):
+        raise InvalidPageRequest("Invalid cursor")
+
+
+def keyset_filter(cursor: str) -> Dict:
+    """Everything strictly after the cursor position in PAGE_SORT order"""
+    created_at, oid = decode_cursor(cursor)
+    if created_at is None:
+        # Legacy documents without createdAt sort first
+        return {'$or': [
+            {'createdAt': None, '_id': {'$gt': oid}},
+            {'createdAt': {'$ne': None}},
+        ]}
+    return {'$or': [
+        {'createdAt': {'$gt': created_at}},
+        {'createdAt': created_at, '_id': {'$gt': oid}},
+    ]}
+
+
+def build_projection(fields: Optional[str], allowed: Iterable[str]) -> Optional[Dict]:
+    """Turn ?fields=title,artist into a Mongo projection (None = all fields)"""
+    if not fields:
+        return None
+    requested = [f.strip() for f in fields.split(',') if f.strip()]
+    unknown = sorted(set(requested) - set(allowed))
+    if unknown:
+        raise InvalidPageRequest(f"Unknown fields: {', '.join(unknown)}")
+    # createdAt is always needed to build the next cursor
+    return {name: 1 for name in [*requested, 'createdAt']}
+
+
+async def fetch_page(
+    collection,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    projection: Optional[Dict] = None,
+    query: Optional[Dict] = None,
+) -> Tuple[List[Dict], Dict[str, str]]:
+    """Fetch one keyset page plus X-Next-Cursor / X-Total-Count headers.
+
+    The total is the collection's estimated count (collection metadata),
+    so it never scans.
+    """
+    query = dict(query or {})
+    if cursor:
+        query = {'$and': [query, keyset_filter(cursor)]} if query else keyset_filter(cursor)
+
+    # Read one extra document to know whether another page exists
+    docs = await collection.find(query, projection).sort(PAGE_SORT).limit(limit + 1).to_list(limit + 1)
+
+    headers = {'X-Total-Count': str(await collection.estimated_document_count())}
+    if len(docs) > limit:
+        docs = docs[:limit]
+        headers['X-Next-Cursor'] = encode_cursor(docs[-1])
+
+    for doc in docs:
+        doc['_id'] = str(doc['_id'])
+    return docs, headers
@@ -0,0 +1,162 @@
+import json
+import sqlite3
+from typing import Dict, List, Optional
+
+# Positions are spaced out so inserts and moves usually take the midpoint
+# between two neighbours without touching any other row
+POSITION_GAP = 1024
+
+# Song IDs per playlist in position order. SQLite only guarantees the
+# order an aggregate sees rows in with an ORDER BY inside the aggregate
+# (3.44+) or over a window; an ordered subquery is not enough.
+if sqlite3.sqlite_version_info >= (3, 44, 0):
+    PLAYLIST_SONGS_SQL = """
+        SELECT playlist_id, json_group_array(song_id ORDER BY position, rowid) AS songs
+        FROM playlist_songs
+        {where}
+        GROUP BY playlist_id
+    """
+else:
+    PLAYLIST_SONGS_SQL = """
+        SELECT playlist_id, songs FROM (
+            SELECT playlist_id,
+                   json_group_array(song_id) OVER (
+                       PARTITION BY playlist_id ORDER BY position, rowid
+                       ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING
+                   ) AS songs,
+                   ROW_NUMBER() OVER (PARTITION BY playlist_id ORDER BY position, rowid) AS rn
+            FROM playlist_songs
+            {where}
+        )
+        WHERE rn = 1
+    """
+
+# Playlists with their song IDs in order, built in one grouped query
+PLAYLISTS_WITH_SONGS_SQL = """
+    SELECT p.*, COALESCE(ps.songs, '[]') AS songs
+    FROM playlists p
+    LEFT JOIN ({songs}) ps ON ps.playlist_id = p.id
+    {outer_where}
+"""
+
+
+def migrate(conn: sqlite3.Connection):
+    """Add the position column (keeping current row order) and its covering index"""
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if 'playlist_songs' not in tables:
+        conn.execute("""
+            CREATE TABLE playlist_songs (
+                playlist_id TEXT NOT NULL,
+                song_id TEXT NOT NULL,
+                position INTEGER NOT NULL
+            )
+        """)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(playlist_songs)")}
+    if 'position' not in columns:
+        conn.execute("ALTER TABLE playlist_songs ADD COLUMN position INTEGER")
+        conn.execute(f"""
+            UPDATE playlist_songs SET position = ranked.rn * {POSITION_GAP}
+            FROM (
+                SELECT rowid AS rid, ROW_NUMBER() OVER (PARTITION BY playlist_id ORDER BY rowid) AS rn
+                FROM playlist_songs
+            ) AS ranked
+            WHERE playlist_songs.rowid = ranked.rid
+        """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_playlist_songs_order
+        ON playlist_songs (playlist_id, position, song_id)
+    """)
+
+
+def _row_to_playlist(row: sqlite3.Row) -> Dict:
+    playlist = dict(row)
+    playlist['songs'] = json.loads(playlist['songs'])
+    return playlist
+
+
+def list_playlists(conn: sqlite3.Connection) -> List[Dict]:
+    sql = PLAYLISTS_WITH_SONGS_SQL.format(songs=PLAYLIST_SONGS_SQL.format(where=''), outer_where='')
+    return [_row_to_playlist(row) for row in conn.execute(sql)]
+
+
+def get_playlist(conn: sqlite3.Connection, playlist_id: str) -> Optional[Dict]:
+    sql = PLAYLISTS_WITH_SONGS_SQL.format(
+        songs=PLAYLIST_SONGS_SQL.format(where='WHERE playlist_id = ?'), outer_where='WHERE p.id = ?'
+    )
+    row = conn.execute(sql, (playlist_id, playlist_id)).fetchone()
+    return _row_to_playlist(row) if row else None
+
+
+def renumber(conn: sqlite3.Connection, playlist_id: str):
+    conn.execute(f"""
+        UPDATE playlist_songs SET position = ranked.rn * {POSITION_GAP}
+        FROM (
+            SELECT rowid AS rid, ROW_NUMBER() OVER (ORDER BY position, rowid) AS rn
+            FROM playlist_songs WHERE playlist_id = ?
+        ) AS ranked
+        WHERE playlist_songs.rowid = ranked.rid
+    """, (playlist_id,))
+
+
+def _slot(conn: sqlite3.Connection, playlist_id: str, index: Optional[int]) -> int:
+    """Position value that places a new row at list index `index` (None = end)"""
+    if index is None:
+        last = conn.execute(
+            "SELECT MAX(position) FROM playlist_songs WHERE playlist_id = ?", (playlist_id,)
+        ).fetchone()[0]
+        return (last or 0) + POSITION_GAP
+
+    # Neighbours either side of the slot, read from the covering index
+    if index <= 0:
+        before = None
+        rows = conn.execute(
+            "SELECT position FROM playlist_songs WHERE playlist_id = ? ORDER BY position LIMIT 1",
+            (playlist_id,)
+        ).fetchall()
+        after = rows[0][0] if rows else None
+    else:
+        rows = conn.execute(
+            "SELECT position FROM playlist_songs WHERE playlist_id = ? ORDER BY position LIMIT 2 OFFSET ?",
+            (playlist_id, index - 1)
+        ).fetchall()
+        if not rows:
+            return _slot(conn, playlist_id, None)
+        before = rows[0][0]
+        after = rows[1][0] if len(rows) > 1 else None
+
+    if after is None:
+        return (before or 0) + POSITION_GAP
+    if before is None:
+        return after - POSITION_GAP
+    if after - before > 1:
+        return (before + after) // 2
+
+    # Gap exhausted: respace this playlist once, then retry
+    renumber(conn, playlist_id)
+    return _slot(conn, playlist_id, index)
+
+
+def insert_song(conn: sqlite3.Connection, playlist_id: str, song_id: str, index: Optional[int] = None):
+    conn.execute(
+        "INSERT INTO playlist_songs (playlist_id, song_id, position) VALUES (?, ?, ?)",
+        (playlist_id, song_id, _slot(conn, playlist_id, index))
+    )
+
+
+def move_song(conn: sqlite3.Connection, playlist_id: str, song_id: str, index: int) -> bool:
+    removed = conn.execute(
+        "DELETE FROM playlist_songs WHERE playlist_id = ? AND song_id = ?", (playlist_id, song_id)
+    ).rowcount
+    if not removed:
+        return False
+    insert_song(conn, playlist_id, song_id, index)
+    return True
+
+
+def set_order(conn: sqlite3.Connection, playlist_id: str, song_ids: List[str]):
+    """Replace the whole order in one pass"""
+    conn.execute("DELETE FROM playlist_songs WHERE playlist_id = ?", (playlist_id,))
+    conn.executemany(
+        "INSERT INTO playlist_songs (playlist_id, song_id, position) VALUES (?, ?, ?)",
+        [(playlist_id, song_id, (i + 1) * POSITION_GAP) for i, song_id in enumerate(song_ids)]
+    )
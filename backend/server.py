@@ -1,22 +1,49 @@
-from fastapi import FastAPI, APIRouter, UploadFile, File, Form, HTTPException
-from fastapi.responses import StreamingResponse
+# First, so the startup profile sees the other imports
+from startup_profile import startup
+from fastapi import FastAPI, APIRouter, UploadFile, File, Form, HTTPException, Request, Query
+from fastapi.responses import StreamingResponse, Response, JSONResponse
+from pydantic import TypeAdapter
+from pydantic_core import to_json
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import uuid
+import anyio
+import asyncio
 import logging
 from pathlib import Path
 from typing import List, Optional
-from datetime import datetime
+from datetime import datetime, timedelta
 from bson import ObjectId
+import httpx
+from pymongo.errors import DuplicateKeyError, BulkWriteError
 
 from models import (
     Song, YouTubeSong, UploadedSong, Playlist, PlaylistCreate, 
     PlaylistUpdate, YouTubeSearchRequest, YouTubeSearchResponse,
-    YouTubeSearchResult, AddSongToPlaylist
+    YouTubeSearchResult, AddSongToPlaylist, HydratedPlaylist,
+    YouTubeImportRequest, YouTubeImportItem, YouTubeImportResponse,
+    BulkDeleteRequest, BulkDeleteResponse, SongListAdapter, PlaylistListAdapter
 )
 from youtube_service import youtube_service
-from file_service import FileService
+from file_service import FileService, UploadSizeLimit, UploadTooLarge, EmptyUpload, InvalidAudioType, validate_audio_upload
+from blob_store import BlobNotFound, create_blob_store
+from blob_gc import BlobCollector, song_blob_ids
+from metadata_worker import MetadataExtractor
+from transcoder import Transcoder
+from indexes import ensure_indexes
+from library_search import LibrarySearchIndex
+from library_version import LibraryVersion
+from pagination import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidPageRequest, build_projection, fetch_page
+)
+from streaming import STREAM_QUALITIES, blob_response, choose_rendition
+import metrics
+from mongo_metrics import MongoCommandMetrics
+
+startup.mark('imports')
+metrics.register_collector(startup.collect)
 
 
 ROOT_DIR = Path(__file__).parent
@@ -24,11 +51,32 @@ load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[MongoCommandMetrics()])
 db = client[os.environ['DB_NAME']]
 
-# File service
-file_service = FileService(db)
+# File service (AUDIO_STORAGE selects GridFS or local disk)
+file_service = FileService(create_blob_store(db=db))
+
+# In-memory search index over the library, kept current by the write routes
+search_index = LibrarySearchIndex()
+
+# Bumped by every song/playlist write; library reads send it as their ETag
+# Other processes' writes reach the search index through a reload
+library_version = LibraryVersion(db, on_remote_change=lambda: search_index.refresh(db.songs))
+
+# Background tag/duration extraction for uploads
+metadata_extractor = MetadataExtractor(
+    db, file_service, on_complete=search_index.add, on_change=library_version.bump
+)
+
+# Opus/AAC streaming renditions for uploads
+transcoder = Transcoder(db, file_service, on_change=library_version.bump)
+
+# Releases deleted songs' blobs in the background and sweeps orphans
+blob_collector = BlobCollector(db, file_service.store)
+
+# Index build progress, filled in by ensure_indexes at startup
+index_status = {}
 
 # Create the main app without a prefix
 app = FastAPI(title="Creator360.Studio API")
@@ -36,26 +84,185 @@ app = FastAPI(title="Creator360.Studio API")
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
+# Field names clients may request through ?fields=
+SONG_FIELDS = {field.alias or name for name, field in Song.model_fields.items()}
+PLAYLIST_FIELDS = {field.alias or name for name, field in Playlist.model_fields.items()}
+
+
+def json_list_response(adapter: TypeAdapter, docs: list, headers: Optional[dict] = None) -> Response:
+    """Validate raw documents in one pass and encode them straight to JSON.
+    
+    Returning a Response skips FastAPI's second validation and
+    serialization of the response_model, which stays for the docs.
+    """
+    body = adapter.dump_json(adapter.validate_python(docs), by_alias=True)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+def library_headers(request: Request) -> dict:
+    """ETag headers for a library read; answers 304 before any query when
+    the client's copy is still current"""
+    if library_version.not_modified(request.headers):
+        raise HTTPException(status_code=304, headers=library_version.headers())
+    return library_version.headers()
+
+
+async def list_page(collection, adapter: TypeAdapter, allowed_fields, limit: int, cursor: Optional[str],
+                    fields: Optional[str], headers: Optional[dict] = None):
+    """Shared keyset-paginated listing for songs and playlists"""
+    try:
+        projection = build_projection(fields, allowed_fields)
+        docs, page_headers = await fetch_page(collection, limit=limit, cursor=cursor, projection=projection)
+    except InvalidPageRequest as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    headers = {**(headers or {}), **page_headers}
+    
+    if projection is not None:
+        # Partial documents bypass the full response model
+        return Response(to_json(docs), media_type="application/json", headers=headers)
+    
+    return json_list_response(adapter, docs, headers)
+
 
 # ============== YouTube Routes ==============
 
 @api_router.post("/youtube/search", response_model=YouTubeSearchResponse)
 async def search_youtube(request: YouTubeSearchRequest):
     """Search YouTube for music videos"""
-    results = youtube_service.search_videos(request.query, request.maxResults)
+    results = await youtube_service.search_videos(request.query, request.maxResults)
     return YouTubeSearchResponse(results=[YouTubeSearchResult(**r) for r in results])
 
 
+@api_router.get("/admin/indexes")
+async def get_index_status():
+    """Build status of the indexes declared in indexes.py"""
+    return index_status
+
+
+@api_router.post("/admin/blob-gc")
+async def run_blob_gc():
+    """Release queued blobs and sweep orphans now (the collector also runs on a timer)"""
+    released = await blob_collector.release_queued()
+    removed = await blob_collector.sweep_orphans()
+    return {'released': released, 'orphansRemoved': removed}
+
+
+@api_router.get("/youtube/cache-stats")
+async def youtube_cache_stats():
+    """Hit/miss counters for the YouTube search and video caches"""
+    return youtube_service.cache_stats()
+
+
+# Inserts retried when the song they conflict with is deleted meanwhile
+ADD_SONG_ATTEMPTS = 3
+
+
 @api_router.post("/songs/add-youtube", response_model=Song)
 async def add_youtube_song(song: YouTubeSong):
     """Add a YouTube video as a song to the library"""
     song_dict = song.dict()
     song_dict['createdAt'] = datetime.utcnow()
     
-    result = await db.songs.insert_one(song_dict)
-    song_dict['_id'] = str(result.inserted_id)
+    for _ in range(ADD_SONG_ATTEMPTS):
+        try:
+            result = await db.songs.insert_one(song_dict)
+        except DuplicateKeyError:
+            # Already in the library (unique videoId index) - return the existing entry
+            existing = await db.songs.find_one({'source': 'youtube', 'videoId': song.videoId})
+            if existing is not None:
+                return Song(**{**existing, '_id': str(existing['_id'])})
+            # It was deleted in between; try the insert again
+            continue
+        song_dict['_id'] = str(result.inserted_id)
+        search_index.add(song_dict['_id'], song_dict)
+        await library_version.bump(search=True)
+        return Song(**song_dict)
+    raise HTTPException(status_code=409, detail="Song was changed concurrently; try again")
+
+
+MAX_IMPORT_ITEMS = 5000
+
+
+@api_router.post("/songs/import-youtube", response_model=YouTubeImportResponse)
+async def import_youtube_songs(request: YouTubeImportRequest):
+    """Bulk add YouTube videos (IDs and/or a YouTube playlist) to the library"""
+    try:
+        video_ids = list(request.videoIds)
+        if request.playlistId:
+            video_ids += await youtube_service.get_playlist_video_ids(request.playlistId, MAX_IMPORT_ITEMS + 1)
+        video_ids = list(dict.fromkeys(video_ids))
+        if len(video_ids) > MAX_IMPORT_ITEMS:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_IMPORT_ITEMS} videos per import")
+        
+        # Skip videos already in the library (one $in lookup on the videoId index)
+        existing = {}
+        async for doc in db.songs.find({'source': 'youtube', 'videoId': {'$in': video_ids}}, {'videoId': 1}):
+            existing[doc['videoId']] = str(doc['_id'])
+        
+        # 50-ID videos.list batches, cached IDs are not refetched
+        details = await youtube_service.get_video_details([v for v in video_ids if v not in existing])
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"YouTube API error: {e}")
+    
+    now = datetime.utcnow()
+    new_docs = []
+    for video_id in video_ids:
+        if video_id in existing or video_id not in details:
+            continue
+        info = details[video_id]
+        song_dict = YouTubeSong(
+            title=info['title'],
+            artist=info['artist'],
+            duration=info['durationSeconds'],
+            coverImage=info['thumbnail'],
+            videoId=video_id
+        ).dict()
+        song_dict['createdAt'] = now
+        new_docs.append(song_dict)
+    
+    write_errors = {}
+    if new_docs:
+        try:
+            await db.songs.insert_many(new_docs, ordered=False)
+        except BulkWriteError as e:
+            write_errors = {error['index']: error for error in e.details.get('writeErrors', [])}
     
-    return Song(**song_dict)
+    inserted = {}
+    failed = {}
+    raced = []
+    for index, doc in enumerate(new_docs):
+        error = write_errors.get(index)
+        if error is None:
+            inserted[doc['videoId']] = str(doc['_id'])
+            search_index.add(str(doc['_id']), doc)
+        elif error.get('code') == 11000:
+            # Added concurrently by another request
+            raced.append(doc['videoId'])
+        else:
+            failed[doc['videoId']] = error.get('errmsg', 'Insert failed')
+    if inserted:
+        await library_version.bump(search=True)
+    if raced:
+        async for doc in db.songs.find({'source': 'youtube', 'videoId': {'$in': raced}}, {'videoId': 1}):
+            existing[doc['videoId']] = str(doc['_id'])
+    
+    results = []
+    for video_id in video_ids:
+        if video_id in inserted:
+            results.append(YouTubeImportItem(videoId=video_id, status='imported', songId=inserted[video_id]))
+        elif video_id in existing:
+            results.append(YouTubeImportItem(videoId=video_id, status='exists', songId=existing[video_id]))
+        elif video_id in failed:
+            results.append(YouTubeImportItem(videoId=video_id, status='error', error=failed[video_id]))
+        else:
+            results.append(YouTubeImportItem(videoId=video_id, status='not_found'))
+    
+    return YouTubeImportResponse(
+        imported=len(inserted),
+        existing=sum(1 for r in results if r.status == 'exists'),
+        failed=sum(1 for r in results if r.status in ('error', 'not_found')),
+        results=results
+    )
 
 
 # ============== File Upload Routes ==============
@@ -70,39 +277,25 @@ async def upload_audio(
 ):
     """Upload an audio file - optimized for speed"""
     # Validate file type
-    allowed_types = ['audio/mpeg', 'audio/wav', 'audio/mp4', 'audio/x-m4a', 'audio/flac', 'audio/ogg']
-    allowed_extensions = ['.mp3', '.wav', '.m4a', '.flac', '.ogg']
-    
-    file_ext = os.path.splitext(file.filename)[1].lower()
-    if file.content_type not in allowed_types and file_ext not in allowed_extensions:
-        raise HTTPException(status_code=400, detail="Invalid file type. Allowed: MP3, WAV, M4A, FLAC, OGG")
+    try:
+        validate_audio_upload(file)
+    except InvalidAudioType as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     try:
-        # Read file content
-        content = await file.read()
-        file_size = len(content)
-        
-        # Quick validation - check if file is not empty
-        if file_size == 0:
-            raise HTTPException(status_code=400, detail="Empty file")
+        # Stream into the blob store chunk by chunk (bounded memory, size/checksum on the fly)
+        stored = await file_service.store_upload(file)
+        file_id = stored['fileId']
+        file_size = stored['fileSize']
         
-        # Upload to GridFS first (fast)
-        file_id = await file_service.fs.upload_from_stream(
-            file.filename,
-            content,
-            metadata={
-                'contentType': file.content_type,
-                'size': file_size
-            }
-        )
-        
-        # Use provided metadata or extract from filename (skip slow mutagen extraction)
+        # Use provided metadata or extract from filename; tags and duration
+        # are backfilled by the background metadata worker
         if title and artist:
             # User provided metadata - use it directly
             song_title = title
             song_artist = artist
             song_album = album or 'Unknown Album'
-            duration = 0  # Will be updated when played
+            metadata_source = 'user'
         else:
             # Quick extraction from filename
             filename_no_ext = os.path.splitext(file.filename)[0]
@@ -117,108 +310,209 @@ async def upload_audio(
                 song_title = filename_no_ext
             
             song_album = album or 'Unknown Album'
-            duration = 0  # Will be updated when played
+            metadata_source = 'filename'
         
         song_dict = {
             'title': song_title,
             'artist': song_artist,
             'album': song_album,
-            'duration': duration,
+            'duration': 0,
             'coverImage': coverImage or 'https://images.unsplash.com/photo-1511379938547-c1f69419868d?w=300&h=300&fit=crop',
             'source': 'upload',
-            'audioFileId': str(file_id),
+            'audioFileId': file_id,
             'fileName': file.filename,
             'fileSize': file_size,
+            'metadataStatus': 'pending',
+            'metadataSource': metadata_source,
             'createdAt': datetime.utcnow()
         }
         
+        if transcoder.enabled:
+            song_dict['transcodeStatus'] = 'pending'
+        
         result = await db.songs.insert_one(song_dict)
         song_dict['_id'] = str(result.inserted_id)
+        search_index.add(song_dict['_id'], song_dict)
+        await library_version.bump(search=True)
+        metadata_extractor.enqueue(song_dict['_id'])
+        transcoder.enqueue(song_dict['_id'])
         
         return Song(**song_dict)
         
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except EmptyUpload as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"Upload error: {e}")
-        # Clean up GridFS file if exists
+        # Clean up the stored file if it exists
         if 'file_id' in locals():
             try:
-                await file_service.fs.delete(file_id)
+                await file_service.delete_audio_file(file_id)
             except:
                 pass
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
 
 @api_router.get("/stream/audio/{song_id}")
-async def stream_audio(song_id: str):
-    """Stream an uploaded audio file"""
+async def stream_audio(
+    song_id: str,
+    request: Request,
+    quality: Optional[str] = Query(None, pattern=f"^({'|'.join(STREAM_QUALITIES)})$")
+):
+    """Stream an uploaded audio file (supports Range, ETag and Last-Modified)
+    
+    Serves a transcoded rendition matching ?quality= (default medium) and
+    the Accept header when one exists; ?quality=original serves the upload.
+    """
     # Get song from database
     song = await db.songs.find_one({'_id': ObjectId(song_id)})
     if not song or song.get('source') != 'upload':
         raise HTTPException(status_code=404, detail="Song not found")
     
-    # Stream file from GridFS
+    file_id = song['audioFileId']
+    file_name = song.get("fileName", "audio.mp3")
+    rendition = choose_rendition(song.get('renditions'), request.headers.get('accept'), quality)
+    if rendition is not None:
+        file_id = rendition['fileId']
+        file_name = os.path.splitext(file_name)[0] + rendition['ext']
+    
     try:
-        grid_out = await file_service.stream_audio_file(song['audioFileId'])
-        
-        async def stream_generator():
-            while True:
-                chunk = await grid_out.read(1024 * 1024)  # 1MB chunks
-                if not chunk:
-                    break
-                yield chunk
-        
-        return StreamingResponse(
-            stream_generator(),
-            media_type='audio/mpeg',
-            headers={
-                'Content-Disposition': f'inline; filename="{song.get("fileName", "audio.mp3")}"'
-            }
-        )
+        blob = await file_service.stream_audio_file(file_id)
+    except BlobNotFound:
+        raise HTTPException(status_code=404, detail="Audio file not found")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    
+    return blob_response(request, blob, file_name, {'Vary': 'Accept'})
 
 
 # ============== Song Routes ==============
 
 @api_router.get("/songs", response_model=List[Song])
-async def get_songs():
-    """Get all songs"""
-    songs = await db.songs.find().to_list(1000)
-    return [Song(**{**song, '_id': str(song['_id'])}) for song in songs]
+async def get_songs(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    """Get songs page by page (next page cursor in X-Next-Cursor)"""
+    headers = library_headers(request)
+    return await list_page(db.songs, SongListAdapter, SONG_FIELDS, limit, cursor, fields, headers)
+
+
+@api_router.get("/songs/search", response_model=List[Song])
+async def search_songs(
+    request: Request,
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=100)
+):
+    """Search the library by title, artist and album (prefix and typo tolerant)"""
+    if not search_index.ready:
+        # An empty result now would be cached under the current ETag
+        raise HTTPException(status_code=503, detail="Search index is still loading", headers={"Retry-After": "2"})
+    # While it catches up with other processes' writes, the index may be
+    # older than the library version; don't let clients cache that
+    headers = {} if search_index.stale else library_headers(request)
+    ranked = search_index.search(q, limit)
+    if not ranked:
+        return json_list_response(SongListAdapter, [], headers)
+    
+    songs = await db.songs.find({'_id': {'$in': [ObjectId(sid) for sid, _ in ranked]}}).to_list(len(ranked))
+    songs_by_id = {str(song['_id']): song for song in songs}
+    return json_list_response(SongListAdapter, [songs_by_id[sid] for sid, _ in ranked if sid in songs_by_id], headers)
 
 
 @api_router.get("/songs/{song_id}", response_model=Song)
-async def get_song(song_id: str):
+async def get_song(song_id: str, request: Request, response: Response):
     """Get song by ID"""
+    response.headers.update(library_headers(request))
     song = await db.songs.find_one({'_id': ObjectId(song_id)})
     if not song:
         raise HTTPException(status_code=404, detail="Song not found")
     return Song(**{**song, '_id': str(song['_id'])})
 
 
-@api_router.delete("/songs/{song_id}")
-async def delete_song(song_id: str):
-    """Delete a song"""
-    song = await db.songs.find_one({'_id': ObjectId(song_id)})
+@api_router.get("/songs/{song_id}/metadata-status")
+async def get_song_metadata_status(song_id: str):
+    """Get the background metadata extraction status of an uploaded song"""
+    song = await db.songs.find_one(
+        {'_id': ObjectId(song_id)},
+        {'metadataStatus': 1, 'metadataError': 1, 'duration': 1}
+    )
     if not song:
         raise HTTPException(status_code=404, detail="Song not found")
+    return {
+        'songId': song_id,
+        'status': song.get('metadataStatus', 'complete'),
+        'error': song.get('metadataError'),
+        'duration': song.get('duration')
+    }
+
+
+# A delete claim left this long belonged to a request that died
+DELETE_CLAIM_STALE_AFTER = timedelta(minutes=5)
+
+
+async def delete_songs(song_ids: List[str]) -> List[str]:
+    """Delete songs in a few batched operations; returns the IDs deleted.
+    
+    Songs are first claimed with a token, so each song's blobs are queued
+    for release by exactly one request even when deletes race. Blobs are
+    released by the background collector.
+    """
+    object_ids = [ObjectId(sid) for sid in dict.fromkeys(song_ids) if ObjectId.is_valid(sid)]
+    if not object_ids:
+        return []
     
-    # Delete audio file if it's an uploaded song
-    if song.get('source') == 'upload' and song.get('audioFileId'):
-        await file_service.delete_audio_file(song['audioFileId'])
+    token = uuid.uuid4().hex
+    stale = datetime.utcnow() - DELETE_CLAIM_STALE_AFTER
+    await db.songs.update_many(
+        {'_id': {'$in': object_ids}, '$or': [
+            {'deleteToken': {'$exists': False}},
+            {'deleteClaimedAt': {'$lt': stale}}
+        ]},
+        {'$set': {'deleteToken': token, 'deleteClaimedAt': datetime.utcnow()}}
+    )
+    songs = await db.songs.find(
+        {'deleteToken': token}, {'source': 1, 'audioFileId': 1, 'renditions': 1}
+    ).to_list(None)
+    if not songs:
+        return []
     
-    # Delete song from database
-    await db.songs.delete_one({'_id': ObjectId(song_id)})
+    await db.songs.delete_many({'deleteToken': token})
+    deleted = [str(song['_id']) for song in songs]
     
-    # Remove from all playlists
+    # Remove from the playlists that contain them (multikey index on songs)
     await db.playlists.update_many(
-        {},
-        {'$pull': {'songs': song_id}}
+        {'songs': {'$in': deleted}},
+        {'$pull': {'songs': {'$in': deleted}}, '$set': {'updatedAt': datetime.utcnow()}}
     )
-    
+    await blob_collector.release_later(blob_id for song in songs for blob_id in song_blob_ids(song))
+    for song_id in deleted:
+        search_index.remove(song_id)
+    await library_version.bump(search=True)
+    return deleted
+
+
+@api_router.delete("/songs/{song_id}")
+async def delete_song(song_id: str):
+    """Delete a song"""
+    if not await delete_songs([song_id]):
+        raise HTTPException(status_code=404, detail="Song not found")
     return {"message": "Song deleted successfully"}
 
 
+@api_router.post("/songs/bulk-delete", response_model=BulkDeleteResponse)
+async def bulk_delete_songs(request: BulkDeleteRequest):
+    """Delete up to 1000 songs at once"""
+    deleted = set(await delete_songs(request.songIds))
+    return BulkDeleteResponse(
+        deleted=len(deleted),
+        notFound=[sid for sid in dict.fromkeys(request.songIds) if sid not in deleted]
+    )
+
+
 # ============== Playlist Routes ==============
 
 @api_router.post("/playlists", response_model=Playlist)
@@ -231,26 +525,76 @@ async def create_playlist(playlist: PlaylistCreate):
     
     result = await db.playlists.insert_one(playlist_dict)
     playlist_dict['_id'] = str(result.inserted_id)
+    await library_version.bump()
     
     return Playlist(**playlist_dict)
 
 
 @api_router.get("/playlists", response_model=List[Playlist])
-async def get_playlists():
-    """Get all playlists"""
-    playlists = await db.playlists.find().to_list(1000)
-    return [Playlist(**{**p, '_id': str(p['_id'])}) for p in playlists]
+async def get_playlists(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    """Get playlists page by page (next page cursor in X-Next-Cursor)"""
+    headers = library_headers(request)
+    return await list_page(db.playlists, PlaylistListAdapter, PLAYLIST_FIELDS, limit, cursor, fields, headers)
 
 
 @api_router.get("/playlists/{playlist_id}", response_model=Playlist)
-async def get_playlist(playlist_id: str):
+async def get_playlist(playlist_id: str, request: Request, response: Response):
     """Get playlist by ID"""
+    response.headers.update(library_headers(request))
     playlist = await db.playlists.find_one({'_id': ObjectId(playlist_id)})
     if not playlist:
         raise HTTPException(status_code=404, detail="Playlist not found")
     return Playlist(**{**playlist, '_id': str(playlist['_id'])})
 
 
+@api_router.get("/playlists/{playlist_id}/songs", response_model=HydratedPlaylist)
+async def get_playlist_songs(
+    playlist_id: str,
+    request: Request,
+    response: Response,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
+):
+    """Get a playlist with its songs resolved, in playlist order"""
+    response.headers.update(library_headers(request))
+    # Slice the ID array server-side so large playlists page cheaply
+    pipeline = [
+        {'$match': {'_id': ObjectId(playlist_id)}},
+        {'$addFields': {
+            'totalSongs': {'$size': {'$ifNull': ['$songs', []]}},
+            'songs': {'$slice': [{'$ifNull': ['$songs', []]}, offset, limit]}
+        }}
+    ]
+    playlists = await db.playlists.aggregate(pipeline).to_list(1)
+    if not playlists:
+        raise HTTPException(status_code=404, detail="Playlist not found")
+    playlist = playlists[0]
+    
+    # One batched lookup for the whole page
+    song_ids = [ObjectId(sid) for sid in playlist['songs'] if ObjectId.is_valid(sid)]
+    songs = await db.songs.find({'_id': {'$in': song_ids}}).to_list(len(song_ids))
+    songs_by_id = {str(song['_id']): song for song in songs}
+    
+    # Keep playlist order and skip IDs whose song was deleted
+    ordered = [
+        Song(**{**songs_by_id[sid], '_id': sid})
+        for sid in playlist['songs'] if sid in songs_by_id
+    ]
+    
+    return HydratedPlaylist(**{
+        **playlist,
+        '_id': str(playlist['_id']),
+        'songs': ordered,
+        'offset': offset,
+        'limit': limit
+    })
+
+
 @api_router.put("/playlists/{playlist_id}", response_model=Playlist)
 async def update_playlist(playlist_id: str, update: PlaylistUpdate):
     """Update playlist metadata"""
@@ -266,6 +610,8 @@ async def update_playlist(playlist_id: str, update: PlaylistUpdate):
         {'$set': update_dict}
     )
     
+    await library_version.bump()
+    
     updated_playlist = await db.playlists.find_one({'_id': ObjectId(playlist_id)})
     return Playlist(**{**updated_playlist, '_id': str(updated_playlist['_id'])})
 
@@ -276,6 +622,7 @@ async def delete_playlist(playlist_id: str):
     result = await db.playlists.delete_one({'_id': ObjectId(playlist_id)})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Playlist not found")
+    await library_version.bump()
     return {"message": "Playlist deleted successfully"}
 
 
@@ -301,6 +648,7 @@ async def add_song_to_playlist(playlist_id: str, data: AddSongToPlaylist):
             '$set': {'updatedAt': datetime.utcnow()}
         }
     )
+    await library_version.bump()
     
     return {"message": "Song added to playlist"}
 
@@ -318,6 +666,7 @@ async def remove_song_from_playlist(playlist_id: str, song_id: str):
     
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Playlist or song not found")
+    await library_version.bump()
     
     return {"message": "Song removed from playlist"}
 
@@ -325,13 +674,25 @@ async def remove_song_from_playlist(playlist_id: str, song_id: str):
 # Include the router in the main app
 app.include_router(api_router)
 
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus text exposition of the process metrics"""
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "ETag"],
 )
+# Refuse oversized uploads before their body is read
+app.add_middleware(UploadSizeLimit, paths=['/api/upload/audio'])
+# Outermost, so latency includes the other middleware
+app.add_middleware(metrics.MetricsMiddleware)
 
 # Configure logging
 logging.basicConfig(
@@ -340,6 +701,28 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+startup.mark('app')
+
+@app.on_event("startup")
+async def start_background_workers():
+    # Build indexes in the background so startup is not held up by large collections
+    asyncio.create_task(ensure_indexes(db, index_status))
+    await anyio.to_thread.run_sync(file_service.store.connect)
+    # Version first: writes after it loads are caught by its polling
+    await library_version.start()
+    search_index.refresh(db.songs)
+    await metadata_extractor.start()
+    await transcoder.start()
+    await blob_collector.start()
+    startup.ready()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    await metadata_extractor.stop()
+    await transcoder.stop()
+    await library_version.stop()
+    await search_index.stop()
+    await blob_collector.stop()
+    await anyio.to_thread.run_sync(file_service.store.close)
+    client.close()
+    await youtube_service.close()
\ No newline at end of file
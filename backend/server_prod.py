@@ -1,19 +1,52 @@
-from fastapi import FastAPI, APIRouter, UploadFile, File, Form, HTTPException, BackgroundTasks
-from fastapi.responses import StreamingResponse, FileResponse
+# First, so the startup profile sees the other imports
+from startup_profile import startup
+from fastapi import FastAPI, APIRouter, UploadFile, File, Form, HTTPException, Request
+from fastapi.responses import StreamingResponse, FileResponse, Response
 from starlette.middleware.cors import CORSMiddleware
-import sqlite3
 import os
 import uuid
 from datetime import datetime
 from typing import List, Optional
 from pydantic import BaseModel
 import json
+import anyio
+
+from sqlite_db import SQLiteDatabase
+import playlist_positions
+from job_queue import JobQueue, WorkerPool, JOB_WORKERS_IN_API
+from video_jobs import generate_video
+from credits_ledger import CreditsLedger, InsufficientCredits, UnknownUser
+from blob_store import BlobNotFound, create_blob_store
+from file_service import FileService, UploadSizeLimit, UploadTooLarge, EmptyUpload, InvalidAudioType, validate_audio_upload
+from streaming import blob_response
+from static_site import StaticSite
+import metrics
+
+startup.mark("imports")
+metrics.register_collector(startup.collect)
 
 app = FastAPI(title="Creator360.Studio Production API")
 DB_PATH = "/home/ubuntu/creator360_permanent.db"
-UPLOAD_DIR = "/home/ubuntu/uploads"
+SHARED_DB = "/home/ubuntu/creator360_shared.db"
+UPLOAD_DIR = os.environ.get("AUDIO_STORAGE_DIR", "/home/ubuntu/uploads")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+db = SQLiteDatabase(DB_PATH)
+# User credits live in the database shared with the LINE bot
+shared_db = SQLiteDatabase(SHARED_DB)
+credits = CreditsLedger(shared_db)
+# Uploaded audio on local disk. RangedFileResponse uses sendfile only when
+# the ASGI server offers zerocopysend/pathsend; uvicorn (run below) offers
+# neither, so files go out in 1 MB pread chunks from a worker thread
+file_service = FileService(create_blob_store("local", root=UPLOAD_DIR))
+# AI video jobs. The image runs only this process, so it works the
+# queue itself unless JOB_WORKERS_IN_API=0 (then run server_v2.py --worker
+# against the same database)
+jobs = JobQueue(db)
+worker_pool = WorkerPool(jobs, generate_video)
+# The React build, served from this process (see the catch-all route)
+frontend = StaticSite()
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -21,11 +54,32 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Refuse oversized uploads before their body is read
+app.add_middleware(UploadSizeLimit, paths=['/api/upload/audio'])
+# Outermost, so latency includes the other middleware
+app.add_middleware(metrics.MetricsMiddleware)
 
-def get_db():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+@app.on_event("startup")
+async def open_databases():
+    # Opening connects and sets pragmas; keep it off the event loop
+    await anyio.to_thread.run_sync(db.open)
+    await anyio.to_thread.run_sync(shared_db.open)
+    await anyio.to_thread.run_sync(file_service.store.connect)
+    await db.write(playlist_positions.migrate)
+    await db.write(jobs.migrate)
+    await shared_db.write(credits.migrate)
+    await anyio.to_thread.run_sync(frontend.load)
+    if JOB_WORKERS_IN_API:
+        await worker_pool.start()
+    startup.ready()
+
+@app.on_event("shutdown")
+async def close_databases():
+    await worker_pool.stop()
+    # Closing waits for running queries
+    await anyio.to_thread.run_sync(db.close)
+    await anyio.to_thread.run_sync(shared_db.close)
+    await anyio.to_thread.run_sync(file_service.store.close)
 
 # Models
 class Song(BaseModel):
@@ -39,12 +93,19 @@ class Song(BaseModel):
     videoId: Optional[str] = None
     createdAt: str
 
+class PlaylistSongAdd(BaseModel):
+    songId: str
+    position: Optional[int] = None  # 0-based index, default appends
+
+class PlaylistSongMove(BaseModel):
+    position: int
+
+class PlaylistOrder(BaseModel):
+    songIds: List[str]
+
 @app.get("/api/songs", response_model=List[Song])
 async def get_songs():
-    conn = get_db()
-    rows = conn.execute("SELECT * FROM songs ORDER BY createdAt DESC").fetchall()
-    conn.close()
-    return [dict(r) for r in rows]
+    return await db.fetchall("SELECT * FROM songs ORDER BY createdAt DESC")
 
 @app.post("/api/upload/audio")
 async def upload_audio(
@@ -52,68 +113,150 @@ async def upload_audio(
     title: str = Form(...),
     artist: str = Form(...)
 ):
-    file_id = str(uuid.uuid4())
-    file_ext = os.path.splitext(file.filename)[1]
-    file_path = os.path.join(UPLOAD_DIR, f"{file_id}{file_ext}")
-    
-    with open(file_path, "wb") as buffer:
-        buffer.write(await file.read())
+    try:
+        validate_audio_upload(file)
+        stored = await file_service.store_upload(file)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except (EmptyUpload, InvalidAudioType) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    file_id = stored['fileId']
     
-    conn = get_db()
     song_id = str(uuid.uuid4())
-    conn.execute("""
+    await db.execute("""
         INSERT INTO songs (id, title, artist, source, audioFileId, fileName, createdAt)
         VALUES (?, ?, ?, ?, ?, ?, ?)
     """, (song_id, title, artist, "upload", file_id, file.filename, datetime.utcnow().isoformat()))
-    conn.commit()
-    conn.close()
     
     return {"id": song_id, "title": title}
 
+@app.get("/api/stream/audio/{song_id}")
+async def stream_audio(song_id: str, request: Request):
+    song = await db.fetchone("SELECT source, audioFileId, fileName FROM songs WHERE id = ?", (song_id,))
+    if not song or song['source'] != 'upload' or not song['audioFileId']:
+        raise HTTPException(status_code=404, detail="Song not found")
+    try:
+        blob = await file_service.stream_audio_file(song['audioFileId'])
+    except BlobNotFound:
+        raise HTTPException(status_code=404, detail="Audio file not found")
+    return blob_response(request, blob, song['fileName'] or "audio.mp3")
+
 @app.get("/api/playlists")
 async def get_playlists():
-    conn = get_db()
-    playlists = conn.execute("SELECT * FROM playlists").fetchall()
-    result = []
-    for p in playlists:
-        p_dict = dict(p)
-        songs = conn.execute("SELECT song_id FROM playlist_songs WHERE playlist_id = ?", (p['id'],)).fetchall()
-        p_dict['songs'] = [s['song_id'] for s in songs]
-        result.append(p_dict)
-    conn.close()
-    return result
+    return await db.read(playlist_positions.list_playlists)
+
+@app.get("/api/playlists/{playlist_id}")
+async def get_playlist(playlist_id: str):
+    playlist = await db.read(lambda conn: playlist_positions.get_playlist(conn, playlist_id))
+    if not playlist:
+        raise HTTPException(status_code=404, detail="Playlist not found")
+    return playlist
+
+def _playlist_exists(conn, playlist_id: str) -> bool:
+    return conn.execute("SELECT 1 FROM playlists WHERE id = ?", (playlist_id,)).fetchone() is not None
+
+@app.post("/api/playlists/{playlist_id}/songs")
+async def add_song_to_playlist(playlist_id: str, data: PlaylistSongAdd):
+    def add(conn):
+        if not _playlist_exists(conn, playlist_id):
+            raise HTTPException(status_code=404, detail="Playlist not found")
+        if conn.execute("SELECT 1 FROM songs WHERE id = ?", (data.songId,)).fetchone() is None:
+            raise HTTPException(status_code=404, detail="Song not found")
+        if conn.execute(
+            "SELECT 1 FROM playlist_songs WHERE playlist_id = ? AND song_id = ?", (playlist_id, data.songId)
+        ).fetchone():
+            raise HTTPException(status_code=400, detail="Song already in playlist")
+        playlist_positions.insert_song(conn, playlist_id, data.songId, data.position)
+    await db.write(add)
+    return {"message": "Song added to playlist"}
+
+@app.put("/api/playlists/{playlist_id}/songs/{song_id}/position")
+async def move_playlist_song(playlist_id: str, song_id: str, data: PlaylistSongMove):
+    def move(conn):
+        if not _playlist_exists(conn, playlist_id):
+            raise HTTPException(status_code=404, detail="Playlist not found")
+        if not playlist_positions.move_song(conn, playlist_id, song_id, data.position):
+            raise HTTPException(status_code=404, detail="Song not in playlist")
+    await db.write(move)
+    return {"message": "Song moved"}
+
+@app.put("/api/playlists/{playlist_id}/songs")
+async def reorder_playlist(playlist_id: str, data: PlaylistOrder):
+    def reorder(conn):
+        if not _playlist_exists(conn, playlist_id):
+            raise HTTPException(status_code=404, detail="Playlist not found")
+        current = conn.execute(
+            "SELECT song_id FROM playlist_songs WHERE playlist_id = ?", (playlist_id,)
+        ).fetchall()
+        if sorted(row[0] for row in current) != sorted(data.songIds):
+            raise HTTPException(status_code=400, detail="songIds must contain exactly the playlist's songs")
+        playlist_positions.set_order(conn, playlist_id, data.songIds)
+    await db.write(reorder)
+    return {"message": "Playlist reordered"}
+
+@app.delete("/api/playlists/{playlist_id}/songs/{song_id}")
+async def remove_song_from_playlist(playlist_id: str, song_id: str):
+    removed = await db.execute(
+        "DELETE FROM playlist_songs WHERE playlist_id = ? AND song_id = ?", (playlist_id, song_id)
+    )
+    if not removed:
+        raise HTTPException(status_code=404, detail="Playlist or song not found")
+    return {"message": "Song removed from playlist"}
 
 @app.get("/api/user/credits")
 async def get_user_credits(user_id: str = "WEB_USER"):
-    conn = get_db()
-    # Check if user exists in shared db (using the shared db path for user credits)
-    SHARED_DB = "/home/ubuntu/creator360_shared.db"
-    s_conn = sqlite3.connect(SHARED_DB)
-    s_conn.row_factory = sqlite3.Row
-    user = s_conn.execute("SELECT credits FROM users WHERE line_user_id = ?", (user_id,)).fetchone()
-    s_conn.close()
-    conn.close()
-    if user:
-        return {"credits": user['credits']}
-    return {"credits": 0}
+    # Balances live in the shared db; served from the ledger's cache
+    return {"credits": await credits.get_balance(user_id)}
 
 @app.post("/api/user/add-credits")
-async def add_credits(amount: int, user_id: str = "WEB_USER"):
-    SHARED_DB = "/home/ubuntu/creator360_shared.db"
-    s_conn = sqlite3.connect(SHARED_DB)
-    s_conn.execute("UPDATE users SET credits = credits + ? WHERE line_user_id = ?", (amount, user_id))
-    s_conn.commit()
-    s_conn.close()
-    return {"status": "success", "new_amount": amount}
+async def add_credits(amount: int, user_id: str = "WEB_USER", reason: Optional[str] = None):
+    try:
+        balance = await credits.add(user_id, amount, reason)
+    except UnknownUser:
+        raise HTTPException(status_code=404, detail="User not found")
+    except InsufficientCredits:
+        raise HTTPException(status_code=400, detail="Insufficient credits")
+    return {"status": "success", "new_amount": balance}
+
+@app.get("/api/user/credits/transactions")
+async def get_credit_transactions(user_id: str = "WEB_USER", limit: int = 50, before: Optional[int] = None):
+    return await credits.history(user_id, min(max(limit, 1), 500), before)
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
 
 # AI Studio Integration
 @app.post("/api/ai/generate")
-async def ai_generate(product_url: str, background_tasks: BackgroundTasks):
-    # This would trigger the video_engine.py logic
-    # For now, return a tracking ID
-    job_id = str(uuid.uuid4())
-    return {"job_id": job_id, "status": "processing"}
+async def ai_generate(product_url: str, user_id: str = "WEB_USER"):
+    # Queued in projects_v2; picked up by the job workers (see worker_pool)
+    job_id = await jobs.enqueue(user_id, product_url, product_url)
+    return {"job_id": job_id, "status": "queued"}
+
+@app.get("/api/ai/jobs/{job_id}")
+async def ai_job_status(job_id: str, wait: float = 0, status: Optional[str] = None):
+    if wait > 0:
+        job = await jobs.wait_for_change(job_id, status, min(wait, 60))
+    else:
+        job = await jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+# Frontend: registered last so every API route matches first. It takes every
+# method so a mistyped API call gets 404 rather than 405 from the catch-all.
+@app.api_route("/{path:path}", methods=["GET", "HEAD", "POST", "PUT", "PATCH", "DELETE"], include_in_schema=False)
+async def serve_frontend(path: str, request: Request):
+    static_file = None
+    if request.method in ("GET", "HEAD") and not path.startswith("api/"):
+        static_file = frontend.lookup(path)
+    if static_file is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return static_file.response(request)
+
+startup.mark("app")
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Cloud Run passes the port to listen on in PORT
+    uvicorn.run(app, host="0.0.0.0", port=int(os.environ.get("PORT", "8000")))
@@ -1,14 +1,21 @@
 import logging
-from fastapi import FastAPI, APIRouter, UploadFile, File, Form, HTTPException, BackgroundTasks, Depends
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, APIRouter, UploadFile, File, Form, HTTPException, Depends
+from fastapi.responses import JSONResponse, StreamingResponse
 from starlette.middleware.cors import CORSMiddleware
-import sqlite3
 import os
 import uuid
 from datetime import datetime
 from typing import List, Optional
 from pydantic import BaseModel
 import time
+import json
+import sys
+import anyio
+import asyncio
+
+from sqlite_db import SQLiteDatabase
+from job_queue import JobQueue, WorkerPool, TERMINAL_STATUSES, JOB_WORKERS_IN_API
+from video_jobs import generate_video
 
 # Configure Logging
 logging.basicConfig(
@@ -34,14 +41,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Database Connection Pool (Simplified)
-def get_db():
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    try:
-        yield conn
-    finally:
-        conn.close()
+# Pooled WAL-mode database; queries run off the event loop
+db = SQLiteDatabase(DB_PATH)
 
 # Models
 class ProjectCreate(BaseModel):
@@ -49,63 +50,83 @@ class ProjectCreate(BaseModel):
     product_url: str
     user_id: str = "WEB_USER"
 
-# Initialize Tables if not exist
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute('''
-        CREATE TABLE IF NOT EXISTS projects_v2 (
-            id TEXT PRIMARY KEY,
-            user_id TEXT,
-            product_name TEXT,
-            product_url TEXT,
-            status TEXT,
-            script TEXT,
-            video_url TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    conn.commit()
-    conn.close()
-
-init_db()
+# Durable job queue in projects_v2
+jobs = JobQueue(db)
+
+worker_pool = WorkerPool(jobs, generate_video)
+
+@app.on_event("startup")
+async def init_db():
+    await anyio.to_thread.run_sync(db.open)
+    await db.write(jobs.migrate)
+    if JOB_WORKERS_IN_API:
+        await worker_pool.start()
+
+@app.on_event("shutdown")
+async def close_db():
+    await worker_pool.stop()
+    await anyio.to_thread.run_sync(db.close)
 
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "timestamp": time.time()}
 
 @app.post("/api/v2/projects")
-async def create_project(project: ProjectCreate, background_tasks: BackgroundTasks):
+async def create_project(project: ProjectCreate):
     project_id = str(uuid.uuid4())
     logger.info(f"Creating project {project_id} for user {project.user_id}")
     
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute("""
-        INSERT INTO projects_v2 (id, user_id, product_name, product_url, status)
-        VALUES (?, ?, ?, ?, ?)
-    """, (project_id, project.user_id, project.product_name, project.product_url, "processing"))
-    conn.commit()
-    conn.close()
-    
-    # Simulate background processing
-    background_tasks.add_task(process_video_task, project_id)
+    await jobs.enqueue(project.user_id, project.product_name, project.product_url, job_id=project_id)
     
     return {"project_id": project_id, "status": "queued"}
 
-async def process_video_task(project_id: str):
-    logger.info(f"Starting background processing for {project_id}")
-    # In reality, this calls video_engine.py
-    time.sleep(10) # Simulate AI work
+@app.get("/api/v2/projects/{project_id}")
+async def get_project(project_id: str, wait: float = 0, status: Optional[str] = None):
+    """Project status; with ?wait=N&status=S, long-poll until the status is no longer S"""
+    if wait > 0:
+        project = await jobs.wait_for_change(project_id, status, min(wait, 60))
+    else:
+        project = await jobs.get(project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return project
+
+@app.get("/api/v2/projects/{project_id}/events")
+async def project_events(project_id: str):
+    """Server-sent events: one `status` event per transition until the project finishes"""
+    project = await jobs.get(project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    
+    async def event_stream():
+        current = project
+        yield f"event: status\ndata: {json.dumps(current)}\n\n"
+        while current and current['status'] not in TERMINAL_STATUSES:
+            latest = await jobs.wait_for_change(project_id, current['status'], 15)
+            if latest is None:
+                break
+            if latest['status'] == current['status']:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"event: status\ndata: {json.dumps(latest)}\n\n"
+            current = latest
     
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute("""
-        UPDATE projects_v2 
-        SET status = ?, script = ?, video_url = ?
-        WHERE id = ?
-    """, ("completed", "AI Generated Script Content...", "https://8080-iz6w8w490tqm21gwvi1m3-1e655f4f.sg1.manus.computer/videos/sample.mp4", project_id))
-    conn.commit()
-    conn.close()
-    logger.info(f"Project {project_id} completed successfully")
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+async def run_workers():
+    """Worker-only process: no HTTP, just the job pool"""
+    await anyio.to_thread.run_sync(db.open)
+    await db.write(jobs.migrate)
+    await worker_pool.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await worker_pool.stop()
+        await anyio.to_thread.run_sync(db.close)
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    if "--worker" in sys.argv:
+        asyncio.run(run_workers())
+    else:
+        import uvicorn
+        uvicorn.run(app, host="0.0.0.0", port=8000)
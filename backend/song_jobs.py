@@ -0,0 +1,98 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional
+
+from bson import ObjectId
+
+
+class SongJobRunner:
+    """Background work tracked on the song document itself.
+
+    ``<prefix>Status`` moves pending -> processing -> complete | failed,
+    so queued work survives restarts. A worker claims a song by moving it
+    to processing, which makes workers in other app processes skip it;
+    one left in processing longer than ``stale_after`` belonged to a
+    worker that died and can be claimed again. Subclasses implement
+    ``run(song)``; if it raises, the job is marked failed with the error
+    in ``<prefix>Error``.
+    """
+
+    # Used in log lines
+    job_name = 'Song'
+
+    def __init__(self, db, prefix: str, stale_after: timedelta, workers: int,
+                 on_change: Optional[Callable[..., Awaitable]] = None):
+        self.db = db
+        self.workers = workers
+        self.stale_after = stale_after
+        # Awaited after every change to a song document, with search=True
+        # when the change is visible to search (see LibraryVersion.bump)
+        self.on_change = on_change
+        self.status_field = f'{prefix}Status'
+        self.started_field = f'{prefix}StartedAt'
+        self.error_field = f'{prefix}Error'
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._tasks = []
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        await self._requeue_unfinished()
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def enqueue(self, song_id: str):
+        self._queue.put_nowait(song_id)
+
+    def _claimable(self) -> Dict:
+        stale = datetime.utcnow() - self.stale_after
+        return {'$or': [
+            {self.status_field: 'pending'},
+            {self.status_field: 'processing', self.started_field: {'$lt': stale}}
+        ]}
+
+    async def _requeue_unfinished(self):
+        async for song in self.db.songs.find(self._claimable(), {'_id': 1}):
+            self.enqueue(str(song['_id']))
+
+    async def _worker(self):
+        while True:
+            song_id = await self._queue.get()
+            try:
+                await self._process(song_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"{self.job_name} job error for {song_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, song_id: str):
+        song = await self.db.songs.find_one_and_update(
+            {'_id': ObjectId(song_id), **self._claimable()},
+            {'$set': {self.status_field: 'processing', self.started_field: datetime.utcnow()}}
+        )
+        if not song:
+            return
+        await self._changed()
+
+        try:
+            await self.run(song)
+        except Exception as e:
+            await self.db.songs.update_one(
+                {'_id': song['_id']},
+                {'$set': {self.status_field: 'failed', self.error_field: str(e)}}
+            )
+            await self._changed()
+            raise
+
+    async def run(self, song: Dict):
+        """Do the work for a claimed song and record the result on it"""
+        raise NotImplementedError
+
+    async def _changed(self, search: bool = False):
+        if self.on_change is not None:
+            await self.on_change(search=search)
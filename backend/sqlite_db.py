@@ -0,0 +1,160 @@
+import os
+import time
+import queue
+import asyncio
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Sequence
+
+from metrics import QUERY_BUCKETS, Histogram
+
+SQLITE_POOL_SIZE = int(os.environ.get('SQLITE_POOL_SIZE', '8'))
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+SQLITE_STATEMENT_CACHE = 256
+
+# Applied to every connection. WAL lets readers run alongside the writer;
+# synchronous=NORMAL is durable across app crashes in WAL mode.
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}',
+    'PRAGMA cache_size=-16000',  # ~16 MB page cache
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA mmap_size=268435456',  # 256 MB
+)
+
+SQLITE_WAIT = Histogram(
+    'sqlite_wait_seconds',
+    'Time a call waited for its executor and connection',
+    ('db', 'op'),
+    buckets=QUERY_BUCKETS,
+)
+SQLITE_QUERY = Histogram(
+    'sqlite_query_seconds',
+    'Time a call spent running on its connection (a write includes its commit)',
+    ('db', 'op'),
+    buckets=QUERY_BUCKETS,
+)
+
+
+class SQLiteDatabase:
+    """Pooled SQLite access that never blocks the event loop.
+
+    Reads borrow a connection from a bounded pool and run on a dedicated
+    thread pool. Writes go through a single writer connection on its own
+    single-thread executor, so they are serialized without lock
+    contention between writers.
+
+    ``open()`` and ``close()`` block (they connect, set pragmas and wait
+    for running calls), so call them off the event loop, e.g. through
+    ``anyio.to_thread.run_sync`` in the startup and shutdown handlers.
+    Calls on a database that is not open raise instead of opening it.
+    """
+
+    def __init__(self, path: str, pool_size: int = SQLITE_POOL_SIZE):
+        self.path = path
+        self.pool_size = pool_size
+        self._readers: 'queue.Queue[sqlite3.Connection]' = queue.Queue(maxsize=pool_size)
+        self._writer: Optional[sqlite3.Connection] = None
+        self._read_executor: Optional[ThreadPoolExecutor] = None
+        self._write_executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        name = os.path.splitext(os.path.basename(path))[0]
+        self._read_wait = SQLITE_WAIT.labels(name, 'read')
+        self._read_time = SQLITE_QUERY.labels(name, 'read')
+        self._write_wait = SQLITE_WAIT.labels(name, 'write')
+        self._write_time = SQLITE_QUERY.labels(name, 'write')
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path,
+            check_same_thread=False,
+            cached_statements=SQLITE_STATEMENT_CACHE,
+            isolation_level=None,  # explicit transactions only
+        )
+        conn.row_factory = sqlite3.Row
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def open(self):
+        with self._lock:
+            if self._writer is not None:
+                return
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._writer = self._connect()
+            for _ in range(self.pool_size):
+                self._readers.put(self._connect())
+            self._read_executor = ThreadPoolExecutor(self.pool_size, thread_name_prefix='sqlite-read')
+            self._write_executor = ThreadPoolExecutor(1, thread_name_prefix='sqlite-write')
+
+    def close(self):
+        with self._lock:
+            if self._writer is None:
+                return
+            self._read_executor.shutdown(wait=True)
+            self._write_executor.shutdown(wait=True)
+            while not self._readers.empty():
+                self._readers.get_nowait().close()
+            self._writer.close()
+            self._writer = None
+
+    # ---- sync primitives (run on the executors) ----
+
+    def _run_read(self, fn: Callable[[sqlite3.Connection], Any], queued_at: float) -> Any:
+        conn = self._readers.get()
+        started = time.perf_counter()
+        self._read_wait.observe(started - queued_at)
+        try:
+            return fn(conn)
+        finally:
+            self._readers.put(conn)
+            self._read_time.observe(time.perf_counter() - started)
+
+    def _run_write(self, fn: Callable[[sqlite3.Connection], Any], queued_at: float) -> Any:
+        conn = self._writer
+        started = time.perf_counter()
+        self._write_wait.observe(started - queued_at)
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                result = fn(conn)
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+            return result
+        finally:
+            self._write_time.observe(time.perf_counter() - started)
+
+    # ---- async API ----
+
+    def _check_open(self):
+        if self._writer is None:
+            raise RuntimeError(f"SQLite database {self.path} is not open")
+
+    async def read(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        """Run fn(conn) on a pooled read connection"""
+        self._check_open()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._read_executor, self._run_read, fn, time.perf_counter())
+
+    async def write(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        """Run fn(conn) inside one serialized write transaction"""
+        self._check_open()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._write_executor, self._run_write, fn, time.perf_counter())
+
+    async def fetchall(self, sql: str, params: Sequence = ()) -> List[dict]:
+        return await self.read(lambda conn: [dict(row) for row in conn.execute(sql, params).fetchall()])
+
+    async def fetchone(self, sql: str, params: Sequence = ()) -> Optional[dict]:
+        def run(conn):
+            row = conn.execute(sql, params).fetchone()
+            return dict(row) if row is not None else None
+        return await self.read(run)
+
+    async def execute(self, sql: str, params: Sequence = ()) -> int:
+        """Run one write statement; returns the number of changed rows"""
+        return await self.write(lambda conn: conn.execute(sql, params).rowcount)
@@ -0,0 +1,71 @@
+import os
+import time
+from typing import Dict, List, Tuple
+
+
+def _process_started_at() -> float:
+    """Wall-clock time the process was started (Linux), otherwise now"""
+    try:
+        with open('/proc/self/stat') as f:
+            # Fields after the command name; starttime is field 22, in clock ticks since boot
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        started_after_boot = int(fields[19]) / os.sysconf('SC_CLK_TCK')
+        return time.time() - (uptime - started_after_boot)
+    except (OSError, ValueError, IndexError):
+        return time.time()
+
+
+class StartupProfile:
+    """Where a server process spends its time before it takes requests.
+
+    Import this module first; the server marks ``imports`` after its
+    imports, ``app`` once the module has built the app and ``ready`` at
+    the end of its startup handlers. Times count from process start, so
+    the first phase (``interpreter``) is Python's own startup plus
+    whatever ran before the server module (uvicorn, when it loads the
+    app). The breakdown is printed at ready and exported on /metrics as
+    ``startup_phase_seconds{phase}``. For per-module import times run
+    ``python backend/cold_start_check.py``.
+    """
+
+    def __init__(self):
+        # perf_counter() value at process start
+        self._origin = time.perf_counter() - max(time.time() - _process_started_at(), 0.0)
+        self.marks: List[Tuple[str, float]] = []
+        self.mark('interpreter')
+
+    def elapsed(self) -> float:
+        """Seconds since the process started"""
+        return time.perf_counter() - self._origin
+
+    def mark(self, phase: str):
+        """Record the end of a phase"""
+        self.marks.append((phase, self.elapsed()))
+
+    def phases(self) -> Dict[str, float]:
+        """Seconds spent in each phase, in order"""
+        durations = {}
+        previous = 0.0
+        for phase, at in self.marks:
+            durations[phase] = at - previous
+            previous = at
+        return durations
+
+    def report(self) -> str:
+        phase, at = self.marks[-1]
+        breakdown = ', '.join(f'{name} {seconds * 1000:.0f} ms' for name, seconds in self.phases().items())
+        return f"Startup: {phase} {at * 1000:.0f} ms after process start ({breakdown})"
+
+    def ready(self):
+        self.mark('ready')
+        print(self.report())
+
+    def collect(self):
+        """Metrics collector (see metrics.register_collector)"""
+        yield ('startup_phase_seconds', 'gauge', 'Time this process spent in each startup phase',
+               [({'phase': phase}, seconds) for phase, seconds in self.phases().items()])
+
+
+startup = StartupProfile()
@@ -0,0 +1,225 @@
+import os
+import re
+import sys
+import gzip
+import hashlib
+import mimetypes
+from typing import Dict, Optional, Set, Tuple
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from streaming import RangedFileResponse, is_not_modified
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only without it
+    brotli = None
+
+FRONTEND_DIST = os.environ.get(
+    'FRONTEND_DIST',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'frontend', 'dist')
+)
+# Files up to this size (and their variants) are served from memory
+STATIC_MEMORY_MAX_FILE = int(os.environ.get('STATIC_MEMORY_MAX_FILE_KB', '512')) * 1024
+
+# Build output with a content hash in the name never changes
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# index.html must be revalidated so a deploy takes effect at once
+INDEX_CACHE_CONTROL = 'no-cache'
+DEFAULT_CACHE_CONTROL = 'public, max-age=3600'
+
+# CRA names: main.1a2b3c4d.js, 453.9f8e7d6c.chunk.js, logo.0123abcd.svg
+_HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{8,}\.(?:chunk\.)?[A-Za-z0-9]+$')
+
+COMPRESSIBLE_TYPES = (
+    'text/', 'application/javascript', 'application/json', 'application/manifest+json',
+    'application/xml', 'image/svg+xml', 'application/wasm', 'image/x-icon', 'image/vnd.microsoft.icon',
+    'font/ttf', 'font/otf',
+)
+# Below this, compression saves less than the header costs
+MIN_COMPRESS_SIZE = 1024
+
+# Content-Encoding -> file suffix, most preferred first
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+mimetypes.add_type('application/javascript', '.js')
+mimetypes.add_type('application/manifest+json', '.webmanifest')
+mimetypes.add_type('image/svg+xml', '.svg')
+
+
+def _compress(data: bytes, encoding: str, level: str = 'startup') -> Optional[bytes]:
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=9 if level == 'build' else 6, mtime=0)
+    if encoding == 'br' and brotli is not None:
+        return brotli.compress(data, quality=11 if level == 'build' else 5)
+    return None
+
+
+def _is_compressible(content_type: str) -> bool:
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def accepted_encodings(header: Optional[str]) -> Set[str]:
+    """Content codings the client accepts (q > 0)"""
+    accepted = set()
+    for part in (header or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding and q > 0:
+            accepted.add(coding)
+    return accepted
+
+
+class StaticFile:
+    """One file of the build with its precompressed variants"""
+
+    def __init__(self, path: str, rel_path: str):
+        stat = os.stat(path)
+        self.path = path
+        self.size = stat.st_size
+        content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type == 'application/javascript':
+            content_type += '; charset=utf-8'
+        self.content_type = content_type
+        if rel_path == 'index.html':
+            self.cache_control = INDEX_CACHE_CONTROL
+        elif _HASHED_NAME_RE.search(rel_path):
+            self.cache_control = IMMUTABLE_CACHE_CONTROL
+        else:
+            self.cache_control = DEFAULT_CACHE_CONTROL
+        self.etag = f'"{self.size:x}-{stat.st_mtime_ns:x}"'
+        self.body: Optional[bytes] = None
+        # encoding -> (in-memory body or None, path on disk or None, size)
+        self.variants: Dict[str, Tuple[Optional[bytes], Optional[str], int]] = {}
+
+    def load(self):
+        in_memory = self.size <= STATIC_MEMORY_MAX_FILE
+        if in_memory:
+            with open(self.path, 'rb') as f:
+                self.body = f.read()
+            self.etag = f'"{hashlib.sha1(self.body).hexdigest()[:20]}"'
+        if not _is_compressible(self.content_type) or self.size < MIN_COMPRESS_SIZE:
+            return
+        for encoding, suffix in ENCODINGS:
+            variant_path = self.path + suffix
+            if os.path.exists(variant_path):
+                size = os.path.getsize(variant_path)
+                if size >= self.size:
+                    continue
+                if in_memory:
+                    with open(variant_path, 'rb') as f:
+                        self.variants[encoding] = (f.read(), None, size)
+                else:
+                    self.variants[encoding] = (None, variant_path, size)
+            elif in_memory:
+                data = _compress(self.body, encoding)
+                if data is not None and len(data) < self.size:
+                    self.variants[encoding] = (data, None, len(data))
+
+    def response(self, request: Request) -> Response:
+        encoding = None
+        if self.variants:
+            accepted = accepted_encodings(request.headers.get('accept-encoding'))
+            # Our preference (smallest first), not the client's order
+            for coding, _ in ENCODINGS:
+                if coding in self.variants and (coding in accepted or '*' in accepted):
+                    encoding = coding
+                    break
+        etag = self.etag if encoding is None else f'{self.etag[:-1]}-{encoding}"'
+        headers = {'ETag': etag, 'Cache-Control': self.cache_control}
+        if self.variants:
+            headers['Vary'] = 'Accept-Encoding'
+
+        if is_not_modified(request.headers, etag):
+            return Response(status_code=304, headers=headers)
+
+        if encoding is None:
+            body, path, size = self.body, self.path, self.size
+        else:
+            body, path, size = self.variants[encoding]
+            headers['Content-Encoding'] = encoding
+        if body is not None:
+            return Response(body, media_type=self.content_type, headers=headers)
+        headers['Content-Length'] = str(size)
+        return RangedFileResponse(path, 0, size - 1, size, headers=headers, media_type=self.content_type)
+
+
+class StaticSite:
+    """The built React frontend, indexed once at startup.
+
+    Compressible files get gzip and brotli variants, chosen by
+    Accept-Encoding. The variants are written next to the files at image
+    build time (``python backend/static_site.py frontend/dist``). A small
+    file without them is compressed once when the site loads. Small
+    files and their variants are held in memory; larger ones are streamed
+    from disk by RangedFileResponse.
+
+    Paths that aren't files fall back to index.html, so client-side
+    routes work on reload. Paths that look like assets get a plain 404.
+    """
+
+    def __init__(self, root: str = FRONTEND_DIST):
+        self.root = os.path.abspath(root)
+        self.files: Dict[str, StaticFile] = {}
+
+    @property
+    def available(self) -> bool:
+        return 'index.html' in self.files
+
+    def load(self):
+        files = {}
+        if os.path.isdir(self.root):
+            for directory, _, names in os.walk(self.root):
+                for name in names:
+                    if name.endswith(('.gz', '.br')):
+                        continue
+                    path = os.path.join(directory, name)
+                    rel_path = os.path.relpath(path, self.root).replace(os.sep, '/')
+                    static_file = StaticFile(path, rel_path)
+                    static_file.load()
+                    files[rel_path] = static_file
+        self.files = files
+        if not self.available:
+            print(f"Frontend build not found at {self.root}; not serving the app")
+
+    def lookup(self, path: str) -> Optional[StaticFile]:
+        path = path.strip('/')
+        static_file = self.files.get(path or 'index.html')
+        if static_file is not None:
+            return static_file
+        last = path.rsplit('/', 1)[-1]
+        if path.startswith('static/') or '.' in last:
+            return None
+        return self.files.get('index.html')
+
+
+def precompress(root: str):
+    """Write .gz/.br variants next to every compressible file (build step)"""
+    for directory, _, names in os.walk(root):
+        for name in names:
+            if name.endswith(('.gz', '.br')):
+                continue
+            path = os.path.join(directory, name)
+            content_type = mimetypes.guess_type(path)[0] or ''
+            if not _is_compressible(content_type) or os.path.getsize(path) < MIN_COMPRESS_SIZE:
+                continue
+            with open(path, 'rb') as f:
+                data = f.read()
+            for encoding, suffix in ENCODINGS:
+                compressed = _compress(data, encoding, level='build')
+                if compressed is not None and len(compressed) < len(data):
+                    with open(path + suffix, 'wb') as f:
+                        f.write(compressed)
+
+
+if __name__ == '__main__':
+    precompress(sys.argv[1] if len(sys.argv) > 1 else FRONTEND_DIST)
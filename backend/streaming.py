@@ -0,0 +1,272 @@
+import os
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Mapping, Optional, Tuple
+
+import anyio
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from metrics import Counter
+
+# Content types for the upload formats we accept
+AUDIO_CONTENT_TYPES = {
+    '.mp3': 'audio/mpeg',
+    '.wav': 'audio/wav',
+    '.m4a': 'audio/mp4',
+    '.flac': 'audio/flac',
+    '.ogg': 'audio/ogg',
+    '.opus': 'audio/ogg',
+}
+
+GENERIC_CONTENT_TYPES = {None, '', 'application/octet-stream', 'binary/octet-stream'}
+
+STREAM_CHUNK_SIZE = 1024 * 1024  # 1MB
+AUDIO_CACHE_CONTROL = 'public, max-age=86400'
+
+# ?quality= values; "original" always serves the uploaded file
+STREAM_QUALITIES = ('low', 'medium', 'high', 'original')
+DEFAULT_STREAM_QUALITY = os.environ.get('DEFAULT_STREAM_QUALITY', 'medium')
+
+# Media types a client must list to be sent each rendition codec.
+# AAC is also sent on wildcards since every browser can play it.
+CODEC_MEDIA_TYPES = {
+    'opus': ('audio/ogg', 'audio/opus', 'application/ogg'),
+    'aac': ('audio/mp4', 'audio/aac', 'audio/x-m4a', 'audio/*', '*/*'),
+}
+
+FILE_BYTES_SENT = Counter(
+    'file_response_bytes_total',
+    'Bytes of files on disk handed to the server, by send path',
+    ('mode',),
+)
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def guess_audio_content_type(stored_type: Optional[str], filename: Optional[str]) -> str:
+    """Prefer the stored content type, fall back to the file extension"""
+    if stored_type not in GENERIC_CONTENT_TYPES:
+        return stored_type
+    ext = os.path.splitext(filename or '')[1].lower()
+    return AUDIO_CONTENT_TYPES.get(ext, 'audio/mpeg')
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single byte range into an inclusive (start, end) pair.
+
+    Returns None when the whole resource should be sent (no header, a
+    non-bytes unit or a multi-range request, which we are allowed to
+    ignore). Raises RangeNotSatisfiable for ranges outside the resource.
+    """
+    if not header:
+        return None
+
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        return None
+
+    first, sep, last = spec.strip().partition('-')
+    if not sep:
+        return None
+
+    try:
+        if first == '':
+            # Suffix range: the final N bytes
+            length = int(last)
+            if length <= 0:
+                raise RangeNotSatisfiable()
+            return max(size - length, 0), size - 1
+
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+
+    if start >= size:
+        raise RangeNotSatisfiable()
+    if start > end:
+        return None
+    return start, min(end, size - 1)
+
+
+def http_date(value: datetime) -> str:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value, usegmt=True)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == '*':
+        return True
+    # Weak comparison, as required for If-None-Match
+    candidates = [tag.strip().removeprefix('W/') for tag in header.split(',')]
+    return etag.removeprefix('W/') in candidates
+
+
+def is_not_modified(headers: Mapping[str, str], etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """Evaluate If-None-Match / If-Modified-Since for a GET request"""
+    if_none_match = headers.get('if-none-match')
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+
+    if_modified_since = headers.get('if-modified-since')
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        # HTTP dates have one-second resolution
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def range_applies(headers: Mapping[str, str], etag: str) -> bool:
+    """If-Range: only honour Range when the client's validator still matches"""
+    if_range = headers.get('if-range')
+    return if_range is None or if_range.strip() == etag
+
+
+class RangedFileResponse(Response):
+    """Send bytes start..end of a file on disk.
+
+    Hands the file to the server's sendfile path when it advertises the
+    ASGI zerocopysend (any range) or pathsend (whole file) extension, so
+    the bytes never pass through Python. Other servers get large pread
+    chunks from a worker thread.
+    """
+
+    def __init__(self, path: str, start: int, end: int, size: int, status_code: int = 200,
+                 headers: Optional[Mapping[str, str]] = None, media_type: Optional[str] = None):
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        self.path = path
+        self.start = start
+        self.end = end
+        self.size = size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        extensions = scope.get('extensions') or {}
+        count = self.end - self.start + 1
+        file = await anyio.to_thread.run_sync(open, self.path, 'rb')
+        try:
+            await send({'type': 'http.response.start', 'status': self.status_code, 'headers': self.raw_headers})
+            if scope['method'].upper() == 'HEAD' or count <= 0:
+                await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+            elif 'http.response.zerocopysend' in extensions:
+                await send({
+                    'type': 'http.response.zerocopysend',
+                    'file': file,
+                    'offset': self.start,
+                    'count': count,
+                    'more_body': False
+                })
+                FILE_BYTES_SENT.labels('zerocopysend').inc(count)
+            elif 'http.response.pathsend' in extensions and self.start == 0 and count == self.size:
+                await send({'type': 'http.response.pathsend', 'path': self.path})
+                FILE_BYTES_SENT.labels('pathsend').inc(count)
+            else:
+                fd = file.fileno()
+                offset = self.start
+                remaining = count
+                while remaining > 0:
+                    chunk = await anyio.to_thread.run_sync(os.pread, fd, min(STREAM_CHUNK_SIZE, remaining), offset)
+                    if not chunk:
+                        break
+                    offset += len(chunk)
+                    remaining -= len(chunk)
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': remaining > 0})
+                    FILE_BYTES_SENT.labels('pread').inc(len(chunk))
+                if remaining > 0:
+                    # File shrank underneath us; end the response
+                    await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            await anyio.to_thread.run_sync(file.close)
+
+
+def _accepted_types(accept: Optional[str]) -> Dict[str, float]:
+    """Media type -> q value from an Accept header"""
+    if not accept:
+        return {'*/*': 1.0}
+    types = {}
+    for part in accept.split(','):
+        media_type, *params = [item.strip() for item in part.split(';')]
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if media_type:
+            types[media_type.lower()] = q
+    return types
+
+
+def choose_rendition(renditions: Optional[Dict[str, Dict]], accept: Optional[str],
+                     quality: Optional[str] = None) -> Optional[Dict]:
+    """Pick the transcoded rendition to stream, or None for the original.
+
+    Opus is preferred when the client explicitly accepts Ogg; otherwise
+    AAC, which any client accepting audio/* or */* can play.
+    """
+    quality = quality or DEFAULT_STREAM_QUALITY
+    if not renditions or quality == 'original':
+        return None
+    accepted = _accepted_types(accept)
+    for codec, media_types in CODEC_MEDIA_TYPES.items():
+        if max((accepted.get(media_type, 0.0) for media_type in media_types), default=0.0) <= 0:
+            continue
+        for rendition in renditions.values():
+            if rendition['codec'] == codec and rendition['quality'] == quality:
+                return rendition
+    return None
+
+
+def blob_response(request: Request, blob, file_name: str,
+                  extra_headers: Optional[Mapping[str, str]] = None) -> Response:
+    """Full, ranged (206/416) or 304 response for a stored audio blob"""
+    size = blob.size
+    etag = blob.etag
+    headers = {
+        **(extra_headers or {}),
+        'Accept-Ranges': 'bytes',
+        'ETag': etag,
+        'Last-Modified': http_date(blob.uploaded_at),
+        'Cache-Control': AUDIO_CACHE_CONTROL,
+        'Content-Disposition': f'inline; filename="{file_name}"'
+    }
+
+    if is_not_modified(request.headers, etag, blob.uploaded_at):
+        return Response(status_code=304, headers=headers)
+
+    byte_range = None
+    if range_applies(request.headers, etag):
+        try:
+            byte_range = parse_range(request.headers.get('range'), size)
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers={**headers, 'Content-Range': f'bytes */{size}'})
+
+    status_code = 200
+    start, end = 0, size - 1
+    if byte_range is not None:
+        start, end = byte_range
+        status_code = 206
+        headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+    headers['Content-Length'] = str(end - start + 1)
+    media_type = guess_audio_content_type(blob.content_type, file_name)
+
+    if blob.path is not None:
+        return RangedFileResponse(blob.path, start, end, size, status_code=status_code,
+                                  headers=headers, media_type=media_type)
+    return StreamingResponse(
+        blob.iter_range(start, end, STREAM_CHUNK_SIZE),
+        status_code=status_code,
+        media_type=media_type,
+        headers=headers
+    )
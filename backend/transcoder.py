@@ -0,0 +1,140 @@
+import os
+import shutil
+import asyncio
+import tempfile
+from datetime import timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from song_jobs import SongJobRunner
+
+FFMPEG = os.environ.get('FFMPEG_PATH', 'ffmpeg')
+TRANSCODE_WORKERS = int(os.environ.get('TRANSCODE_WORKERS', '2'))
+TRANSCODE_TIMEOUT = float(os.environ.get('TRANSCODE_TIMEOUT_SECONDS', '600'))
+TRANSCODE_TMP_DIR = os.environ.get('TRANSCODE_TMP_DIR') or None
+# A job left in "processing" this long belonged to a worker that died
+TRANSCODE_STALE_AFTER = timedelta(minutes=30)
+
+# Streaming renditions made for every upload: name -> encoder settings.
+# Opus is the smaller of the two at equal quality; AAC in MP4 plays
+# everywhere (Safari included).
+RENDITIONS: Dict[str, Dict] = {
+    'opus-low': {'codec': 'opus', 'quality': 'low', 'bitrate': 32, 'ext': '.opus',
+                 'contentType': 'audio/ogg', 'args': ['-c:a', 'libopus', '-vbr', 'on']},
+    'opus-medium': {'codec': 'opus', 'quality': 'medium', 'bitrate': 64, 'ext': '.opus',
+                    'contentType': 'audio/ogg', 'args': ['-c:a', 'libopus', '-vbr', 'on']},
+    'opus-high': {'codec': 'opus', 'quality': 'high', 'bitrate': 128, 'ext': '.opus',
+                  'contentType': 'audio/ogg', 'args': ['-c:a', 'libopus', '-vbr', 'on']},
+    'aac-low': {'codec': 'aac', 'quality': 'low', 'bitrate': 48, 'ext': '.m4a',
+                'contentType': 'audio/mp4', 'args': ['-c:a', 'aac', '-movflags', '+faststart']},
+    'aac-medium': {'codec': 'aac', 'quality': 'medium', 'bitrate': 96, 'ext': '.m4a',
+                   'contentType': 'audio/mp4', 'args': ['-c:a', 'aac', '-movflags', '+faststart']},
+    'aac-high': {'codec': 'aac', 'quality': 'high', 'bitrate': 160, 'ext': '.m4a',
+                 'contentType': 'audio/mp4', 'args': ['-c:a', 'aac', '-movflags', '+faststart']},
+}
+
+
+class TranscodeError(Exception):
+    pass
+
+
+def ffmpeg_command(source: str, outputs: Dict[str, str]) -> List[str]:
+    """One ffmpeg run that decodes the source once and writes every rendition"""
+    command = [FFMPEG, '-nostdin', '-hide_banner', '-loglevel', 'error', '-y', '-i', source]
+    for name, path in outputs.items():
+        spec = RENDITIONS[name]
+        command += ['-map', '0:a:0', '-vn', '-map_metadata', '-1', *spec['args'],
+                    '-b:a', f"{spec['bitrate']}k", path]
+    return command
+
+
+class Transcoder(SongJobRunner):
+    """Creates compressed streaming renditions of uploaded songs.
+
+    Jobs are tracked through ``transcodeStatus`` on the song (see
+    SongJobRunner), like metadata extraction. At most ``workers`` encoder
+    subprocesses run at once; renditions are stored through the
+    FileService next to the original and listed under ``renditions`` on
+    the song.
+    """
+
+    job_name = 'Transcode'
+
+    def __init__(self, db, file_service, workers: int = TRANSCODE_WORKERS,
+                 on_change: Optional[Callable[..., Awaitable]] = None):
+        super().__init__(db, 'transcode', TRANSCODE_STALE_AFTER, workers, on_change)
+        self.file_service = file_service
+        self.enabled = False
+
+    async def start(self):
+        self.enabled = shutil.which(FFMPEG) is not None
+        if not self.enabled:
+            print(f"Transcoding disabled: {FFMPEG} not found; uploads stream as originals")
+            return
+        await super().start()
+
+    def enqueue(self, song_id: str):
+        if self.enabled:
+            super().enqueue(song_id)
+
+    async def run(self, song: Dict):
+        renditions = await self._transcode(song['audioFileId'], song.get('fileName') or 'audio')
+        result = await self.db.songs.update_one(
+            {'_id': song['_id'], 'audioFileId': song['audioFileId']},
+            {'$set': {'transcodeStatus': 'complete', 'renditions': renditions},
+             '$unset': {'transcodeError': ''}}
+        )
+        if result.matched_count == 0:
+            # Song was deleted meanwhile; don't leak its renditions
+            for rendition in renditions.values():
+                await self.file_service.delete_audio_file(rendition['fileId'])
+        else:
+            await self._changed()
+
+    async def _transcode(self, file_id: str, file_name: str) -> Dict[str, Dict]:
+        stem = os.path.splitext(file_name)[0]
+        # Encoders need a seekable input for some containers (MP4)
+        async with self.file_service.local_copy(file_id, TRANSCODE_TMP_DIR) as source:
+            with tempfile.TemporaryDirectory(prefix='transcode-', dir=TRANSCODE_TMP_DIR) as tmp:
+                outputs = {name: os.path.join(tmp, name + spec['ext']) for name, spec in RENDITIONS.items()}
+                await self._run(ffmpeg_command(source, outputs))
+
+                renditions = {}
+                try:
+                    for name, path in outputs.items():
+                        spec = RENDITIONS[name]
+                        with open(path, 'rb') as f:
+                            stored = await self.file_service.store_file(f, stem + spec['ext'], spec['contentType'])
+                        renditions[name] = {
+                            'fileId': stored['fileId'],
+                            'codec': spec['codec'],
+                            'quality': spec['quality'],
+                            'bitrate': spec['bitrate'],
+                            'contentType': spec['contentType'],
+                            'ext': spec['ext'],
+                            'size': stored['fileSize'],
+                        }
+                except BaseException:
+                    for rendition in renditions.values():
+                        await self.file_service.delete_audio_file(rendition['fileId'])
+                    raise
+        return renditions
+
+    async def _run(self, command: List[str]):
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            _, stderr = await asyncio.wait_for(process.communicate(), TRANSCODE_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise TranscodeError(f"ffmpeg timed out after {TRANSCODE_TIMEOUT:.0f}s")
+        finally:
+            # Timed out or cancelled: don't leave the encoder running
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+        if process.returncode != 0:
+            message = stderr.decode(errors='replace').strip().splitlines()
+            raise TranscodeError(message[-1] if message else f"ffmpeg exited with {process.returncode}")
@@ -0,0 +1,15 @@
+import time
+import logging
+
+logger = logging.getLogger("Creator360.jobs")
+
+
+def generate_video(job: dict) -> dict:
+    """Blocking AI video generation; runs on the worker pool threads"""
+    logger.info(f"Starting background processing for {job['id']}")
+    # In reality, this calls video_engine.py
+    time.sleep(10) # Simulate AI work
+    return {
+        "script": "AI Generated Script Content...",
+        "video_url": "https://8080-iz6w8w490tqm21gwvi1m3-1e655f4f.sg1.manus.computer/videos/sample.mp4"
+    }
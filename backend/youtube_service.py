@@ -1,79 +1,235 @@
 import os
 import re
-import requests
-from typing import List, Dict
+import time
+import asyncio
+import logging
+import httpx
+from typing import List, Dict, Optional, Tuple
+
+from cache import TTLCache, SingleFlight
+from metrics import Counter, Histogram
+
+logger = logging.getLogger("Creator360.youtube")
 
 YOUTUBE_API_KEY = os.environ.get('YOUTUBE_API_KEY')
-YOUTUBE_API_BASE = 'https://www.googleapis.com/youtube/v3'
+YOUTUBE_API_BASE = os.environ.get('YOUTUBE_API_BASE', 'https://www.googleapis.com/youtube/v3')
+
+# Outbound HTTP tuning
+YOUTUBE_TIMEOUT = float(os.environ.get('YOUTUBE_TIMEOUT', '10'))
+YOUTUBE_CONNECT_TIMEOUT = float(os.environ.get('YOUTUBE_CONNECT_TIMEOUT', '3'))
+YOUTUBE_MAX_CONCURRENCY = int(os.environ.get('YOUTUBE_MAX_CONCURRENCY', '16'))
+YOUTUBE_MAX_KEEPALIVE = int(os.environ.get('YOUTUBE_MAX_KEEPALIVE', '16'))
+
+# Result caches
+SEARCH_CACHE_SIZE = int(os.environ.get('YOUTUBE_SEARCH_CACHE_SIZE', '2048'))
+SEARCH_CACHE_TTL = float(os.environ.get('YOUTUBE_SEARCH_CACHE_TTL', '600'))
+VIDEO_CACHE_SIZE = int(os.environ.get('YOUTUBE_VIDEO_CACHE_SIZE', '20000'))
+VIDEO_CACHE_TTL = float(os.environ.get('YOUTUBE_VIDEO_CACHE_TTL', '21600'))
+
+# videos.list accepts at most 50 IDs per call
+VIDEOS_BATCH_SIZE = 50
+
+# Daily quota units each endpoint costs (Data API v3 quota table)
+QUOTA_COST = {'search': 100, 'videos': 1, 'playlistItems': 1}
+
+YOUTUBE_CALLS = Counter(
+    'youtube_api_calls_total',
+    'Calls to the YouTube Data API by endpoint and HTTP status ("error" if no response)',
+    ('endpoint', 'status'),
+)
+YOUTUBE_QUOTA = Counter(
+    'youtube_api_quota_units_total',
+    'Estimated quota units spent (calls that got a response)',
+    ('endpoint',),
+)
+YOUTUBE_LATENCY = Histogram(
+    'youtube_api_duration_seconds',
+    'YouTube Data API round trips, excluding time queued behind the concurrency cap',
+    ('endpoint',),
+)
+
 
 class YouTubeService:
-    def search_videos(self, query: str, max_results: int = 10) -> List[Dict]:
+    def __init__(
+        self,
+        max_concurrency: int = YOUTUBE_MAX_CONCURRENCY,
+        timeout: float = YOUTUBE_TIMEOUT,
+    ):
+        self._timeout = timeout
+        self._max_concurrency = max_concurrency
+        # Caps outbound calls so a burst of searches queues here instead of
+        # opening unbounded sockets to the API
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._client: Optional[httpx.AsyncClient] = None
+        # Search results keyed by (normalized query, maxResults)
+        self._search_cache = TTLCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL, name='youtube_search')
+        # Parsed contentDetails/snippet keyed by videoId
+        self._video_cache = TTLCache(VIDEO_CACHE_SIZE, VIDEO_CACHE_TTL, name='youtube_videos')
+        # Identical concurrent searches share one upstream fetch
+        self._search_flight = SingleFlight()
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Shared keep-alive client, created lazily inside the running loop"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=YOUTUBE_API_BASE,
+                timeout=httpx.Timeout(self._timeout, connect=YOUTUBE_CONNECT_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=self._max_concurrency,
+                    max_keepalive_connections=YOUTUBE_MAX_KEEPALIVE,
+                    keepalive_expiry=30,
+                ),
+            )
+        return self._client
+
+    async def _get(self, path: str, params: Dict, timeout: Optional[float] = None) -> Dict:
+        """GET an API resource with the shared pool and concurrency cap"""
+        request_timeout = httpx.USE_CLIENT_DEFAULT
+        if timeout is not None:
+            request_timeout = httpx.Timeout(timeout, connect=YOUTUBE_CONNECT_TIMEOUT)
+        endpoint = path.strip('/')
+        status = 'error'
+        async with self._semaphore:
+            started = time.perf_counter()
+            try:
+                response = await self._get_client().get(
+                    path,
+                    params={'key': YOUTUBE_API_KEY, **params},
+                    timeout=request_timeout,
+                )
+                status = str(response.status_code)
+            finally:
+                YOUTUBE_LATENCY.labels(endpoint).observe(time.perf_counter() - started)
+                YOUTUBE_CALLS.labels(endpoint, status).inc()
+        YOUTUBE_QUOTA.labels(endpoint).inc(QUOTA_COST.get(endpoint, 1))
+        response.raise_for_status()
+        return response.json()
+
+    async def close(self):
+        """Close pooled connections (call on app shutdown)"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def cache_stats(self) -> Dict:
+        return {
+            'search': self._search_cache.stats(),
+            'videos': self._video_cache.stats(),
+            'coalescing': self._search_flight.stats(),
+        }
+
+    @staticmethod
+    def _search_key(query: str, max_results: int) -> Tuple[str, int]:
+        return (' '.join(query.split()).casefold(), max_results)
+
+    async def search_videos(self, query: str, max_results: int = 10, timeout: Optional[float] = None) -> List[Dict]:
+        key = self._search_key(query, max_results)
+        cached = self._search_cache.get(key)
+        if cached is not None:
+            return list(cached)
+
         try:
-            print(f"[DEBUG] Searching YouTube: {query}")
-            
-            # Search for videos using REST API directly
-            search_url = f"{YOUTUBE_API_BASE}/search"
-            search_params = {
-                'key': YOUTUBE_API_KEY,
-                'q': query,
-                'part': 'id,snippet',
-                'maxResults': max_results,
-                'type': 'video'
-            }
-            
-            search_response = requests.get(search_url, params=search_params, timeout=10)
-            search_response.raise_for_status()
-            search_data = search_response.json()
-            
-            video_ids = [item['id']['videoId'] for item in search_data.get('items', [])]
-            
-            if not video_ids:
-                print("[DEBUG] No videos found")
-                return []
-            
-            # Get video details including duration
-            videos_url = f"{YOUTUBE_API_BASE}/videos"
-            videos_params = {
-                'key': YOUTUBE_API_KEY,
-                'part': 'contentDetails,snippet',
-                'id': ','.join(video_ids)
-            }
-            
-            videos_response = requests.get(videos_url, params=videos_params, timeout=10)
-            videos_response.raise_for_status()
-            videos_data = videos_response.json()
-            
-            results = []
-            for item in videos_data.get('items', []):
-                video_id = item['id']
-                snippet = item['snippet']
-                duration_str = item['contentDetails']['duration']
-                
-                # Parse ISO 8601 duration (PT4M13S format)
-                duration_seconds = self._parse_duration(duration_str)
-                duration_formatted = self._format_duration(duration_seconds)
-                
-                # Extract artist and title from video title
-                title_parts = self._parse_title(snippet['title'])
-                
-                results.append({
-                    'videoId': video_id,
-                    'title': title_parts['title'],
-                    'artist': title_parts['artist'],
-                    'thumbnail': snippet['thumbnails']['high']['url'],
-                    'duration': duration_formatted,
-                    'durationSeconds': duration_seconds
-                })
-            
-            print(f"[DEBUG] Found {len(results)} videos")
-            return results
-            
-        except requests.exceptions.RequestException as e:
-            print(f"YouTube API request error: {e}")
+            results = await self._search_flight.do(
+                key, lambda: self._fetch_and_cache_search(key, query, max_results, timeout)
+            )
+        except httpx.HTTPError as e:
+            logger.error(f"YouTube API request error: {e}")
             return []
         except Exception as e:
-            print(f"YouTube API error: {e}")
+            logger.exception(f"YouTube API error: {e}")
             return []
+
+        return list(results)
+
+    async def _fetch_and_cache_search(self, key: Tuple[str, int], query: str, max_results: int, timeout: Optional[float]) -> List[Dict]:
+        """Single-flight body: only successful fetches are cached"""
+        logger.debug(f"Searching YouTube: {query}")
+        results = await self._fetch_search(query, max_results, timeout)
+        self._search_cache.set(key, results)
+        logger.debug(f"Found {len(results)} videos for {query}")
+        return results
+
+    async def _fetch_search(self, query: str, max_results: int, timeout: Optional[float] = None) -> List[Dict]:
+        """Run search.list + videos.list upstream; raises on API errors"""
+        search_data = await self._get('/search', {
+            'q': query,
+            'part': 'id,snippet',
+            'maxResults': max_results,
+            'type': 'video'
+        }, timeout=timeout)
+        
+        video_ids = [item['id']['videoId'] for item in search_data.get('items', [])]
+        
+        if not video_ids:
+            logger.debug(f"No videos found for {query}")
+            return []
+        
+        # Get video details including duration, keeping search order
+        details = await self.get_video_details(video_ids, timeout=timeout)
+        return [details[video_id] for video_id in video_ids if video_id in details]
+
+    async def get_video_details(self, video_ids: List[str], timeout: Optional[float] = None) -> Dict[str, Dict]:
+        """Fetch search-result-shaped details by videoId, only asking the API for IDs not cached"""
+        details = self._video_cache.get_many(video_ids)
+        missing = [video_id for video_id in dict.fromkeys(video_ids) if video_id not in details]
+
+        # Batches run concurrently; the semaphore still caps outbound calls
+        batches = [missing[i:i + VIDEOS_BATCH_SIZE] for i in range(0, len(missing), VIDEOS_BATCH_SIZE)]
+        responses = await asyncio.gather(*[
+            self._get('/videos', {
+                'part': 'contentDetails,snippet',
+                'id': ','.join(batch)
+            }, timeout=timeout)
+            for batch in batches
+        ])
+
+        for videos_data in responses:
+            for item in videos_data.get('items', []):
+                result = self._build_result(item)
+                self._video_cache.set(result['videoId'], result)
+                details[result['videoId']] = result
+
+        return details
+
+    async def get_playlist_video_ids(self, playlist_id: str, max_items: int, timeout: Optional[float] = None) -> List[str]:
+        """Page through playlistItems.list (50 per call) and return video IDs in order"""
+        video_ids: List[str] = []
+        page_token = None
+        while len(video_ids) < max_items:
+            params = {
+                'playlistId': playlist_id,
+                'part': 'contentDetails',
+                'maxResults': VIDEOS_BATCH_SIZE
+            }
+            if page_token:
+                params['pageToken'] = page_token
+            data = await self._get('/playlistItems', params, timeout=timeout)
+            video_ids.extend(item['contentDetails']['videoId'] for item in data.get('items', []))
+            page_token = data.get('nextPageToken')
+            if not page_token:
+                break
+        return video_ids[:max_items]
+    
+    def _build_result(self, item: Dict) -> Dict:
+        """Convert a videos.list item to the search result shape"""
+        snippet = item['snippet']
+        duration_str = item['contentDetails']['duration']
+        
+        # Parse ISO 8601 duration (PT4M13S format)
+        duration_seconds = self._parse_duration(duration_str)
+        duration_formatted = self._format_duration(duration_seconds)
+        
+        # Extract artist and title from video title
+        title_parts = self._parse_title(snippet['title'])
+        
+        return {
+            'videoId': item['id'],
+            'title': title_parts['title'],
+            'artist': title_parts['artist'],
+            'thumbnail': snippet['thumbnails']['high']['url'],
+            'duration': duration_formatted,
+            'durationSeconds': duration_seconds
+        }
     
     def _parse_duration(self, duration_str: str) -> int:
         """Parse ISO 8601 duration (PT4M13S) to seconds"""
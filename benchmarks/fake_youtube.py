@@ -0,0 +1,106 @@
+"""Stand-in for the YouTube Data API v3 endpoints the backend calls
+(search.list, videos.list, playlistItems.list).
+
+Responses are deterministic for a given query/ID and can be delayed to
+mimic the real API's latency:
+
+    python benchmarks/fake_youtube.py --port 8765 --latency-ms 80
+
+Point the backend at it with YOUTUBE_API_BASE=http://127.0.0.1:8765/youtube/v3
+"""
+import asyncio
+import hashlib
+import argparse
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+LATENCY_SECONDS = 0.0
+PLAYLIST_LENGTH = 120
+PAGE_SIZE = 50
+
+# Units each call costs against the real API's daily quota
+QUOTA_COST = {'search': 100, 'videos': 1, 'playlistItems': 1}
+stats = {'calls': {name: 0 for name in QUOTA_COST}, 'quotaUnits': 0}
+
+
+def _video_id(seed: str) -> str:
+    return hashlib.sha1(seed.encode()).hexdigest()[:11]
+
+
+def _video(video_id: str) -> dict:
+    n = int(video_id[:6], 16)
+    return {
+        'id': video_id,
+        'snippet': {
+            'title': f'Artist {n % 997} - Track {n % 10007}',
+            'channelTitle': f'Channel {n % 97}',
+            'thumbnails': {'high': {'url': f'https://i.ytimg.com/vi/{video_id}/hqdefault.jpg'}},
+        },
+        'contentDetails': {'duration': f'PT{2 + n % 6}M{n % 60}S'},
+    }
+
+
+async def _respond(name: str, body: dict) -> JSONResponse:
+    stats['calls'][name] += 1
+    stats['quotaUnits'] += QUOTA_COST[name]
+    if LATENCY_SECONDS:
+        await asyncio.sleep(LATENCY_SECONDS)
+    return JSONResponse(body)
+
+
+async def search(request: Request):
+    query = request.query_params.get('q', '')
+    count = min(int(request.query_params.get('maxResults', 5)), 50)
+    items = [
+        {'id': {'kind': 'youtube#video', 'videoId': _video_id(f'{query}:{i}')}}
+        for i in range(count)
+    ]
+    return await _respond('search', {'items': items})
+
+
+async def videos(request: Request):
+    ids = [video_id for video_id in request.query_params.get('id', '').split(',') if video_id]
+    return await _respond('videos', {'items': [_video(video_id) for video_id in ids]})
+
+
+async def playlist_items(request: Request):
+    playlist_id = request.query_params.get('playlistId', '')
+    start = int(request.query_params.get('pageToken') or 0)
+    end = min(start + PAGE_SIZE, PLAYLIST_LENGTH)
+    body = {'items': [
+        {'contentDetails': {'videoId': _video_id(f'{playlist_id}:{i}')}} for i in range(start, end)
+    ]}
+    if end < PLAYLIST_LENGTH:
+        body['nextPageToken'] = str(end)
+    return await _respond('playlistItems', body)
+
+
+async def get_stats(request: Request):
+    return JSONResponse(stats)
+
+
+app = Starlette(routes=[
+    Route('/youtube/v3/search', search),
+    Route('/youtube/v3/videos', videos),
+    Route('/youtube/v3/playlistItems', playlist_items),
+    Route('/stats', get_stats),
+])
+
+
+def main():
+    global LATENCY_SECONDS
+    parser = argparse.ArgumentParser(description='Fake YouTube Data API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    args = parser.parse_args()
+    LATENCY_SECONDS = args.latency_ms / 1000
+    uvicorn.run(app, host=args.host, port=args.port, log_level='warning')
+
+
+if __name__ == '__main__':
+    main()
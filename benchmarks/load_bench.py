@@ -0,0 +1,411 @@
+"""Load and latency benchmark for backend/server.py.
+
+Starts the fake YouTube API and the backend (against a real mongod with
+--mongo-url, otherwise the in-process stand-in from standin_server.py),
+seeds a library, then drives each scenario at the given concurrency and
+reports throughput and p50/p95/p99 latency. Results are compared with a
+stored baseline; a regression beyond --tolerance exits non-zero.
+
+    python benchmarks/load_bench.py                          # stand-in, compare with baseline.json
+    python benchmarks/load_bench.py --mongo-url mongodb://localhost:27017
+    python benchmarks/load_bench.py --scenarios list_songs,stream_range --concurrency 64
+    python benchmarks/load_bench.py --save-baseline          # record new numbers
+"""
+import os
+import sys
+import json
+import math
+import time
+import wave
+import socket
+import random
+import asyncio
+import argparse
+import platform
+import subprocess
+from io import BytesIO
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(BENCH_DIR, '..', 'backend')
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+
+STREAM_RANGE_BYTES = 64 * 1024
+SEED_SONGS = 300
+SEED_UPLOADS = 4
+
+
+# ---- fixtures ----
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def make_wav(size: int, seed: str) -> bytes:
+    """A valid WAV of roughly `size` bytes; the seed makes its content unique"""
+    rng = random.Random(seed)
+    buffer = BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(2)
+        wav.setsampwidth(2)
+        wav.setframerate(44100)
+        wav.writeframes(rng.randbytes(max(size - 44, 4) // 4 * 4))
+    return buffer.getvalue()
+
+
+def start_process(args: List[str], env: Dict[str, str], log_path: str, cwd: Optional[str] = None) -> subprocess.Popen:
+    log = open(log_path, 'w')
+    return subprocess.Popen(args, env={**os.environ, **env}, cwd=cwd, stdout=log, stderr=subprocess.STDOUT)
+
+
+async def wait_ready(url: str, process: Optional[subprocess.Popen], timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process is not None and process.poll() is not None:
+                raise RuntimeError(f"{url} exited with code {process.returncode}")
+            try:
+                if (await client.get(url)).status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} not ready after {timeout:.0f}s")
+
+
+# ---- scenarios ----
+
+class Context:
+    """Shared state the scenarios draw on (seeded song/playlist IDs etc.)"""
+
+    def __init__(self, args):
+        self.args = args
+        self.run_id = f"{int(time.time())}{os.getpid()}"
+        self.song_ids: List[str] = []
+        self.titles: List[str] = []
+        self.upload_ids: List[str] = []
+        self.upload_sizes: Dict[str, int] = {}
+        self.playlist_id: Optional[str] = None
+
+
+async def _add_youtube(client: httpx.AsyncClient, video_id: str, n: int) -> httpx.Response:
+    return await client.post('/api/songs/add-youtube', json={
+        'videoId': video_id,
+        'title': f'Bench Track {n}',
+        'artist': f'Bench Artist {n % 50}',
+        'album': f'Bench Album {n % 20}',
+        'duration': 180 + n % 120,
+        'coverImage': f'https://i.ytimg.com/vi/{video_id}/hqdefault.jpg',
+    })
+
+
+async def _upload(client: httpx.AsyncClient, ctx: Context, n: int) -> httpx.Response:
+    data = make_wav(ctx.args.upload_kb * 1024, seed=f'{ctx.run_id}:{n}')
+    return await client.post(
+        '/api/upload/audio',
+        files={'file': (f'Bench Artist - Upload {n}.wav', data, 'audio/wav')},
+        data={'title': f'Upload {n}', 'artist': 'Bench Artist'},
+    )
+
+
+async def youtube_search(client, ctx: Context, i: int):
+    # A fixed pool of queries, so the run mixes cache misses and hits
+    query = f'bench query {i % ctx.args.query_pool}'
+    return [await client.post('/api/youtube/search', json={'query': query, 'maxResults': 10})]
+
+
+async def add_youtube(client, ctx: Context, i: int):
+    return [await _add_youtube(client, f'add{ctx.run_id}x{i}', i)]
+
+
+async def upload(client, ctx: Context, i: int):
+    return [await _upload(client, ctx, 1_000_000 + i)]
+
+
+async def stream_range(client, ctx: Context, i: int):
+    song_id = ctx.upload_ids[i % len(ctx.upload_ids)]
+    size = ctx.upload_sizes[song_id]
+    start = random.randrange(0, max(size - STREAM_RANGE_BYTES, 1))
+    return [await client.get(
+        f'/api/stream/audio/{song_id}',
+        params={'quality': 'original'},
+        headers={'Range': f'bytes={start}-{start + STREAM_RANGE_BYTES - 1}'}
+    )]
+
+
+async def list_songs(client, ctx: Context, i: int):
+    return [await client.get('/api/songs', params={'limit': 100})]
+
+
+async def library_search(client, ctx: Context, i: int):
+    title = ctx.titles[i % len(ctx.titles)]
+    # Type-ahead style: a prefix of a real title
+    return [await client.get('/api/songs/search', params={'q': title[:4 + i % 8]})]
+
+
+async def playlist_mutations(client, ctx: Context, i: int):
+    song_id = ctx.song_ids[i % len(ctx.song_ids)]
+    added = await client.post(f'/api/playlists/{ctx.playlist_id}/songs', json={'songId': song_id})
+    removed = await client.delete(f'/api/playlists/{ctx.playlist_id}/songs/{song_id}')
+    return [added, removed]
+
+
+Scenario = Callable[[httpx.AsyncClient, Context, int], Awaitable[List[httpx.Response]]]
+
+# Name -> (scenario, description); one operation may issue several requests
+SCENARIOS: Dict[str, tuple] = {
+    'youtube_search': (youtube_search, 'POST /api/youtube/search'),
+    'add_youtube': (add_youtube, 'POST /api/songs/add-youtube'),
+    'upload': (upload, 'POST /api/upload/audio'),
+    'stream_range': (stream_range, 'GET /api/stream/audio/{id} with Range'),
+    'list_songs': (list_songs, 'GET /api/songs?limit=100'),
+    'library_search': (library_search, 'GET /api/songs/search'),
+    'playlist_mutations': (playlist_mutations, 'POST + DELETE /api/playlists/{id}/songs'),
+}
+
+# Operations per scenario are scaled down for the heavy ones
+REQUEST_SCALE = {'upload': 0.1}
+
+
+async def seed(client: httpx.AsyncClient, ctx: Context):
+    semaphore = asyncio.Semaphore(32)
+
+    async def add(n: int):
+        async with semaphore:
+            response = await _add_youtube(client, f'seed{ctx.run_id}x{n}', n)
+            response.raise_for_status()
+            song = response.json()
+            ctx.song_ids.append(song['_id'])
+            ctx.titles.append(song['title'])
+
+    await asyncio.gather(*[add(n) for n in range(SEED_SONGS)])
+
+    for n in range(SEED_UPLOADS):
+        response = await _upload(client, ctx, n)
+        response.raise_for_status()
+        song = response.json()
+        ctx.upload_ids.append(song['_id'])
+        ctx.upload_sizes[song['_id']] = song['fileSize']
+
+    response = await client.post('/api/playlists', json={'name': f'Bench {ctx.run_id}'})
+    response.raise_for_status()
+    ctx.playlist_id = response.json()['_id']
+
+
+# ---- measurement ----
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(pct / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+async def run_scenario(client: httpx.AsyncClient, ctx: Context, scenario: Scenario,
+                       operations: int, concurrency: int, warmup: int) -> Dict:
+    for i in range(warmup):
+        await scenario(client, ctx, -1 - i)
+
+    latencies: List[float] = []
+    errors = 0
+    requests = 0
+    counter = iter(range(operations))
+
+    async def worker():
+        nonlocal errors, requests
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                responses = await scenario(client, ctx, i)
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+            requests += len(responses)
+            errors += sum(1 for response in responses if response.status_code >= 400)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'operations': operations,
+        'requests': requests,
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'throughput': round(operations / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'max_ms': round(latencies[-1] * 1000, 2) if latencies else 0.0,
+    }
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Regressions: throughput down or p95 up by more than `tolerance`, or new errors"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get('scenarios', {}).get(name)
+        if not base:
+            continue
+        if result['throughput'] < base['throughput'] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {result['throughput']}/s vs baseline {base['throughput']}/s")
+        if result['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {result['p95_ms']} ms vs baseline {base['p95_ms']} ms")
+        if result['errors'] and not base['errors']:
+            regressions.append(f"{name}: {result['errors']} errors (baseline had none)")
+    return regressions
+
+
+def print_report(results: Dict, baseline: Optional[Dict]):
+    base = (baseline or {}).get('scenarios', {})
+    print(f"\n{'scenario':<20}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}  vs baseline (ops/s, p95)")
+    for name, r in results.items():
+        delta = ''
+        if name in base and base[name]['throughput'] and base[name]['p95_ms']:
+            delta = (f"{(r['throughput'] / base[name]['throughput'] - 1) * 100:+.0f}%, "
+                     f"{(r['p95_ms'] / base[name]['p95_ms'] - 1) * 100:+.0f}%")
+        print(f"{name:<20}{r['throughput']:>10}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}{r['errors']:>8}  {delta}")
+
+
+# ---- orchestration ----
+
+async def benchmark(args) -> Dict:
+    processes = []
+    log_dir = args.log_dir
+    os.makedirs(log_dir, exist_ok=True)
+    db_name = f'creator360_bench_{os.getpid()}'
+    try:
+        base_url = args.server_url
+        if base_url is None:
+            youtube_port, api_port = free_port(), free_port()
+            youtube = start_process(
+                [sys.executable, os.path.join(BENCH_DIR, 'fake_youtube.py'),
+                 '--port', str(youtube_port), '--latency-ms', str(args.youtube_latency_ms)],
+                {}, os.path.join(log_dir, 'fake_youtube.log')
+            )
+            processes.append(youtube)
+            env = {
+                'YOUTUBE_API_BASE': f'http://127.0.0.1:{youtube_port}/youtube/v3',
+                'YOUTUBE_API_KEY': 'bench',
+            }
+            if not args.transcode:
+                # Background encoders would compete with the requests being timed
+                env['FFMPEG_PATH'] = os.path.join(BENCH_DIR, 'no-ffmpeg')
+            if args.mongo_url:
+                env.update({'MONGO_URL': args.mongo_url, 'DB_NAME': db_name})
+                command = [sys.executable, '-m', 'uvicorn', 'server:app', '--host', '127.0.0.1',
+                           '--port', str(api_port), '--log-level', 'warning']
+                cwd = BACKEND_DIR
+            else:
+                command = [sys.executable, os.path.join(BENCH_DIR, 'standin_server.py'), '--port', str(api_port)]
+                cwd = None
+            api = start_process(command, env, os.path.join(log_dir, 'server.log'), cwd=cwd)
+            processes.append(api)
+            await wait_ready(f'http://127.0.0.1:{youtube_port}/stats', youtube)
+            base_url = f'http://127.0.0.1:{api_port}'
+            await wait_ready(f'{base_url}/api/songs?limit=1', api)
+
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+            ctx = Context(args)
+            await seed(client, ctx)
+            results = {}
+            for name in args.scenarios:
+                scenario, description = SCENARIOS[name]
+                operations = max(int(args.requests * REQUEST_SCALE.get(name, 1)), 1)
+                print(f"{name}: {operations} x {description} at concurrency {args.concurrency}", flush=True)
+                results[name] = await run_scenario(
+                    client, ctx, scenario, operations, args.concurrency, args.warmup
+                )
+        return results
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if args.mongo_url and args.server_url is None:
+            from pymongo import MongoClient
+            MongoClient(args.mongo_url).drop_database(db_name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Creator360 backend load benchmark')
+    parser.add_argument('--mongo-url', help='benchmark against this mongod (default: in-process stand-in)')
+    parser.add_argument('--server-url', help='benchmark an already running server instead of starting one')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help=f"comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=1000, help='operations per scenario')
+    parser.add_argument('--warmup', type=int, default=20, help='untimed operations per scenario')
+    parser.add_argument('--upload-kb', type=int, default=1024, help='size of each uploaded file')
+    parser.add_argument('--query-pool', type=int, default=100, help='distinct YouTube search queries')
+    parser.add_argument('--youtube-latency-ms', type=float, default=50.0, help='fake API response delay')
+    parser.add_argument('--transcode', action='store_true', help='let uploads start background transcoding')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative regression')
+    parser.add_argument('--save-baseline', action='store_true', help='write these results to --baseline')
+    parser.add_argument('--output', help='also write results as JSON here')
+    parser.add_argument('--log-dir', default=os.path.join(BENCH_DIR, 'logs'))
+    args = parser.parse_args()
+
+    args.scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    results = asyncio.run(benchmark(args))
+    report = {
+        'config': {
+            'backend': 'mongod' if args.mongo_url else 'standin',
+            'concurrency': args.concurrency,
+            'requests': args.requests,
+            'uploadKb': args.upload_kb,
+            'youtubeLatencyMs': args.youtube_latency_ms,
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+        },
+        'scenarios': results,
+    }
+
+    baseline = None
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('config', {}).get('concurrency') != args.concurrency:
+            print(f"warning: baseline was recorded at concurrency {baseline['config'].get('concurrency')}")
+
+    print_report(results, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+        print(f"\nBaseline written to {args.baseline}")
+        return
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\nRegressions beyond {args.tolerance:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.tolerance:.0%} of baseline")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""CPU cost of serializing a page of songs: per-item models + FastAPI
+response_model (the old path) vs. one TypeAdapter pass to JSON bytes.
+
+    python benchmarks/serialization_bench.py [--songs 10000] [--repeat 5]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import asyncio
+from datetime import datetime, timedelta
+from typing import List
+
+from bson import ObjectId
+from fastapi.routing import serialize_response
+from fastapi.responses import JSONResponse
+from fastapi.utils import create_response_field
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from models import Song, SongListAdapter  # noqa: E402
+
+
+def make_docs(count: int) -> List[dict]:
+    """Documents shaped like fetch_page output (string _id, extra fields)"""
+    start = datetime(2024, 1, 1)
+    docs = []
+    for i in range(count):
+        upload = i % 3 == 0
+        docs.append({
+            '_id': str(ObjectId()),
+            'title': f'Song title number {i}',
+            'artist': f'Artist {i % 500}',
+            'album': f'Album {i % 1200}',
+            'duration': 120 + i % 240,
+            'coverImage': 'https://images.unsplash.com/photo-1511379938547-c1f69419868d?w=300&h=300&fit=crop',
+            'source': 'upload' if upload else 'youtube',
+            'videoId': None if upload else f'vid{i:08d}',
+            'audioFileId': str(ObjectId()) if upload else None,
+            'fileName': f'track{i}.mp3' if upload else None,
+            'fileSize': 4_000_000 + i if upload else None,
+            'metadataStatus': 'complete' if upload else None,
+            'metadataSource': 'filename' if upload else None,
+            'createdAt': start + timedelta(seconds=i),
+        })
+    return docs
+
+
+def old_path(docs: List[dict], field) -> bytes:
+    content = [Song(**doc) for doc in docs]
+    serialized = asyncio.run(serialize_response(field=field, response_content=content))
+    return JSONResponse(serialized).body
+
+
+def new_path(docs: List[dict]) -> bytes:
+    return SongListAdapter.dump_json(SongListAdapter.validate_python(docs), by_alias=True)
+
+
+def best_of(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.process_time()
+        fn()
+        timings.append(time.process_time() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--songs', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    docs = make_docs(args.songs)
+    field = create_response_field(name='Response_get_songs', type_=List[Song], mode='serialization')
+
+    old_body, new_body = old_path(docs, field), new_path(docs)
+    if json.loads(old_body) != json.loads(new_body):
+        sys.exit('Outputs differ')
+
+    old = best_of(lambda: old_path(docs, field), args.repeat)
+    new = best_of(lambda: new_path(docs), args.repeat)
+    print(f'{args.songs} songs, {len(new_body) / 1024:.0f} KB of JSON (best of {args.repeat}, CPU time)')
+    print(f'  model per doc + response_model: {old * 1000:8.1f} ms')
+    print(f'  TypeAdapter + dump_json:        {new * 1000:8.1f} ms')
+    print(f'  speedup: {old / new:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
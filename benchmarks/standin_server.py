@@ -0,0 +1,49 @@
+"""Run backend/server.py against an in-process MongoDB stand-in
+(mongomock-motor), for benchmarking where no mongod is available.
+
+GridFS isn't emulated, so audio goes to the local blob store.
+
+    pip install mongomock-motor
+    python benchmarks/standin_server.py --port 8001
+"""
+import os
+import sys
+import argparse
+import tempfile
+
+import motor.motor_asyncio
+import uvicorn
+from mongomock_motor import AsyncMongoMockClient
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='server.py on a MongoDB stand-in')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    args = parser.parse_args()
+
+    os.environ.setdefault('MONGO_URL', 'mongodb://standin')
+    os.environ.setdefault('DB_NAME', 'creator360_bench')
+    os.environ['AUDIO_STORAGE'] = 'local'
+    os.environ.setdefault('AUDIO_STORAGE_DIR', tempfile.mkdtemp(prefix='creator360-bench-audio-'))
+
+    # server.py builds its client at import time
+    motor.motor_asyncio.AsyncIOMotorClient = AsyncMongoMockClient
+    sys.path.insert(0, BACKEND_DIR)
+    os.chdir(BACKEND_DIR)
+    import indexes
+    # mongomock ignores partialFilterExpression, so partial unique indexes
+    # would reject every upload (no videoId); skip them on the stand-in
+    for collection, models in indexes.INDEXES.items():
+        indexes.INDEXES[collection] = [
+            model for model in models if 'partialFilterExpression' not in model.document
+        ]
+    import server
+
+    uvicorn.run(server.app, host=args.host, port=args.port, log_level='warning')
+
+
+if __name__ == '__main__':
+    main()
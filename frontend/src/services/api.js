@@ -2,6 +2,20 @@ import axios from 'axios';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
+const PAGE_SIZE = 500;
+
+// List endpoints are cursor-paginated; follow X-Next-Cursor to the end
+const getAllPages = async (url) => {
+  const items = [];
+  let cursor = null;
+  do {
+    const params = cursor ? { limit: PAGE_SIZE, cursor } : { limit: PAGE_SIZE };
+    const response = await axios.get(url, { params });
+    items.push(...response.data);
+    cursor = response.headers['x-next-cursor'];
+  } while (cursor);
+  return items;
+};
 
 // YouTube API
 export const searchYouTube = async (query, maxResults = 10) => {
@@ -14,6 +28,12 @@ export const addYouTubeSong = async (songData) => {
   return response.data;
 };
 
+// Bulk import: { videoIds: [...], playlistId: 'PL...' }
+export const importYouTubeSongs = async (importData) => {
+  const response = await axios.post(`${API}/songs/import-youtube`, importData);
+  return response.data;
+};
+
 // File Upload API
 export const uploadAudioFile = async (formData, onProgress) => {
   const response = await axios.post(`${API}/upload/audio`, formData, {
@@ -30,7 +50,11 @@ export const uploadAudioFile = async (formData, onProgress) => {
 
 // Song API
 export const getSongs = async () => {
-  const response = await axios.get(`${API}/songs`);
+  return getAllPages(`${API}/songs`);
+};
+
+export const searchLibrary = async (query, limit = 20) => {
+  const response = await axios.get(`${API}/songs/search`, { params: { q: query, limit } });
   return response.data;
 };
 
@@ -50,8 +74,7 @@ export const getAudioStreamUrl = (songId) => {
 
 // Playlist API
 export const getPlaylists = async () => {
-  const response = await axios.get(`${API}/playlists`);
-  return response.data;
+  return getAllPages(`${API}/playlists`);
 };
 
 export const getPlaylist = async (id) => {
@@ -59,6 +82,12 @@ export const getPlaylist = async (id) => {
   return response.data;
 };
 
+// Playlist with full song objects in order, one round trip per page
+export const getPlaylistWithSongs = async (id, offset = 0, limit = PAGE_SIZE) => {
+  const response = await axios.get(`${API}/playlists/${id}/songs`, { params: { offset, limit } });
+  return response.data;
+};
+
 export const createPlaylist = async (playlistData) => {
   const response = await axios.post(`${API}/playlists`, playlistData);
   return response.data;
@@ -0,0 +1,156 @@
+import io
+import os
+import time
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+import blob_gc
+from blob_gc import BlobCollector, song_blob_ids
+from blob_store import LocalBlobStore
+from file_service import FileService
+
+HOUR = 3600
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = LocalBlobStore(str(tmp_path / 'blobs'))
+    store.connect()
+    yield store
+    store.close()
+
+
+def upload(store, data: bytes) -> str:
+    return asyncio.run(FileService(store).store_file(io.BytesIO(data), 'song.mp3', 'audio/mpeg'))['fileId']
+
+
+def age(path: str, seconds: float):
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def limit(self, count):
+        return FakeCursor(self.docs[:count])
+
+    async def to_list(self, length):
+        return list(self.docs[:length])
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for doc in self.docs:
+            yield doc
+
+
+class FakeResult:
+    def __init__(self, deleted_count):
+        self.deleted_count = deleted_count
+
+
+class FakeCollection:
+    def __init__(self, docs=()):
+        self.docs = [dict(doc) for doc in docs]
+        self._next_id = len(self.docs)
+
+    def find(self, query, projection=None):
+        return FakeCursor([doc for doc in self.docs
+                           if all(doc.get(field) == value for field, value in query.items())])
+
+    async def insert_many(self, docs, ordered=True):
+        for doc in docs:
+            self._next_id += 1
+            self.docs.append({'_id': self._next_id, **doc})
+
+    async def delete_one(self, query):
+        for doc in self.docs:
+            if doc['_id'] == query['_id']:
+                self.docs.remove(doc)
+                return FakeResult(1)
+        return FakeResult(0)
+
+
+class FakeDB:
+    def __init__(self, songs=()):
+        self.songs = FakeCollection(songs)
+        self.blob_releases = FakeCollection()
+
+
+def test_song_blob_ids():
+    song = {'source': 'upload', 'audioFileId': 'a', 'renditions': {'opus': {'fileId': 'b'}}}
+    assert song_blob_ids(song) == ['a', 'b']
+    assert song_blob_ids({'source': 'youtube', 'videoId': 'x'}) == []
+
+
+def test_sweep_keeps_files_inside_the_grace_period(store):
+    orphan = upload(store, b'orphan')
+    # Unreferenced but new: its song may not be saved yet
+    removed = asyncio.run(BlobCollector(FakeDB(), store).sweep_orphans())
+    assert removed == {'files': 0, 'tmp': 0}
+    assert os.path.exists(store.path_for(orphan))
+
+
+def test_sweep_removes_old_orphans_only(store):
+    orphan = upload(store, b'orphan')
+    kept = upload(store, b'kept')
+    queued = upload(store, b'queued')
+    for blob_id in (orphan, kept, queued):
+        age(store.path_for(blob_id), 2 * HOUR)
+    stale_tmp = os.path.join(store.tmp_dir, 'abandoned.part')
+    fresh_tmp = os.path.join(store.tmp_dir, 'uploading.part')
+    for path in (stale_tmp, fresh_tmp):
+        with open(path, 'wb') as f:
+            f.write(b'partial')
+    age(stale_tmp, 2 * HOUR)
+
+    db = FakeDB(songs=[{'_id': 1, 'source': 'upload', 'audioFileId': kept}])
+    asyncio.run(db.blob_releases.insert_many([{'blobId': queued, 'queuedAt': datetime.utcnow()}]))
+    removed = asyncio.run(BlobCollector(db, store).sweep_orphans())
+
+    assert removed == {'files': 1, 'tmp': 1}
+    assert not os.path.exists(store.path_for(orphan))
+    assert os.path.exists(store.path_for(kept))
+    assert os.path.exists(store.path_for(queued))
+    assert not os.path.exists(stale_tmp)
+    assert os.path.exists(fresh_tmp)
+
+
+def test_acquire_restarts_the_grace_period(store):
+    blob_id = upload(store, b'reused')
+    age(store.path_for(blob_id), 2 * HOUR)
+    # A new upload of the same content, whose song isn't saved yet
+    assert asyncio.run(store.acquire(blob_id)) == blob_id
+    removed = asyncio.run(BlobCollector(FakeDB(), store).sweep_orphans())
+    assert removed['files'] == 0
+    assert os.path.exists(store.path_for(blob_id))
+
+
+def test_grace_period_is_configurable(store, monkeypatch):
+    monkeypatch.setattr(blob_gc, 'BLOB_GC_GRACE', timedelta(seconds=60))
+    blob_id = upload(store, b'orphan')
+    age(store.path_for(blob_id), 120)
+    assert asyncio.run(BlobCollector(FakeDB(), store).sweep_orphans())['files'] == 1
+
+
+def test_release_queued_drops_one_reference_per_entry(store):
+    shared = upload(store, b'shared')
+    upload(store, b'shared')
+    single = upload(store, b'single')
+    db = FakeDB()
+    collector = BlobCollector(db, store)
+
+    async def run():
+        await collector.release_later([shared, single, 'f' * 64])
+        return await collector.release_queued()
+
+    # The unknown blob counts as released (there is nothing left to free)
+    assert asyncio.run(run()) == 3
+    assert db.blob_releases.docs == []
+    assert os.path.exists(store.path_for(shared))
+    assert not os.path.exists(store.path_for(single))
@@ -0,0 +1,105 @@
+import io
+import os
+import asyncio
+import hashlib
+
+import pytest
+
+from blob_store import BlobNotFound, LocalBlobStore
+from file_service import FileService
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = LocalBlobStore(str(tmp_path / 'blobs'))
+    store.connect()
+    yield store
+    store.close()
+
+
+def refs(store, blob_id):
+    row = asyncio.run(store.refs.fetchone("SELECT refs FROM blob_refs WHERE blob_id = ?", (blob_id,)))
+    return row['refs'] if row else None
+
+
+def upload(store, data: bytes, filename='song.mp3'):
+    return asyncio.run(FileService(store).store_file(io.BytesIO(data), filename, 'audio/mpeg'))
+
+
+def test_same_content_is_stored_once(store):
+    first = upload(store, b'audio-bytes')
+    second = upload(store, b'audio-bytes', 'copy.mp3')
+    assert first['fileId'] == second['fileId'] == hashlib.sha256(b'audio-bytes').hexdigest()
+    assert (first['deduplicated'], second['deduplicated']) == (False, True)
+    assert refs(store, first['fileId']) == 2
+    assert asyncio.run(store.read(first['fileId'])) == b'audio-bytes'
+
+
+def test_different_content_is_stored_separately(store):
+    first = upload(store, b'one')
+    second = upload(store, b'two')
+    assert first['fileId'] != second['fileId']
+    assert refs(store, first['fileId']) == refs(store, second['fileId']) == 1
+
+
+def test_concurrent_uploads_of_the_same_content(store):
+    service = FileService(store)
+
+    async def run():
+        return await asyncio.gather(*(
+            service.store_file(io.BytesIO(b'same'), f'{i}.mp3', 'audio/mpeg') for i in range(5)
+        ))
+
+    results = asyncio.run(run())
+    blob_id = results[0]['fileId']
+    assert {result['fileId'] for result in results} == {blob_id}
+    assert refs(store, blob_id) == 5
+    assert os.listdir(store.tmp_dir) == []
+
+
+def test_release_deletes_with_the_last_reference(store):
+    blob_id = upload(store, b'shared')['fileId']
+    upload(store, b'shared')
+    path = store.path_for(blob_id)
+
+    asyncio.run(store.release(blob_id))
+    assert refs(store, blob_id) == 1
+    assert os.path.exists(path)
+
+    asyncio.run(store.release(blob_id))
+    assert refs(store, blob_id) is None
+    assert not os.path.exists(path)
+    with pytest.raises(BlobNotFound):
+        asyncio.run(store.open(blob_id))
+
+
+def test_released_content_is_not_acquired_again(store):
+    blob_id = upload(store, b'gone')['fileId']
+    asyncio.run(store.release(blob_id))
+    assert asyncio.run(store.acquire(blob_id)) is None
+    # A new upload stores it afresh
+    again = upload(store, b'gone')
+    assert again['deduplicated'] is False
+    assert refs(store, blob_id) == 1
+
+
+def test_release_of_unknown_blob(store):
+    with pytest.raises(BlobNotFound):
+        asyncio.run(store.release('0' * 64))
+
+
+def test_failed_upload_leaves_nothing_behind(store):
+    class Broken(io.BytesIO):
+        reads = 0
+
+        def read(self, size=-1):
+            self.reads += 1
+            # The hashing pass reads it all; the copy fails part-way
+            if self.reads > 3:
+                raise OSError('disk gone')
+            return super().read(size)
+
+    with pytest.raises(OSError):
+        asyncio.run(FileService(store).store_file(Broken(b'x' * 10), 'song.mp3', 'audio/mpeg'))
+    assert os.listdir(store.tmp_dir) == []
+    assert refs(store, hashlib.sha256(b'x' * 10).hexdigest()) is None
@@ -0,0 +1,182 @@
+import asyncio
+
+import pytest
+
+import cache
+from cache import SingleFlight, TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache, 'time', clock)
+    return clock
+
+
+def test_get_and_miss(clock):
+    entries = TTLCache(maxsize=4, ttl=10)
+    entries.set('a', 1)
+    assert entries.get('a') == 1
+    assert entries.get('b') is None
+    assert entries.get('b', 'default') == 'default'
+    assert (entries.hits, entries.misses) == (1, 2)
+
+
+def test_entries_expire_after_ttl(clock):
+    entries = TTLCache(maxsize=4, ttl=10)
+    entries.set('a', 1)
+    clock.now += 9.9
+    assert entries.get('a') == 1
+    clock.now += 0.1
+    assert entries.get('a') is None
+    # Expired entries are dropped on lookup
+    assert len(entries) == 0
+
+
+def test_per_entry_ttl(clock):
+    entries = TTLCache(maxsize=4, ttl=10)
+    entries.set('short', 1, ttl=1)
+    entries.set('long', 2)
+    clock.now += 5
+    assert entries.get('short') is None
+    assert entries.get('long') == 2
+
+
+def test_set_refreshes_expiry(clock):
+    entries = TTLCache(maxsize=4, ttl=10)
+    entries.set('a', 1)
+    clock.now += 8
+    entries.set('a', 2)
+    clock.now += 8
+    assert entries.get('a') == 2
+
+
+def test_evicts_least_recently_used(clock):
+    entries = TTLCache(maxsize=2, ttl=10)
+    entries.set('a', 1)
+    entries.set('b', 2)
+    # Reading 'a' makes 'b' the oldest
+    assert entries.get('a') == 1
+    entries.set('c', 3)
+    assert entries.get('b') is None
+    assert entries.get('a') == 1
+    assert entries.get('c') == 3
+    assert entries.evictions == 1
+    assert len(entries) == 2
+
+
+def test_get_many_skips_missing_and_expired(clock):
+    entries = TTLCache(maxsize=4, ttl=10)
+    entries.set('a', 1)
+    entries.set('b', 2, ttl=1)
+    clock.now += 2
+    assert entries.get_many(['a', 'b', 'c']) == {'a': 1}
+
+
+def test_falsy_values_are_cached(clock):
+    entries = TTLCache(maxsize=4, ttl=10)
+    entries.set('empty', [])
+    assert entries.get('empty', 'missing') == []
+
+
+def test_pop_and_stats(clock):
+    entries = TTLCache(maxsize=4, ttl=10, name='test')
+    entries.set('a', 1)
+    assert entries.pop('a') == 1
+    assert entries.pop('a', 'gone') == 'gone'
+    entries.get('a')
+    stats = entries.stats()
+    assert stats['name'] == 'test'
+    assert (stats['size'], stats['misses'], stats['hitRate']) == (0, 1, 0.0)
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    flight = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return 'result'
+
+    async def run():
+        return await asyncio.gather(*(flight.do('key', fetch) for _ in range(5)))
+
+    assert asyncio.run(run()) == ['result'] * 5
+    assert len(calls) == 1
+    assert flight.stats() == {'inFlight': 0, 'leaders': 1, 'followers': 4}
+
+
+def test_single_flight_keys_are_independent():
+    flight = SingleFlight()
+
+    async def run():
+        return await asyncio.gather(
+            flight.do('a', lambda: asyncio.sleep(0.01, 'a')),
+            flight.do('b', lambda: asyncio.sleep(0.01, 'b')),
+        )
+
+    assert asyncio.run(run()) == ['a', 'b']
+    assert flight.leaders == 2
+
+
+def test_single_flight_error_reaches_every_waiter():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError('upstream down')
+
+    async def run():
+        return await asyncio.gather(*(flight.do('key', fail) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert len(results) == 3
+    assert all(isinstance(result, ValueError) and str(result) == 'upstream down' for result in results)
+
+
+def test_single_flight_failure_is_not_cached():
+    flight = SingleFlight()
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        await asyncio.sleep(0)
+        if len(attempts) == 1:
+            raise ValueError('first call fails')
+        return 'ok'
+
+    async def run():
+        with pytest.raises(ValueError):
+            await flight.do('key', flaky)
+        return await flight.do('key', flaky)
+
+    assert asyncio.run(run()) == 'ok'
+    assert len(attempts) == 2
+
+
+def test_single_flight_survives_a_cancelled_caller():
+    flight = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.02)
+        return 'result'
+
+    async def run():
+        leader = asyncio.create_task(flight.do('key', fetch))
+        follower = asyncio.create_task(flight.do('key', fetch))
+        await asyncio.sleep(0.005)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(run()) == 'result'
@@ -0,0 +1,143 @@
+import asyncio
+
+import pytest
+
+from credits_ledger import CreditsLedger, InsufficientCredits, UnknownUser
+from sqlite_db import SQLiteDatabase
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = SQLiteDatabase(str(tmp_path / 'shared.db'), pool_size=4)
+    db.open()
+
+    def setup(conn):
+        conn.execute("CREATE TABLE users (line_user_id TEXT PRIMARY KEY, credits INTEGER)")
+        conn.execute("INSERT INTO users VALUES ('alice', 100), ('bob', NULL)")
+        CreditsLedger.migrate(conn)
+
+    asyncio.run(db.write(setup))
+    yield db
+    db.close()
+
+
+def test_balance_and_history(db):
+    ledger = CreditsLedger(db)
+
+    async def run():
+        assert await ledger.get_balance('alice') == 100
+        assert await ledger.add('alice', 50, 'top-up') == 150
+        assert await ledger.add('alice', -30, 'video') == 120
+        assert await ledger.get_balance('alice') == 120
+        return await ledger.history('alice')
+
+    history = asyncio.run(run())
+    assert [(row['amount'], row['balance_after'], row['reason']) for row in history] == [
+        (-30, 120, 'video'), (50, 150, 'top-up'),
+    ]
+
+
+def test_null_and_unknown_balances(db):
+    ledger = CreditsLedger(db)
+    assert asyncio.run(ledger.get_balance('bob')) == 0
+    assert asyncio.run(ledger.get_balance('nobody')) == 0
+    with pytest.raises(UnknownUser):
+        asyncio.run(ledger.add('nobody', 10))
+
+
+def test_debit_cannot_go_negative(db):
+    ledger = CreditsLedger(db)
+    with pytest.raises(InsufficientCredits):
+        asyncio.run(ledger.add('alice', -101))
+    assert asyncio.run(ledger.get_balance('alice')) == 100
+    assert asyncio.run(ledger.history('alice')) == []
+
+
+def test_concurrent_adds_all_apply(db):
+    ledger = CreditsLedger(db)
+
+    async def run():
+        await asyncio.gather(*(ledger.add('alice', 1) for _ in range(50)),
+                             *(ledger.get_balance('alice') for _ in range(50)))
+        return await ledger.get_balance('alice')
+
+    assert asyncio.run(run()) == 150
+    assert len(asyncio.run(ledger.history('alice', limit=100))) == 50
+
+
+def test_read_racing_a_write_does_not_cache_the_old_balance(db):
+    ledger = CreditsLedger(db)
+    fetchone = db.fetchone
+
+    async def run():
+        started, release = asyncio.Event(), asyncio.Event()
+
+        async def slow_fetchone(sql, params=()):
+            row = await fetchone(sql, params)
+            # The read has its (old) result; hold it until the write is done
+            started.set()
+            await release.wait()
+            return row
+
+        db.fetchone = slow_fetchone
+        reader = asyncio.create_task(ledger.get_balance('alice'))
+        await started.wait()
+        db.fetchone = fetchone
+        assert await ledger.add('alice', 25) == 125
+        release.set()
+        # The racing read returns what it read...
+        assert await reader == 100
+        # ...but does not fill the cache with it
+        return await ledger.get_balance('alice')
+
+    assert asyncio.run(run()) == 125
+    assert ledger._loads == {}
+
+
+def test_reads_after_a_write_do_not_join_an_older_load(db):
+    ledger = CreditsLedger(db)
+    fetchone = db.fetchone
+
+    async def run():
+        started, release = asyncio.Event(), asyncio.Event()
+
+        async def slow_fetchone(sql, params=()):
+            row = await fetchone(sql, params)
+            started.set()
+            await release.wait()
+            return row
+
+        db.fetchone = slow_fetchone
+        old_read = asyncio.create_task(ledger.get_balance('alice'))
+        await started.wait()
+        db.fetchone = fetchone
+        await ledger.add('alice', 25)
+        new_balance = await ledger.get_balance('alice')
+        release.set()
+        await old_read
+        return new_balance
+
+    assert asyncio.run(run()) == 125
+
+
+def test_cached_balance_is_served_without_a_query(db):
+    ledger = CreditsLedger(db)
+    assert asyncio.run(ledger.get_balance('alice')) == 100
+    # Changed behind the ledger's back (e.g. by the LINE bot): served from cache until the TTL
+    asyncio.run(db.execute("UPDATE users SET credits = 5 WHERE line_user_id = 'alice'"))
+    assert asyncio.run(ledger.get_balance('alice')) == 100
+    ledger._balances.clear()
+    assert asyncio.run(ledger.get_balance('alice')) == 5
+
+
+def test_generation_state_is_not_kept_per_user(db):
+    ledger = CreditsLedger(db)
+
+    async def run():
+        for i in range(20):
+            await ledger.get_balance(f'user-{i}')
+            await ledger.add('alice', 1)
+            await ledger.get_balance('alice')
+
+    asyncio.run(run())
+    assert ledger._loads == {}
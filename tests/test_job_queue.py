@@ -0,0 +1,211 @@
+import time
+import asyncio
+
+import pytest
+
+import job_queue
+from job_queue import JobQueue
+from sqlite_db import SQLiteDatabase
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = SQLiteDatabase(str(tmp_path / 'jobs.db'), pool_size=2)
+    db.open()
+    asyncio.run(db.write(JobQueue.migrate))
+    yield db
+    db.close()
+
+
+def test_waiters_are_removed_after_timeout(db):
+    jobs = JobQueue(db)
+
+    async def run():
+        job_id = await jobs.enqueue('user', 'Product', 'https://example.com')
+        job = await jobs.wait_for_change(job_id, 'queued', timeout=0.05)
+        return job
+
+    assert asyncio.run(run())['status'] == 'queued'
+    assert jobs._waiters == {}
+
+
+def test_waiters_are_removed_when_another_process_finishes_the_job(db):
+    jobs = JobQueue(db)
+    # Another process: same table, its own queue object
+    other = JobQueue(db)
+
+    async def run():
+        job_id = await jobs.enqueue('user', 'Product', 'https://example.com')
+        waiter = asyncio.create_task(jobs.wait_for_change(job_id, 'queued', timeout=5))
+        await asyncio.sleep(0.05)
+        job = await other.claim('other-worker')
+        await other.complete(job['id'], 'other-worker', 'script', 'https://example.com/video.mp4')
+        return await waiter
+
+    started = time.monotonic()
+    job = asyncio.run(run())
+    assert job['status'] in ('processing', 'completed')
+    assert time.monotonic() - started < job_queue.JOB_POLL_SECONDS * 3
+    assert jobs._waiters == {}
+
+
+def test_claim_notifies_waiters_of_jobs_it_fails(db, monkeypatch):
+    jobs = JobQueue(db)
+
+    async def run():
+        job_id = await jobs.enqueue('user', 'Product', 'https://example.com')
+        await db.execute("""
+            UPDATE projects_v2 SET status = 'processing', attempts = max_attempts,
+                lease_owner = 'dead-worker', lease_expires_at = ?
+            WHERE id = ?
+        """, (time.time() - 1, job_id))
+        waiter = asyncio.create_task(jobs.wait_for_change(job_id, 'processing', timeout=30))
+        await asyncio.sleep(0.05)
+        assert await jobs.claim('worker') is None
+        # Woken by the claim, not by the next poll tick
+        return await asyncio.wait_for(waiter, 0.5)
+
+    # Poll far less often than the test waits
+    monkeypatch.setattr(job_queue, 'JOB_POLL_SECONDS', 30)
+    job = asyncio.run(run())
+    assert job['status'] == 'failed'
+    assert job['error'] == 'Worker lease expired too many times'
+    assert jobs._waiters == {}
+
+
+def expire_lease(db, job_id):
+    asyncio.run(db.execute("UPDATE projects_v2 SET lease_expires_at = ? WHERE id = ?", (time.time() - 1, job_id)))
+
+
+def make_runnable(db, job_id):
+    asyncio.run(db.execute("UPDATE projects_v2 SET next_run_at = 0 WHERE id = ?", (job_id,)))
+
+
+def test_claim_takes_oldest_job_with_a_lease(db):
+    jobs = JobQueue(db)
+    first = asyncio.run(jobs.enqueue('user', 'First', 'https://example.com/1'))
+    asyncio.run(jobs.enqueue('user', 'Second', 'https://example.com/2'))
+
+    job = asyncio.run(jobs.claim('worker-a'))
+    assert job['id'] == first
+    assert job['status'] == 'processing'
+    assert job['attempts'] == 1
+    assert job['lease_owner'] == 'worker-a'
+    assert job['lease_expires_at'] > time.time()
+
+
+def test_leased_job_is_not_claimed_twice(db):
+    jobs = JobQueue(db)
+    asyncio.run(jobs.enqueue('user', 'Product', 'https://example.com'))
+    assert asyncio.run(jobs.claim('worker-a')) is not None
+    assert asyncio.run(jobs.claim('worker-b')) is None
+
+
+def test_expired_lease_is_reclaimed(db):
+    jobs = JobQueue(db)
+    job_id = asyncio.run(jobs.enqueue('user', 'Product', 'https://example.com'))
+    asyncio.run(jobs.claim('worker-a'))
+    expire_lease(db, job_id)
+
+    job = asyncio.run(jobs.claim('worker-b'))
+    assert job['id'] == job_id
+    assert job['lease_owner'] == 'worker-b'
+    assert job['attempts'] == 2
+    # The old owner has lost it
+    assert asyncio.run(jobs.heartbeat(job_id, 'worker-a')) is False
+    assert asyncio.run(jobs.heartbeat(job_id, 'worker-b')) is True
+
+
+def test_stale_owner_cannot_complete(db):
+    jobs = JobQueue(db)
+    job_id = asyncio.run(jobs.enqueue('user', 'Product', 'https://example.com'))
+    asyncio.run(jobs.claim('worker-a'))
+    expire_lease(db, job_id)
+    asyncio.run(jobs.claim('worker-b'))
+
+    asyncio.run(jobs.complete(job_id, 'worker-a', 'script', 'https://example.com/a.mp4'))
+    assert asyncio.run(jobs.get(job_id))['status'] == 'processing'
+    asyncio.run(jobs.complete(job_id, 'worker-b', 'script', 'https://example.com/b.mp4'))
+    job = asyncio.run(jobs.get(job_id))
+    assert job['status'] == 'completed'
+    assert job['video_url'] == 'https://example.com/b.mp4'
+    assert job['lease_owner'] is None
+
+
+def test_failure_retries_with_exponential_backoff(db, monkeypatch):
+    monkeypatch.setattr(job_queue, 'JOB_RETRY_BASE_SECONDS', 10)
+    jobs = JobQueue(db)
+    job_id = asyncio.run(jobs.enqueue('user', 'Product', 'https://example.com'))
+
+    for attempt, delay in [(1, 10), (2, 20)]:
+        job = asyncio.run(jobs.claim('worker'))
+        assert job['attempts'] == attempt
+        before = time.time()
+        asyncio.run(jobs.fail(job_id, 'worker', f'boom {attempt}'))
+        job = asyncio.run(jobs.get(job_id))
+        assert job['status'] == 'queued'
+        assert job['error'] == f'boom {attempt}'
+        assert before + delay <= job['next_run_at'] <= time.time() + delay
+        # Not runnable until the backoff has passed
+        assert asyncio.run(jobs.claim('worker')) is None
+        make_runnable(db, job_id)
+
+
+def test_failure_after_max_attempts_is_final(db):
+    jobs = JobQueue(db)
+    job_id = asyncio.run(jobs.enqueue('user', 'Product', 'https://example.com'))
+
+    for attempt in range(1, job_queue.JOB_MAX_ATTEMPTS + 1):
+        job = asyncio.run(jobs.claim('worker'))
+        assert job['attempts'] == attempt
+        asyncio.run(jobs.fail(job_id, 'worker', 'boom'))
+        make_runnable(db, job_id)
+
+    job = asyncio.run(jobs.get(job_id))
+    assert job['status'] == 'failed'
+    assert job['error'] == 'boom'
+    assert asyncio.run(jobs.claim('worker')) is None
+
+
+def test_lease_expiring_on_the_last_attempt_fails_the_job(db):
+    jobs = JobQueue(db)
+    job_id = asyncio.run(jobs.enqueue('user', 'Product', 'https://example.com'))
+
+    for _ in range(job_queue.JOB_MAX_ATTEMPTS):
+        assert asyncio.run(jobs.claim('worker'))['id'] == job_id
+        expire_lease(db, job_id)
+
+    assert asyncio.run(jobs.claim('worker')) is None
+    job = asyncio.run(jobs.get(job_id))
+    assert job['status'] == 'failed'
+    assert job['error'] == 'Worker lease expired too many times'
+
+
+def test_worker_pool_runs_and_retries_jobs(db, monkeypatch):
+    monkeypatch.setattr(job_queue, 'JOB_POLL_SECONDS', 0.01)
+    monkeypatch.setattr(job_queue, 'JOB_RETRY_BASE_SECONDS', 0)
+    jobs = JobQueue(db)
+    calls = []
+
+    def handler(job):
+        calls.append(job['attempts'])
+        if job['attempts'] == 1:
+            raise RuntimeError('flaky')
+        return {'script': 'script', 'video_url': f"https://example.com/{job['id']}.mp4"}
+
+    async def run():
+        pool = job_queue.WorkerPool(jobs, handler, concurrency=1)
+        job_id = await jobs.enqueue('user', 'Product', 'https://example.com')
+        await pool.start()
+        try:
+            for _ in range(200):
+                job = await jobs.get(job_id)
+                if job['status'] == 'completed':
+                    return job
+                await asyncio.sleep(0.01)
+        finally:
+            await pool.stop()
+
+    job = asyncio.run(run())
+    assert job['status'] == 'completed'
+    assert calls == [1, 2]
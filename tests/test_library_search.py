@@ -0,0 +1,146 @@
+import asyncio
+
+import pytest
+
+from library_search import LibrarySearchIndex, tokenize
+
+SONGS = {
+    '1': {'title': 'Yesterday', 'artist': 'The Beatles', 'album': 'Help!'},
+    '2': {'title': 'Help', 'artist': 'The Beatles', 'album': 'Help!'},
+    '3': {'title': 'Beautiful Day', 'artist': 'U2', 'album': 'All That You Can\'t Leave Behind'},
+    '4': {'title': 'Hey Jude', 'artist': 'The Beatles', 'album': 'Past Masters'},
+    '5': {'title': 'Café del Mar', 'artist': 'Energy 52', 'album': 'Café del Mar'},
+}
+
+
+@pytest.fixture
+def index():
+    index = LibrarySearchIndex()
+    for song_id, song in SONGS.items():
+        index.add(song_id, song)
+    return index
+
+
+def ids(results):
+    return [song_id for song_id, _ in results]
+
+
+def test_tokenize_folds_case_and_accents():
+    assert tokenize('Café  DEL-Mar!') == ['cafe', 'del', 'mar']
+    assert tokenize(None) == []
+
+
+def test_title_ranks_above_artist_and_album(index):
+    index.add('6', {'title': 'Beatles Medley', 'artist': 'Cover Band', 'album': 'Tributes'})
+    results = ids(index.search('beatles'))
+    assert results[0] == '6'
+    assert set(results[1:]) == {'1', '2', '4'}
+
+
+def test_album_only_match_ranks_last(index):
+    # 'help' is the title of 2 and the album of 1
+    assert ids(index.search('help')) == ['2', '1']
+
+
+def test_exact_beats_prefix(index):
+    index.add('7', {'title': 'Hey', 'artist': 'Pixies', 'album': 'Doolittle'})
+    assert ids(index.search('hey'))[:2] == ['7', '4']
+
+
+def test_prefix_match(index):
+    assert ids(index.search('yest')) == ['1']
+    assert ids(index.search('beau')) == ['3']
+
+
+def test_short_prefixes_do_not_expand(index):
+    # One character is below MIN_PREFIX_LENGTH
+    assert index.search('y') == []
+
+
+def test_one_typo_match(index):
+    assert ids(index.search('yesturday')) == ['1']
+    # Transposition
+    assert ids(index.search('beatels'))[0] in {'1', '2', '4'}
+
+
+def test_exact_beats_typo(index):
+    index.add('8', {'title': 'Jade', 'artist': 'Someone', 'album': 'Stones'})
+    # 'jude' is exact in 4's title; 'jade' is one edit away
+    assert ids(index.search('jude')) == ['4', '8']
+
+
+def test_short_tokens_need_an_exact_or_prefix_match(index):
+    index.add('8', {'title': 'Hay', 'artist': 'Someone', 'album': 'Stones'})
+    # Below MIN_FUZZY_LENGTH a one-letter difference does not match
+    assert ids(index.search('hey')) == ['4']
+
+
+def test_every_token_must_match(index):
+    assert ids(index.search('hey beatles')) == ['4']
+    assert index.search('hey u2') == []
+
+
+def test_accent_insensitive(index):
+    assert ids(index.search('cafe')) == ['5']
+
+
+def test_limit(index):
+    assert len(index.search('the beatles', limit=2)) == 2
+
+
+def test_remove_and_reindex(index):
+    index.remove('1')
+    assert index.search('yesterday') == []
+    index.add('2', {'title': 'Something', 'artist': 'The Beatles', 'album': 'Abbey Road'})
+    assert ids(index.search('help')) == []
+    assert ids(index.search('something')) == ['2']
+    assert len(index) == 4
+
+
+class FakeSongs:
+    """Async cursor over songs; runs `during` part-way through the scan"""
+
+    def __init__(self, songs, during=None):
+        self.songs = songs
+        self.during = during
+
+    def find(self, query, projection):
+        return self._scan()
+
+    async def _scan(self):
+        for i, (song_id, song) in enumerate(list(self.songs.items())):
+            if i == 1 and self.during is not None:
+                self.during()
+            await asyncio.sleep(0)
+            yield {'_id': song_id, **song}
+
+
+def test_build_replays_writes_made_during_the_load():
+    index = LibrarySearchIndex()
+    songs = dict(SONGS)
+
+    def local_writes():
+        # Already written to Mongo, but the scan is past this song / before that one
+        del songs['5']
+        index.remove('5')
+        index.add('0', {'title': 'Penny Lane', 'artist': 'The Beatles', 'album': 'Magical Mystery Tour'})
+
+    asyncio.run(index.build(FakeSongs(songs, during=local_writes)))
+    assert index.ready
+    assert ids(index.search('penny')) == ['0']
+    assert index.search('cafe') == []
+    assert ids(index.search('yesterday')) == ['1']
+
+
+def test_refresh_marks_stale_until_loaded():
+    index = LibrarySearchIndex()
+
+    async def run():
+        index.refresh(FakeSongs(SONGS))
+        assert index.stale and not index.ready
+        await index._refresh_task
+        await index.stop()
+
+    asyncio.run(run())
+    assert index.ready and not index.stale
+    assert len(index) == len(SONGS)
@@ -0,0 +1,138 @@
+import asyncio
+import copy
+import uuid
+
+from library_version import LibraryVersion
+
+
+class FakeMeta:
+    """The meta collection's library document, shared like it is in Mongo"""
+
+    def __init__(self):
+        self.doc = None
+
+    async def find_one(self, query):
+        return copy.deepcopy(self.doc)
+
+    async def find_one_and_update(self, query, update, upsert=False, return_document=None):
+        if self.doc is None:
+            self.doc = {'_id': query['_id'], 'version': 0, 'searchVersion': 0, 'epoch': uuid.uuid4().hex}
+            self.doc.update(update.get('$setOnInsert', {}))
+        for field, amount in update.get('$inc', {}).items():
+            self.doc[field] = self.doc.get(field, 0) + amount
+        return copy.deepcopy(self.doc)
+
+
+class FakeDB:
+    def __init__(self, meta):
+        self.meta = meta
+
+
+def make(meta):
+    reloads = []
+    version = LibraryVersion(FakeDB(meta), on_remote_change=lambda: reloads.append(1))
+    asyncio.run(version.load())
+    return version, reloads
+
+
+def test_own_bumps_do_not_reload():
+    meta = FakeMeta()
+    local, reloads = make(meta)
+
+    async def run():
+        await local.bump(search=True)
+        await local.bump()
+        await local.bump(search=True)
+        await local.check()
+
+    asyncio.run(run())
+    assert reloads == []
+    assert local.etag == f'W/"{meta.doc["epoch"]}.3"'
+
+
+def test_remote_bump_seen_by_poll():
+    meta = FakeMeta()
+    local, reloads = make(meta)
+    remote, _ = make(meta)
+
+    async def run():
+        await remote.bump(search=True)
+        await local.check()
+
+    asyncio.run(run())
+    assert reloads == [1]
+
+
+def test_remote_bump_seen_by_local_bump():
+    meta = FakeMeta()
+    local, reloads = make(meta)
+    remote, _ = make(meta)
+
+    async def run():
+        await remote.bump(search=True)
+        await local.bump(search=True)
+        await local.check()
+
+    asyncio.run(run())
+    # Found by the bump itself; the poll has nothing new
+    assert reloads == [1]
+
+
+def test_remote_bump_seen_by_local_non_search_bump():
+    meta = FakeMeta()
+    local, reloads = make(meta)
+    remote, _ = make(meta)
+
+    async def run():
+        await remote.bump(search=True)
+        await local.bump()
+        await local.check()
+
+    asyncio.run(run())
+    assert reloads == [1]
+
+
+def test_remote_non_search_bump_does_not_reload():
+    meta = FakeMeta()
+    local, reloads = make(meta)
+    remote, _ = make(meta)
+
+    async def run():
+        await remote.bump()
+        await local.check()
+
+    asyncio.run(run())
+    assert reloads == []
+    # The ETag still moves
+    assert local.value == 1
+
+
+def test_concurrent_own_bumps_do_not_reload():
+    meta = FakeMeta()
+    local, reloads = make(meta)
+
+    async def run():
+        # Results come back in any order
+        local._search_bumps += 1
+        first = await meta.find_one_and_update({'_id': 'library'}, {'$inc': {'version': 1, 'searchVersion': 1}})
+        await local.bump(search=True)
+        local._search_bumps -= 1
+        local._local_search.add(first['searchVersion'])
+        assert not local._apply(first)
+        await local.check()
+
+    asyncio.run(run())
+    assert reloads == []
+
+
+def test_recreated_document_reloads():
+    meta = FakeMeta()
+    local, reloads = make(meta)
+
+    async def run():
+        meta.doc = None
+        await meta.find_one_and_update({'_id': 'library'}, {'$inc': {'version': 1}})
+        await local.check()
+
+    asyncio.run(run())
+    assert reloads == [1]
@@ -0,0 +1,55 @@
+import json
+import base64
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from pagination import InvalidPageRequest, decode_cursor, encode_cursor, keyset_filter
+
+
+def _encode(payload) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+
+def test_cursor_round_trip():
+    doc = {'_id': ObjectId(), 'createdAt': datetime(2024, 5, 1, 12, 30, 15, 250000)}
+    assert decode_cursor(encode_cursor(doc)) == (doc['createdAt'], doc['_id'])
+
+
+def test_cursor_round_trip_without_created_at():
+    doc = {'_id': ObjectId()}
+    assert decode_cursor(encode_cursor(doc)) == (None, doc['_id'])
+
+
+def test_cursor_is_url_safe():
+    cursor = encode_cursor({'_id': ObjectId(), 'createdAt': datetime(2024, 5, 1)})
+    assert '=' not in cursor and '+' not in cursor and '/' not in cursor
+
+
+@pytest.mark.parametrize('cursor', [
+    'not a cursor!',
+    _encode(['t', 'id']),
+    _encode({'t': None}),
+    _encode({'t': None, 'id': 'not-an-object-id'}),
+    _encode({'t': 'yesterday', 'id': str(ObjectId())}),
+])
+def test_tampered_cursor_is_rejected(cursor):
+    with pytest.raises(InvalidPageRequest):
+        decode_cursor(cursor)
+
+
+def test_keyset_filter_continues_after_cursor():
+    doc = {'_id': ObjectId(), 'createdAt': datetime(2024, 5, 1)}
+    assert keyset_filter(encode_cursor(doc)) == {'$or': [
+        {'createdAt': {'$gt': doc['createdAt']}},
+        {'createdAt': doc['createdAt'], '_id': {'$gt': doc['_id']}},
+    ]}
+
+
+def test_keyset_filter_after_legacy_document():
+    oid = ObjectId()
+    assert keyset_filter(encode_cursor({'_id': oid})) == {'$or': [
+        {'createdAt': None, '_id': {'$gt': oid}},
+        {'createdAt': {'$ne': None}},
+    ]}
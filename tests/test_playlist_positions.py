@@ -0,0 +1,146 @@
+import sqlite3
+
+import pytest
+
+import playlist_positions
+from playlist_positions import POSITION_GAP, insert_song, move_song
+
+PLAYLIST = 'p1'
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    conn.row_factory = sqlite3.Row
+    conn.execute("CREATE TABLE playlists (id TEXT PRIMARY KEY, name TEXT)")
+    playlist_positions.migrate(conn)
+    yield conn
+    conn.close()
+
+
+def order(conn, playlist_id=PLAYLIST):
+    rows = conn.execute(
+        "SELECT song_id FROM playlist_songs WHERE playlist_id = ? ORDER BY position", (playlist_id,)
+    ).fetchall()
+    return [row[0] for row in rows]
+
+
+def positions(conn, playlist_id=PLAYLIST):
+    rows = conn.execute(
+        "SELECT position FROM playlist_songs WHERE playlist_id = ? ORDER BY position", (playlist_id,)
+    ).fetchall()
+    return [row[0] for row in rows]
+
+
+def fill(conn, songs):
+    for song_id in songs:
+        insert_song(conn, PLAYLIST, song_id)
+
+
+def test_append(conn):
+    fill(conn, ['a', 'b', 'c'])
+    assert order(conn) == ['a', 'b', 'c']
+    assert positions(conn) == [POSITION_GAP, 2 * POSITION_GAP, 3 * POSITION_GAP]
+
+
+def test_insert_at_head(conn):
+    fill(conn, ['a', 'b'])
+    insert_song(conn, PLAYLIST, 'x', 0)
+    assert order(conn) == ['x', 'a', 'b']
+
+
+def test_insert_in_middle(conn):
+    fill(conn, ['a', 'b', 'c'])
+    insert_song(conn, PLAYLIST, 'x', 2)
+    assert order(conn) == ['a', 'b', 'x', 'c']
+    # Only the new row was written
+    assert positions(conn)[2] == (2 * POSITION_GAP + 3 * POSITION_GAP) // 2
+
+
+def test_insert_at_tail(conn):
+    fill(conn, ['a', 'b'])
+    insert_song(conn, PLAYLIST, 'x', 2)
+    insert_song(conn, PLAYLIST, 'y', 100)
+    assert order(conn) == ['a', 'b', 'x', 'y']
+
+
+def test_insert_into_empty_playlist(conn):
+    insert_song(conn, PLAYLIST, 'x', 0)
+    insert_song(conn, PLAYLIST, 'y', 5)
+    assert order(conn) == ['x', 'y']
+
+
+def test_exhausted_gap_renumbers(conn):
+    fill(conn, ['a', 'b'])
+    expected = ['a', 'b']
+    # Each insert halves the gap after 'a' until no integer is left
+    for i in range(20):
+        song_id = f's{i}'
+        insert_song(conn, PLAYLIST, song_id, 1)
+        expected.insert(1, song_id)
+        assert order(conn) == expected
+    assert len(set(positions(conn))) == len(expected)
+
+
+def test_renumber_respaces_adjacent_positions(conn):
+    conn.executemany(
+        "INSERT INTO playlist_songs (playlist_id, song_id, position) VALUES (?, ?, ?)",
+        [(PLAYLIST, 'a', 1), (PLAYLIST, 'b', 2)]
+    )
+    insert_song(conn, PLAYLIST, 'x', 1)
+    assert order(conn) == ['a', 'x', 'b']
+    assert positions(conn) == [POSITION_GAP, POSITION_GAP + POSITION_GAP // 2, 2 * POSITION_GAP]
+
+
+def test_renumber_leaves_other_playlists_alone(conn):
+    conn.executemany(
+        "INSERT INTO playlist_songs (playlist_id, song_id, position) VALUES (?, ?, ?)",
+        [(PLAYLIST, 'a', 1), (PLAYLIST, 'b', 2), ('p2', 'c', 7)]
+    )
+    insert_song(conn, PLAYLIST, 'x', 1)
+    assert positions(conn, 'p2') == [7]
+
+
+def test_move_forward_and_back(conn):
+    fill(conn, ['a', 'b', 'c', 'd'])
+    assert move_song(conn, PLAYLIST, 'a', 2)
+    assert order(conn) == ['b', 'c', 'a', 'd']
+    assert move_song(conn, PLAYLIST, 'd', 0)
+    assert order(conn) == ['d', 'b', 'c', 'a']
+    assert move_song(conn, PLAYLIST, 'b', 10)
+    assert order(conn) == ['d', 'c', 'a', 'b']
+
+
+def test_move_missing_song(conn):
+    fill(conn, ['a'])
+    assert not move_song(conn, PLAYLIST, 'zzz', 0)
+    assert order(conn) == ['a']
+
+
+def test_set_order(conn):
+    fill(conn, ['a', 'b', 'c'])
+    playlist_positions.set_order(conn, PLAYLIST, ['c', 'a', 'b'])
+    assert order(conn) == ['c', 'a', 'b']
+    assert positions(conn) == [POSITION_GAP, 2 * POSITION_GAP, 3 * POSITION_GAP]
+
+
+def test_listed_playlists_keep_song_order(conn):
+    conn.executemany("INSERT INTO playlists (id, name) VALUES (?, ?)", [('p1', 'One'), ('p2', 'Two'), ('p3', 'Empty')])
+    # Rows land in the table in a different order than their positions
+    for song_id in ['a', 'b', 'c', 'd']:
+        insert_song(conn, 'p1', song_id, 0)
+    for song_id in ['e', 'f', 'g']:
+        insert_song(conn, 'p2', song_id)
+    insert_song(conn, 'p2', 'h', 1)
+    move_song(conn, 'p2', 'e', 3)
+    insert_song(conn, 'p1', 'i', 2)
+
+    songs = {playlist['id']: playlist['songs'] for playlist in playlist_positions.list_playlists(conn)}
+    assert songs == {
+        'p1': ['d', 'c', 'i', 'b', 'a'],
+        'p2': ['h', 'f', 'g', 'e'],
+        'p3': [],
+    }
+    assert playlist_positions.get_playlist(conn, 'p2')['songs'] == ['h', 'f', 'g', 'e']
+    assert playlist_positions.get_playlist(conn, 'p3')['songs'] == []
+    assert playlist_positions.get_playlist(conn, 'missing') is None
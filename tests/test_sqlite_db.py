@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+
+from sqlite_db import SQLiteDatabase
+
+
+def test_calls_before_open_raise(tmp_path):
+    db = SQLiteDatabase(str(tmp_path / 'app.db'), pool_size=1)
+    with pytest.raises(RuntimeError, match='not open'):
+        asyncio.run(db.fetchone("SELECT 1"))
+    with pytest.raises(RuntimeError, match='not open'):
+        asyncio.run(db.execute("CREATE TABLE t (x)"))
+    # Nothing was opened on the caller's behalf
+    assert not (tmp_path / 'app.db').exists()
+
+
+def test_open_use_close(tmp_path):
+    db = SQLiteDatabase(str(tmp_path / 'app.db'), pool_size=2)
+    db.open()
+    try:
+        asyncio.run(db.execute("CREATE TABLE t (x INTEGER)"))
+        assert asyncio.run(db.execute("INSERT INTO t VALUES (1), (2)")) == 2
+        assert asyncio.run(db.fetchall("SELECT x FROM t ORDER BY x")) == [{'x': 1}, {'x': 2}]
+        assert asyncio.run(db.fetchone("PRAGMA journal_mode"))['journal_mode'] == 'wal'
+    finally:
+        db.close()
+    with pytest.raises(RuntimeError):
+        asyncio.run(db.fetchone("SELECT 1"))
+
+
+def test_failed_write_rolls_back(tmp_path):
+    db = SQLiteDatabase(str(tmp_path / 'app.db'), pool_size=1)
+    db.open()
+    try:
+        asyncio.run(db.execute("CREATE TABLE t (x INTEGER)"))
+
+        def insert_then_fail(conn):
+            conn.execute("INSERT INTO t VALUES (1)")
+            raise ValueError('abort')
+
+        with pytest.raises(ValueError):
+            asyncio.run(db.write(insert_then_fail))
+        assert asyncio.run(db.fetchall("SELECT x FROM t")) == []
+    finally:
+        db.close()
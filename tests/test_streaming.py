@@ -0,0 +1,52 @@
+import pytest
+
+from streaming import RangeNotSatisfiable, parse_range
+
+SIZE = 1000
+
+
+def test_no_header_sends_everything():
+    assert parse_range(None, SIZE) is None
+    assert parse_range('', SIZE) is None
+
+
+def test_closed_range():
+    assert parse_range('bytes=0-99', SIZE) == (0, 99)
+
+
+def test_end_is_clamped_to_size():
+    assert parse_range('bytes=900-5000', SIZE) == (900, 999)
+
+
+def test_open_ended_range():
+    assert parse_range('bytes=500-', SIZE) == (500, 999)
+
+
+def test_suffix_range():
+    assert parse_range('bytes=-100', SIZE) == (900, 999)
+
+
+def test_suffix_longer_than_resource():
+    assert parse_range('bytes=-5000', SIZE) == (0, 999)
+
+
+@pytest.mark.parametrize('header', ['bytes=1000-', 'bytes=2000-3000', 'bytes=-0'])
+def test_unsatisfiable_ranges(header):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range(header, SIZE)
+
+
+def test_any_range_of_empty_resource_is_unsatisfiable():
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range('bytes=0-', 0)
+
+
+@pytest.mark.parametrize('header', [
+    'bytes=0-99,200-299',  # multi-range: allowed to ignore
+    'items=0-10',
+    'bytes=abc-def',
+    'bytes=500',
+    'bytes=500-100',
+])
+def test_ignored_headers_send_everything(header):
+    assert parse_range(header, SIZE) is None
@@ -0,0 +1,61 @@
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+
+from file_service import UPLOAD_FORM_OVERHEAD, UploadSizeLimit
+
+MB = 1024 * 1024
+
+
+def make_client(received):
+    app = FastAPI()
+
+    @app.post('/upload')
+    async def upload(file: UploadFile = File(...)):
+        data = await file.read()
+        received.append(len(data))
+        return {'size': len(data)}
+
+    @app.post('/other')
+    async def other(file: UploadFile = File(...)):
+        return {'size': len(await file.read())}
+
+    app.add_middleware(UploadSizeLimit, paths=['/upload'], max_size=MB)
+    return TestClient(app)
+
+
+def test_small_upload_passes():
+    received = []
+    response = make_client(received).post('/upload', files={'file': ('a.mp3', b'x' * 1000, 'audio/mpeg')})
+    assert response.status_code == 200
+    assert received == [1000]
+
+
+def test_content_length_over_limit_is_rejected_unread():
+    received = []
+    body = b'x' * (MB + UPLOAD_FORM_OVERHEAD + 1)
+    response = make_client(received).post('/upload', files={'file': ('a.mp3', body, 'audio/mpeg')})
+    assert response.status_code == 413
+    assert response.json() == {'detail': 'File exceeds the 1 MB limit'}
+    assert received == []
+
+
+def test_chunked_body_is_cut_off_at_the_limit():
+    received = []
+
+    # No Content-Length: the body is sent chunked
+    def body():
+        for _ in range(8):
+            yield b'x' * (MB // 2)
+
+    response = make_client(received).post(
+        '/upload', content=body(), headers={'Content-Type': 'multipart/form-data; boundary=b'}
+    )
+    assert response.status_code == 413
+    assert received == []
+
+
+def test_other_paths_are_not_limited():
+    received = []
+    body = b'x' * (MB + UPLOAD_FORM_OVERHEAD + 1)
+    response = make_client(received).post('/other', files={'file': ('a.mp3', body, 'audio/mpeg')})
+    assert response.status_code == 200